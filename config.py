@@ -1,6 +1,8 @@
+import json
 import os
+import httpx
 from redis.asyncio import Redis
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient
 
 # Fetch environment variables with default values
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
@@ -9,13 +11,118 @@ QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 # if DATABASE_URL == "":
 DATABASE_URL = "sqlite:///dev.db"
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY", "")
+# Connection pool of the async Qdrant client used by the API and the worker
+QDRANT_MAX_CONNECTIONS = int(os.getenv("QDRANT_MAX_CONNECTIONS", "100"))
+QDRANT_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("QDRANT_MAX_KEEPALIVE_CONNECTIONS", "20"))
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
 
 DENSE_EMBEDDING_MODEL = os.getenv("DENSE_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
 SPARSE_EMBEDDING_MODEL = os.getenv("SPARSE_EMBEDDING_MODEL", "bm25")
 LATE_EMBEDDING_MODEL = os.getenv("LATE_EMBEDDING_MODEL", "colbertv2.0")
 
+# ONNX intra-op threads per embedding model (0 lets onnxruntime decide)
+DENSE_EMBEDDING_THREADS = int(os.getenv("DENSE_EMBEDDING_THREADS", "0"))
+SPARSE_EMBEDDING_THREADS = int(os.getenv("SPARSE_EMBEDDING_THREADS", "0"))
+LATE_EMBEDDING_THREADS = int(os.getenv("LATE_EMBEDDING_THREADS", "0"))
+# Load all embedding models when the app starts instead of on first use
+EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "true").lower() == "true"
+
+# Query embedding micro-batching: concurrent queries arriving within the
+# window are embedded together, on a dedicated inference thread pool
+QUERY_EMBED_BATCH_WINDOW_MS = float(os.getenv("QUERY_EMBED_BATCH_WINDOW_MS", "5"))
+QUERY_EMBED_MAX_BATCH = int(os.getenv("QUERY_EMBED_MAX_BATCH", "32"))
+QUERY_EMBED_THREADS = int(os.getenv("QUERY_EMBED_THREADS", "1"))
+# LRU of query vectors keyed by model and normalized query text (entries count
+# one vector of one model), optionally shared through Redis
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "10000"))
+QUERY_EMBED_CACHE_REDIS = os.getenv("QUERY_EMBED_CACHE_REDIS", "false").lower() == "true"
+QUERY_EMBED_CACHE_TTL_SECONDS = int(os.getenv("QUERY_EMBED_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+# Redis cache of fused retrieval results per integration catalog version
+RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() == "true"
+RETRIEVAL_CACHE_TTL_SECONDS = int(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "3600"))
+
+# Default retrieval pipeline, overridable per integration:
+#   "fusion": dense, sparse and ColBERT searches fused by RETRIEVAL_FUSION
+#   "rerank": dense and sparse candidates rescored by ColBERT MaxSim
+#   "sparse": BM25 only, for latency-critical integrations
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "fusion").lower()
+RETRIEVAL_FUSION = os.getenv("RETRIEVAL_FUSION", "rrf").lower()
+RETRIEVAL_DENSE_LIMIT = int(os.getenv("RETRIEVAL_DENSE_LIMIT", "20"))
+RETRIEVAL_SPARSE_LIMIT = int(os.getenv("RETRIEVAL_SPARSE_LIMIT", "20"))
+RETRIEVAL_LATE_LIMIT = int(os.getenv("RETRIEVAL_LATE_LIMIT", "20"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+# How long a process trusts its copy of an integration's retrieval config
+RETRIEVAL_CONFIG_TTL_SECONDS = int(os.getenv("RETRIEVAL_CONFIG_TTL_SECONDS", "60"))
+# Integrations with at most this many endpoints skip vector search and hand
+# their whole catalog to endpoint filtering (0 disables the fast path)
+SMALL_CATALOG_THRESHOLD = int(os.getenv("SMALL_CATALOG_THRESHOLD", "30"))
+
+# In-process NumPy mirror of hot integrations' vectors, searched instead of
+# Qdrant once an integration served LOCAL_INDEX_MIN_QUERIES queries; all
+# mirrors together stay within LOCAL_INDEX_MEMORY_MB (least recently used go first)
+LOCAL_INDEX_ENABLED = os.getenv("LOCAL_INDEX_ENABLED", "false").lower() == "true"
+LOCAL_INDEX_MIN_QUERIES = int(os.getenv("LOCAL_INDEX_MIN_QUERIES", "50"))
+LOCAL_INDEX_MEMORY_MB = int(os.getenv("LOCAL_INDEX_MEMORY_MB", "256"))
+
+# Compiled integration catalogs (parsed schemas) kept per process, at most
+# CATALOG_CACHE_SIZE of them within CATALOG_CACHE_MEMORY_MB, least recently
+# used evicted first
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "64"))
+CATALOG_CACHE_MEMORY_MB = int(os.getenv("CATALOG_CACHE_MEMORY_MB", "64"))
+
+# Deep-mode steps are routed to the integration whose description (and, with
+# INTEGRATION_ROUTER_ENDPOINTS, closest retrieved endpoint) is most similar; the
+# LLM picker only runs when the best two cosine scores are within the margin
+INTEGRATION_ROUTER_ENABLED = os.getenv("INTEGRATION_ROUTER_ENABLED", "true").lower() == "true"
+INTEGRATION_ROUTER_MARGIN = float(os.getenv("INTEGRATION_ROUTER_MARGIN", "0.05"))
+INTEGRATION_ROUTER_ENDPOINTS = os.getenv("INTEGRATION_ROUTER_ENDPOINTS", "false").lower() == "true"
+
+# Passage embedding cache: "disk", "redis" or "none"
+EMBEDDING_CACHE_BACKEND = os.getenv("EMBEDDING_CACHE_BACKEND", "disk").lower()
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+EMBEDDING_CACHE_SIZE_MB = int(os.getenv("EMBEDDING_CACHE_SIZE_MB", "1024"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# Ingestion embedding process pool (below 2 workers embeds in-process)
+EMBEDDING_POOL_WORKERS = int(os.getenv("EMBEDDING_POOL_WORKERS", "0"))
+EMBEDDING_POOL_THREADS_PER_WORKER = int(os.getenv("EMBEDDING_POOL_THREADS_PER_WORKER", "1"))
+
+# Bulk ingestion: texts per embedding batch and points per Qdrant upsert
+INGESTION_EMBED_BATCH_SIZE = int(os.getenv("INGESTION_EMBED_BATCH_SIZE", "64"))
+INGESTION_CHUNK_SIZE = int(os.getenv("INGESTION_CHUNK_SIZE", "256"))
+# How long ingestion job status and uploaded specs are kept in Redis
+INGESTION_JOB_TTL_SECONDS = int(os.getenv("INGESTION_JOB_TTL_SECONDS", str(7 * 24 * 3600)))
+# A running job whose worker has not renewed its lease for this long is re-queued
+INGESTION_JOB_LEASE_SECONDS = int(os.getenv("INGESTION_JOB_LEASE_SECONDS", "120"))
+# Bytes moved per read/write when streaming uploaded specs through Redis
+SPEC_TRANSFER_CHUNK_BYTES = int(os.getenv("SPEC_TRANSFER_CHUNK_BYTES", str(1024 * 1024)))
+
 DEFAULT_RATE_LIMIT = 1000
 
+# How long a known-to-exist Qdrant collection is trusted before re-checking
+COLLECTION_REGISTRY_TTL_SECONDS = int(os.getenv("COLLECTION_REGISTRY_TTL_SECONDS", "300"))
+# Largest page /integrations/endpoints serves per request or per streamed scroll
+ENDPOINT_PAGE_MAX = int(os.getenv("ENDPOINT_PAGE_MAX", "1000"))
+
+# Storage of new integration collections (existing ones are changed through
+# /integrations/convert-collection): quantization "none", "scalar" or "binary"
+COLLECTION_QUANTIZATION = os.getenv("COLLECTION_QUANTIZATION", "none").lower()
+QUANTIZATION_ALWAYS_RAM = os.getenv("QUANTIZATION_ALWAYS_RAM", "true").lower() == "true"
+# ColBERT multivector datatype ("float32" or "float16") and placement
+LATE_VECTOR_DATATYPE = os.getenv("LATE_VECTOR_DATATYPE", "float32").lower()
+LATE_VECTOR_ON_DISK = os.getenv("LATE_VECTOR_ON_DISK", "false").lower() == "true"
+# Re-rank quantized candidates with the original vectors at query time
+QUANTIZATION_RESCORE = os.getenv("QUANTIZATION_RESCORE", "true").lower() == "true"
+QUANTIZATION_OVERSAMPLING = float(os.getenv("QUANTIZATION_OVERSAMPLING", "2.0"))
+
+# Redis cache of agent (DSPy predictor) outputs keyed by model, signature and
+# inputs; LLM_CACHE_AGENT_TTLS overrides the TTL per agent as JSON, e.g.
+# '{"final_response": 300, "data_extractor": 0}' (0 disables that agent's cache)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+LLM_CACHE_AGENT_TTLS = json.loads(os.getenv("LLM_CACHE_AGENT_TTLS", "{}") or "{}")
+
 # LLM API Key mapping - maps LLM names to their API keys
 LLM_API_KEYS = {
     "gpt-4o-mini": os.getenv("OPENAI_API_KEY", ""),
@@ -32,10 +139,16 @@ LLM_API_KEYS = {
     # Add more LLM mappings as needed
 }
 
-# Initialize Qdrant client
-qdrant_client = QdrantClient(
-    url=QDRANT_URL,  # e.g. "http://localhost:6333" or your cloud URL,
-    api_key=QDRANT_API_KEY
+# Non-blocking client with a pooled, keep-alive HTTP connection set; request
+# handlers and ingestion share it so retrievals can overlap on one loop
+async_qdrant_client = AsyncQdrantClient(
+    url=QDRANT_URL,  # e.g. "http://localhost:6333" or your cloud URL
+    api_key=QDRANT_API_KEY,
+    prefer_grpc=QDRANT_PREFER_GRPC,
+    limits=httpx.Limits(
+        max_connections=QDRANT_MAX_CONNECTIONS,
+        max_keepalive_connections=QDRANT_MAX_KEEPALIVE_CONNECTIONS,
+    ),
 )
 
 redis_client = Redis.from_url(REDIS_URL)
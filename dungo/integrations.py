@@ -1,15 +1,30 @@
+import io
 import json
 import uuid
 from fastapi import APIRouter, HTTPException, Query, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Literal, Optional
+from config import ENDPOINT_PAGE_MAX, SPEC_TRANSFER_CHUNK_BYTES, async_qdrant_client
 from models import Integration, session
+from rag.catalog import catalog_cache
 from schemas.raapi_schemas.rag import EditVectorSchema
-from utils.upsert import upsert_vector, qdrant_client
-from schemas.dungo_schemas.integrations import CreateIntegrationModel, DeleteIntegrationEndpointModel, DeleteIntegrationModel, UpdateIntegrationDescriptionModel
+from utils.upsert import hash_content, point_id_for, upsert_vector
+from schemas.dungo_schemas.integrations import BulkDeleteEndpointsModel, BulkEditEndpointsModel, ConvertCollectionModel, CreateIntegrationModel, DeleteIntegrationEndpointModel, DeleteIntegrationModel, RetrievalConfigModel, UpdateIntegrationDescriptionModel
 
 from schemas.raapi_schemas.upsert import UpsertSchema
 from utils.general import sqlalchemy_object_to_dict
-from utils.openapi import find_ref_schema, convert_schema_to_fields, process_parameters
+from utils.qdrant_collections import CollectionBusyError, collection_registry
+from utils.embedding_cache import embedding_cache
+from utils.endpoint_points import delete_endpoints, endpoint_filter, find_endpoint_points, list_endpoints, parse_cursor, set_endpoint_payload, stream_endpoints_ndjson
+from utils.embeddings import embedding_models
+from utils.local_index import local_index
+from utils.query_embeddings import query_embedder
+from utils.retrieval_cache import bump_catalog_version
+from utils.retrieval_config import delete_retrieval_settings, get_retrieval_settings, update_retrieval_settings
+from utils.ingestion_jobs import create_job, get_job, retry_job
+from utils.integration_router import integration_router
+from utils.openapi import has_paths
 
 integrations_router = APIRouter()
 
@@ -48,7 +63,13 @@ async def delete_integration(request: DeleteIntegrationModel):
         raise HTTPException(status_code=404, detail={
                             "message": "Integration not found"})
     
-    qdrant_client.delete_collection(collection_name=integration.uuid)
+    await collection_registry.drop(integration.uuid)
+    await bump_catalog_version(integration.uuid)
+    delete_retrieval_settings(integration.uuid)
+    if local_index is not None:
+        local_index.drop(integration.uuid)
+    catalog_cache.drop(integration.uuid)
+    integration_router.drop(integration.uuid)
     session.delete(integration)
     session.commit()
 
@@ -59,7 +80,8 @@ async def delete_integration(request: DeleteIntegrationModel):
 async def upload_openapi(
     integration_id: str = Form(...),
     selected_endpoints: str = Form(...),
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    prune: bool = Form(True)
 ):
     # Validate file type
     if not file.filename.endswith('.json'):
@@ -73,195 +95,195 @@ async def upload_openapi(
     except (json.JSONDecodeError, ValueError) as e:
         raise HTTPException(status_code=400, detail=f"Invalid selected_endpoints format: {str(e)}")
     
-    # Read and parse the JSON file
+    # Check the spec shape without loading the whole document
+    text_file = io.TextIOWrapper(file.file, encoding='utf-8')
     try:
-        content = await file.read()
-        data = json.loads(content.decode('utf-8'))
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Invalid JSON file")
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error reading file: {str(e)}")
-    
-    routes = []
-    paths = data['paths']
-    components = data.get('components', {}).get('schemas', {})
-    
-    print(f"Processing {len(paths)} paths")
-    print(f"Found {len(components)} component schemas")
-
-    for path, path_content in paths.items():
-        for method, request_content in path_content.items():
-            route = {
-                'method': method.upper(),
-                'url': path,
-                'description': request_content.get('description', ''),
-                'text': request_content.get('description', ''),
-                'integration_id': integration_id,
-                'tool': False
-            }
-            
-            # Check if this endpoint is in the selected endpoints
-            # If selected_endpoints_list is empty, select all endpoints
-            if selected_endpoints_list and str(method.upper() + "_" + path) not in selected_endpoints_list:
-                continue
-
-            print(f"\nProcessing endpoint: {method.upper()} {path}")
-            print(f"Has requestBody: {'requestBody' in request_content}")
-            if 'requestBody' in request_content:
-                print(f"requestBody content types: {list(request_content['requestBody'].get('content', {}).keys())}")
-
-            parameters = request_content.get('parameters', [])
-            route['parameters'] = process_parameters(parameters)
-
-            request_body = request_content.get('requestBody', {})
-            
-            # Handle multiple content types for request body
-            body_schema = {}
-            content_types = request_body.get('content', {})
-            
-            # Try different content types in order of preference
-            for content_type in ['application/json', 'application/x-www-form-urlencoded', 'multipart/form-data']:
-                if content_type in content_types:
-                    body_schema = content_types[content_type].get('schema', {})
-                    break
-            
-            # If no specific content type found, try to get any schema from content
-            if not body_schema and content_types:
-                for content_type, content_data in content_types.items():
-                    if 'schema' in content_data:
-                        body_schema = content_data['schema']
-                        break
-
-            if body_schema:
-                if '$ref' in body_schema:
-                    body_schema = find_ref_schema(
-                        body_schema['$ref'], components)
-                body_fields = convert_schema_to_fields(body_schema, components)
-                route['body'] = json.dumps(body_fields)
-                print(f"Body fields for {method.upper()} {path}: {body_fields}")
-            else:
-                route['body'] = '[]'
-                print(f"No body schema found for {method.upper()} {path}")
-
-            success_response = request_content.get(
-                'responses', {}).get('200', {})
-            content = success_response.get(
-                'content', {}).get('application/json', {})
-            response_schema = content.get('schema', {})
-
-            if response_schema:
-                if '$ref' in response_schema:
-                    response_schema = find_ref_schema(
-                        response_schema['$ref'], components)
-                response_fields = convert_schema_to_fields(
-                    response_schema, components)
-                route['response'] = json.dumps(response_fields)
-            else:
-                route['response'] = '[]'
-
-            routes.append(route)
-
-    for route in routes:
-        await upsert_vector(request=UpsertSchema(
-            integration_id=route['integration_id'], text=route['text'], metadata=route))
-
-    return routes
+        valid = await run_in_threadpool(has_paths, text_file)
+    except (json.JSONDecodeError, UnicodeDecodeError, ValueError):
+        valid = False
+    finally:
+        text_file.detach()
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid JSON file: expected an OpenAPI object with 'paths'")
+
+    async def spec_chunks():
+        await file.seek(0)
+        while chunk := await file.read(SPEC_TRANSFER_CHUNK_BYTES):
+            yield chunk
+
+    # Parsing, embedding and indexing happen in the ingestion worker
+    job = await create_job(integration_id, selected_endpoints_list, spec_chunks(), prune=prune)
+    return JSONResponse(content=job, status_code=202)
+
+
+@integrations_router.get("/jobs/{job_id}")
+async def ingestion_job_status(job_id: str):
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail={"message": "Job not found"})
+    return job
+
+
+@integrations_router.post("/jobs/{job_id}/retry")
+async def retry_ingestion_job(job_id: str):
+    try:
+        return await retry_job(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail={"message": "Job not found"})
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e)})
 
 
 @integrations_router.get("/endpoints")
-async def endpoints(integration_id=Query(str, description="ID of the integration")):
+async def endpoints(
+    integration_id=Query(str, description="ID of the integration"),
+    cursor: Optional[str] = Query(None, description="Cursor returned in X-Next-Cursor by the previous page"),
+    limit: int = Query(100, ge=1, le=ENDPOINT_PAGE_MAX, description="Endpoints per page"),
+    fields: Optional[str] = Query(None, description="Comma separated payload fields to return, e.g. method,url,description"),
+    format: Literal["json", "ndjson"] = Query("json", description="ndjson streams every page from the cursor on"),
+):
+    if not await collection_registry.exists(integration_id):
+        return []
+
+    projection = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+
     try:
-        search_results = qdrant_client.scroll(
-            collection_name=integration_id,
-            limit=100,
-            with_payload=True,
-            with_vectors=False,
+        parse_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail={"message": f"Invalid cursor: {cursor}"})
+
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_endpoints_ndjson(integration_id, limit, cursor, projection),
+            media_type="application/x-ndjson",
         )
-        points = search_results[0]
-        return [point.payload for point in points]
-    except:
-        return []
+
+    payloads, next_cursor = await list_endpoints(integration_id, limit, cursor, projection)
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return JSONResponse(content=payloads, headers=headers)
 
 
 @integrations_router.post("/delete-endpoint")
 async def delete_endpoint(request: DeleteIntegrationEndpointModel):
-    search_results = qdrant_client.scroll(
-        collection_name=request.integration_id,
-        limit=100,
-        with_payload=True,
-        with_vectors=False,
-    )
-    points = search_results[0]
-    matching_point = None
-    for point in points:
-        print(point.payload.get("url"))
-        if point.payload.get("url") == request.new_metadata["url"]:
-            matching_point = point
-            break
-    qdrant_client.delete(
-        collection_name=request.integration_id,
-        points_selector=[matching_point.id],
-    )
-    if not matching_point:
+    if not await collection_registry.exists(request.integration_id):
+        return JSONResponse(content={"message": "the given bot does not exist"}, status_code=404)
+
+    try:
+        deleted = await delete_endpoints(
+            request.integration_id,
+            endpoint_filter([request.url], [request.method] if request.method else None),
+        )
+    except CollectionBusyError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e)})
+    if not deleted:
         return JSONResponse(content={"message": "No matching vector found for the given URL"}, status_code=404)
     return {
-        "message": "endpoint deleted"
+        "message": "endpoint deleted",
+        "deleted": deleted
     }
 
 
+@integrations_router.post("/delete-endpoints")
+async def bulk_delete_endpoints(request: BulkDeleteEndpointsModel):
+    if not request.selector.urls and not request.selector.methods:
+        raise HTTPException(status_code=400, detail={
+                            "message": "The selector must set urls or methods"})
+    if not await collection_registry.exists(request.integration_id):
+        return JSONResponse(content={"message": "the given bot does not exist"}, status_code=404)
+
+    try:
+        deleted = await delete_endpoints(
+            request.integration_id,
+            endpoint_filter(request.selector.urls, request.selector.methods),
+        )
+    except CollectionBusyError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e)})
+    return {"message": "endpoints deleted", "deleted": deleted}
+
+
 @integrations_router.post("/edit-endpoint")
 async def edit_vector(request: EditVectorSchema):
-    existing_collections = qdrant_client.get_collections().collections
-    exists = any(collection.name ==
-                 request.integration_id for collection in existing_collections)
+    try:
+        return await _edit_vector(request)
+    except CollectionBusyError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e)})
 
-    if not exists:
+
+async def _edit_vector(request: EditVectorSchema):
+    if not await collection_registry.exists(request.integration_id):
         return JSONResponse(content={"message": "the given bot does not exist"}, status_code=404)
 
-    search_results = qdrant_client.scroll(
-        collection_name=request.integration_id,
-        limit=100,
-        with_payload=True,
-        with_vectors=False,
-    )
-    points = search_results[0]
-    matching_point = None
-    for point in points:
-        print(point.payload.get("url"))
-        if point.payload.get("url") == request.new_metadata["url"]:
-            matching_point = point
-            break
-
-    if not matching_point:
+    url = request.new_metadata.get("url")
+    if not url:
+        raise HTTPException(status_code=400, detail={
+                            "message": "new_metadata must include the endpoint url"})
+
+    matching_points = await find_endpoint_points(
+        request.integration_id, url, request.new_metadata.get("method"))
+    if not matching_points:
         return JSONResponse(content={"message": "No matching vector found for the given URL"}, status_code=404)
+    matching_point = matching_points[0]
 
     # Check if the description has changed
     if request.new_metadata.get("description") != matching_point.payload.get("description"):
-        # Delete the existing point
-
-        qdrant_client.delete(
-            collection_name=request.integration_id,
-            points_selector=[matching_point.id],
-        )
-        # Placeholder comment for creating a new point later
-        # TODO: Add logic to create a new point with the updated description
+        # Embed the new description; the point ID is derived from method and
+        # url, so this overwrites the existing point in place
+        metadata = {"method": matching_point.payload.get("method"), **request.new_metadata}
         await upsert_vector(UpsertSchema(
             integration_id=request.integration_id,
             text=request.new_metadata.get("description"),
-            metadata=request.new_metadata
+            metadata=metadata
         ))
+        # Only a point stored under another ID (e.g. before IDs were
+        # deterministic) is left behind, and only once its successor exists
+        if str(matching_point.id) != point_id_for(request.integration_id, metadata["method"], metadata["url"]):
+            async with collection_registry.writing(request.integration_id):
+                await async_qdrant_client.delete(
+                    collection_name=request.integration_id,
+                    points_selector=[matching_point.id],
+                )
+            await bump_catalog_version(request.integration_id)
 
     else:
-        # Update the existing point with the new metadata
-        qdrant_client.overwrite_payload(
-            collection_name=request.integration_id,
-            points=[matching_point.id],
-            payload=request.new_metadata
-        )
+        # Update the existing point with the new metadata, keeping the fields
+        # re-uploads compare against since the embedded text is unchanged
+        payload = {"method": matching_point.payload.get("method"), **request.new_metadata}
+        payload["text"] = matching_point.payload.get("text")
+        payload["text_hash"] = matching_point.payload.get("text_hash")
+        payload["content_hash"] = hash_content(payload)
+        async with collection_registry.writing(request.integration_id):
+            await async_qdrant_client.overwrite_payload(
+                collection_name=request.integration_id,
+                points=[matching_point.id],
+                payload=payload
+            )
+        await bump_catalog_version(request.integration_id)
 
     return {"message": "operation successful"}
 
 
+@integrations_router.post("/edit-endpoints")
+async def bulk_edit_endpoints(request: BulkEditEndpointsModel):
+    if not request.selector.urls and not request.selector.methods:
+        raise HTTPException(status_code=400, detail={
+                            "message": "The selector must set urls or methods"})
+    if not await collection_registry.exists(request.integration_id):
+        return JSONResponse(content={"message": "the given bot does not exist"}, status_code=404)
+
+    try:
+        updated = await set_endpoint_payload(
+            request.integration_id,
+            endpoint_filter(request.selector.urls, request.selector.methods),
+            request.metadata,
+        )
+    except CollectionBusyError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"message": str(e)})
+    return {"message": "endpoints updated", "updated": updated}
+
+
 @integrations_router.post("/update-integration-description")
 async def update_integration_description(request: UpdateIntegrationDescriptionModel):
     integration = session.query(Integration).filter(
@@ -276,3 +298,62 @@ async def update_integration_description(request: UpdateIntegrationDescriptionMo
     session.commit()
 
     return sqlalchemy_object_to_dict(integration)
+
+
+@integrations_router.post("/convert-collection")
+async def convert_collection(request: ConvertCollectionModel):
+    if not await collection_registry.exists(request.integration_id):
+        raise HTTPException(status_code=404, detail={
+                            "message": "Collection not found"})
+
+    try:
+        return await collection_registry.convert(
+            request.integration_id,
+            quantization=request.quantization,
+            late_datatype=request.late_datatype,
+            late_on_disk=request.late_on_disk,
+        )
+    except CollectionBusyError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e)})
+
+
+@integrations_router.get("/retrieval-config")
+async def retrieval_config(integration_id=Query(str, description="ID of the integration")):
+    return get_retrieval_settings(integration_id)
+
+
+@integrations_router.post("/retrieval-config")
+async def update_retrieval_config(request: RetrievalConfigModel):
+    overrides = request.model_dump(exclude_unset=True, exclude={"integration_id"})
+    try:
+        settings = update_retrieval_settings(request.integration_id, **overrides)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"message": str(e)})
+    return settings
+
+
+@integrations_router.get("/embedding-models")
+async def embedding_model_status():
+    return embedding_models.describe()
+
+
+@integrations_router.get("/query-embeddings")
+async def query_embedding_stats():
+    return query_embedder.stats()
+
+
+@integrations_router.get("/local-index")
+async def local_index_stats():
+    if local_index is None:
+        return {"enabled": False}
+    return {"enabled": True, **local_index.stats()}
+
+
+@integrations_router.get("/catalog-cache")
+async def catalog_cache_stats():
+    return catalog_cache.stats()
+
+
+@integrations_router.get("/embedding-cache")
+async def embedding_cache_stats():
+    return embedding_cache.stats()
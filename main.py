@@ -8,7 +8,9 @@ load_dotenv()
 
 from exception_handler import error_500
 from utils.notifs.admin.discord import send_discord_message
-from config import configure_default_dspy, DEFAULT_LLM
+from config import async_qdrant_client, configure_default_dspy, DEFAULT_LLM, EMBEDDING_WARMUP
+from utils.embeddings import embedding_models
+from utils.query_embeddings import query_embedder
 
 from dungo.integrations import integrations_router
 
@@ -39,10 +41,15 @@ async def on_startup():
         print(f"DSPy configured with default LLM: {DEFAULT_LLM}")
     except Exception as exc:
         print(f"Warning: Failed to configure DSPy with default LLM: {exc}")
+
+    if EMBEDDING_WARMUP:
+        embedding_models.warmup()
     send_discord_message("start-shut", "success", "App Started")
 
 
 async def on_shutdown():
+    await async_qdrant_client.close()
+    query_embedder.shutdown()
     send_discord_message("start-shut", "info", "App Shutdown")
 
 
@@ -19,6 +19,21 @@ class Integration(Base):
     auth_structure = Column(JSON, nullable=True)  # JSON field for authentication structure
     created = Column(DateTime, default=datetime.utcnow, nullable=False)
 
+
+class RetrievalConfig(Base):
+    """Per-integration overrides of the retrieval pipeline; NULL columns use the config defaults."""
+    __tablename__ = 'retrieval_config'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    integration_uuid = Column(String, nullable=False, unique=True)
+    mode = Column(String, nullable=True)  # "fusion", "rerank" or "sparse"
+    fusion = Column(String, nullable=True)  # "rrf" or "dbsf"
+    dense_limit = Column(Integer, nullable=True)
+    sparse_limit = Column(Integer, nullable=True)
+    late_limit = Column(Integer, nullable=True)
+    top_k = Column(Integer, nullable=True)
+    updated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
 # Create an SQLite engine (or any other database you prefer)
 engine = create_engine(DATABASE_URL)
 
@@ -2,6 +2,8 @@ from typing import List, Optional
 from pydantic import BaseModel, Field
 import dspy
 
+from utils.llm_cache import cached_predictor
+
 
 class InputModel(BaseModel):
     query: str = Field(
@@ -120,5 +122,5 @@ class DynamicStepSignature(dspy.Signature):
     output: DynamicStepOutputModel = dspy.OutputField()
 
 
-DECOMPOSER_AGENT = dspy.Predict(DecomposerSignature)
-DYNAMIC_STEP_AGENT = dspy.Predict(DynamicStepSignature)
+DECOMPOSER_AGENT = cached_predictor("decomposer", dspy.Predict(DecomposerSignature))
+DYNAMIC_STEP_AGENT = cached_predictor("dynamic_step", dspy.Predict(DynamicStepSignature))
@@ -2,6 +2,8 @@ from typing import List
 from pydantic import BaseModel, Field
 import dspy
 
+from utils.llm_cache import cached_predictor
+
 
 # lm = dspy.LM('groq/gemma2-9b-it',
 #              api_key='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')
@@ -61,7 +63,7 @@ class ArrayAnswerSignature(dspy.Signature):
     output: OutputModel = dspy.OutputField()
 
 
-ENDPOINT_FILTERER_AGENT = dspy.Predict(ArrayAnswerSignature)
+ENDPOINT_FILTERER_AGENT = cached_predictor("endpoint_filterer", dspy.Predict(ArrayAnswerSignature), time_resolution='day')
 
 # # Example query to match an endpoint
 # query_example = "Retrieve orders for the user"
@@ -2,6 +2,8 @@ from typing import Any, Type, Union
 import dspy
 from pydantic import BaseModel, Field
 
+from utils.llm_cache import cached_predictor
+
 class InputModel(BaseModel):
     query: str = Field(
         ..., 
@@ -48,4 +50,4 @@ class FinalResponseGeneratorSchema(dspy.Signature):
     )
 
 # Instantiating the response generation agent
-FINAL_RESPONSE_GENERATOR_AGENT = dspy.Predict(FinalResponseGeneratorSchema)
+FINAL_RESPONSE_GENERATOR_AGENT = cached_predictor("final_response", dspy.Predict(FinalResponseGeneratorSchema))
@@ -2,6 +2,8 @@ from typing import List
 from pydantic import BaseModel, Field
 import dspy
 
+from utils.llm_cache import cached_predictor
+
 
 class InputModel(BaseModel):
     query: str = Field(
@@ -27,4 +29,4 @@ class IntegrationPickerSignature(dspy.Signature):
     output: OutputModel = dspy.OutputField()
 
 
-INTEGRATION_PICKER = dspy.Predict(IntegrationPickerSignature)
+INTEGRATION_PICKER = cached_predictor("integration_picker", dspy.Predict(IntegrationPickerSignature), time_resolution='day')
@@ -1,6 +1,8 @@
 from pydantic import BaseModel, Field
 import dspy
 
+from utils.llm_cache import cached_predictor
+
 
 class InputModel(BaseModel):
     """
@@ -53,4 +55,4 @@ class QueryRephraseSignature(dspy.Signature):
     output: OutputModel = dspy.OutputField()
 
 
-REPHRASER_AGENT = dspy.Predict(QueryRephraseSignature)
+REPHRASER_AGENT = cached_predictor("rephraser", dspy.Predict(QueryRephraseSignature), time_resolution='day')
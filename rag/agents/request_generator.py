@@ -6,6 +6,8 @@ from typing import List, Type, Optional
 from pydantic import BaseModel, Field
 from typing import Optional
 
+from utils.llm_cache import cached_predictor
+
 
 def create_pydantic_model_from_json(parameters, model_name):
     type_mapping = {
@@ -147,6 +149,9 @@ class DataExtractorSignature(dspy.Signature):
     )
 
 
+DATA_EXTRACTOR_AGENT = cached_predictor("data_extractor", dspy.Predict(DataExtractorSignature))
+
+
 # Legacy classes for backward compatibility (deprecated)
 class ParametersInputModel(BaseModel):
     request_parameters_schema: dict | list = Field(
@@ -2,6 +2,8 @@ from typing import Any, Type
 import dspy
 from pydantic import BaseModel, Field
 
+from utils.llm_cache import cached_predictor
+
 class InputModel(BaseModel):
     query: str = Field(
         ..., 
@@ -21,4 +23,4 @@ class TextResponseGenerator(dspy.Signature):
     input: InputModel = dspy.InputField()
     output: OutputModel = dspy.OutputField()
 
-TEXT_RESPONSE_GENERATOR = dspy.Predict(TextResponseGenerator)
+TEXT_RESPONSE_GENERATOR = cached_predictor("text_response", dspy.Predict(TextResponseGenerator))
@@ -0,0 +1,169 @@
+"""
+Compiled per-integration endpoint catalogs.
+
+A catalog holds every endpoint of an integration with its `parameters`,
+`body` and `response` schemas already parsed from their JSON payload strings.
+
+Catalogs are only built for stages that need the whole catalog (small
+integrations handed to endpoint filtering whole). They are compiled once per
+catalog version (see `utils.retrieval_cache`) and kept in an LRU of at most
+`CATALOG_CACHE_SIZE` integrations and `CATALOG_CACHE_MEMORY_MB`. Without a
+readable catalog version (caching disabled, Redis down) nothing is cached.
+Endpoint identification reuses a cached catalog when there is one and
+otherwise compiles just the endpoints retrieval returned.
+
+Prebuilt GET tools and prompt fragments are not compiled: no stage calls
+tools or renders catalog prompts.
+"""
+
+import asyncio
+import json
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from config import CATALOG_CACHE_MEMORY_MB, CATALOG_CACHE_SIZE
+from rag.query import get_all_endpoints
+from utils.general import approximate_nbytes
+from utils.retrieval_cache import catalog_version
+
+
+def _parse_schema(payload: Dict[str, Any], field: str, default: Any) -> Any:
+    value = payload.get(field)
+    if value is None:
+        return default
+    if not isinstance(value, str):
+        return value
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Failed to parse '{field}' field for endpoint {payload.get('url')}: {e}")
+
+
+class CompiledEndpoint(NamedTuple):
+    method: str
+    url: str
+    description: str
+    parameters: List[Dict[str, Any]]
+    body: Any
+    response: Any
+    tool: bool
+
+
+def compile_endpoint(payload: Dict[str, Any]) -> CompiledEndpoint:
+    return CompiledEndpoint(
+        method=payload.get('method'),
+        url=payload.get('url'),
+        description=payload.get('description') or "",
+        parameters=_parse_schema(payload, 'parameters', []),
+        body=_parse_schema(payload, 'body', None),
+        response=_parse_schema(payload, 'response', None),
+        tool=bool(payload.get('tool', False)),
+    )
+
+
+class IntegrationCatalog:
+    """Every endpoint of one integration, parsed once."""
+
+    def __init__(self, points: List[Any], version: Optional[int] = None):
+        self.version = version
+        self.points = points
+        self.endpoints = [compile_endpoint(point.payload or {}) for point in points]
+        self._routes = {(endpoint.method, endpoint.url): endpoint for endpoint in self.endpoints}
+        # Payload strings plus their parsed schemas
+        self.nbytes = sum(
+            approximate_nbytes(point.payload or {})
+            + approximate_nbytes([endpoint.parameters, endpoint.body, endpoint.response])
+            for point, endpoint in zip(points, self.endpoints)
+        )
+
+    def endpoint_for(self, payload: Dict[str, Any]) -> CompiledEndpoint:
+        """The compiled form of a retrieved endpoint payload, compiling it if the catalog lacks it."""
+        endpoint = self._routes.get((payload.get('method'), payload.get('url')))
+        return endpoint if endpoint is not None else compile_endpoint(payload)
+
+
+class CatalogCache:
+    """LRU of compiled catalogs, each valid for the catalog version it was built at."""
+
+    def __init__(self, max_entries: int, memory_budget_bytes: int):
+        self._max_entries = max_entries
+        self._budget = memory_budget_bytes
+        self._catalogs: "OrderedDict[str, IntegrationCatalog]" = OrderedDict()
+        self._building: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._stats = {'hits': 0, 'builds': 0, 'evictions': 0}
+
+    async def cached(self, integration_id: str) -> Optional[IntegrationCatalog]:
+        """The integration's catalog if one is cached at the current version; never builds one."""
+        catalog = self._catalogs.get(integration_id)
+        if catalog is None or catalog.version != await catalog_version(integration_id):
+            return None
+        self._catalogs.move_to_end(integration_id)
+        self._stats['hits'] += 1
+        return catalog
+
+    async def get(self, integration_id: str) -> IntegrationCatalog:
+        version = await catalog_version(integration_id)
+        if version is None or self._max_entries <= 0 or self._budget <= 0:
+            self._stats['builds'] += 1
+            return IntegrationCatalog(await get_all_endpoints(integration_id), version)
+
+        catalog = self._catalogs.get(integration_id)
+        if catalog is not None and catalog.version == version:
+            self._catalogs.move_to_end(integration_id)
+            self._stats['hits'] += 1
+            return catalog
+
+        # Concurrent requests for the same version share one build; when the
+        # request running it is cancelled, a waiter takes the build over
+        key = (integration_id, version)
+        building = self._building.get(key)
+        while building is not None:
+            try:
+                return await asyncio.shield(building)
+            except asyncio.CancelledError:
+                if not building.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            building = self._building.get(key)
+
+        building = asyncio.get_running_loop().create_future()
+        self._building[key] = building
+        try:
+            catalog = IntegrationCatalog(await get_all_endpoints(integration_id), version)
+        except Exception as exc:
+            building.set_exception(exc)
+            # Nobody else may be waiting; mark the exception as retrieved
+            building.exception()
+            raise
+        else:
+            building.set_result(catalog)
+        finally:
+            # Cancelled while building: release the waiters instead of stranding them
+            if not building.done():
+                building.cancel()
+            self._building.pop(key, None)
+
+        self._stats['builds'] += 1
+        self._catalogs.pop(integration_id, None)
+        if catalog.nbytes > self._budget:
+            # Served to this request only; caching it would evict everything else
+            return catalog
+        self._catalogs[integration_id] = catalog
+        while (len(self._catalogs) > self._max_entries
+               or sum(cached.nbytes for cached in self._catalogs.values()) > self._budget):
+            self._catalogs.popitem(last=False)
+            self._stats['evictions'] += 1
+        return catalog
+
+    def drop(self, integration_id: str) -> None:
+        self._catalogs.pop(integration_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            'entries': len(self._catalogs),
+            'bytes': sum(catalog.nbytes for catalog in self._catalogs.values()),
+            'memory_budget_bytes': self._budget,
+        }
+
+
+catalog_cache = CatalogCache(CATALOG_CACHE_SIZE, CATALOG_CACHE_MEMORY_MB * 1024 * 1024)
@@ -8,12 +8,14 @@ for endpoint identification, query execution, and deep thinking operations.
 import json
 import os
 from pathlib import Path
+from typing import Any, List, Optional, Tuple
 from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
 
 from rag.services import EndpointService, QueryExecutionService, DeepThinkService
 from schemas.raapi_schemas.rag import DeepThinkSchema, IdentifyEndpointsRequest, RunQuerySchema, GenerateStepsSchema
 from utils.general import append_datetime_to_query
+from utils.llm_cache import llm_cache_stats, use_llm_cache
 
 # Router initialization
 run_query_router = APIRouter()
@@ -38,6 +40,7 @@ def load_integration_manual(integration_uuid: str) -> str:
 @run_query_router.post("/identify-endpoints")
 async def identify_endpoints(request: IdentifyEndpointsRequest):
     """Identify relevant endpoints for a given query."""
+    use_llm_cache(request.llm_config.cache)
     # Append datetime context to query
     query_with_datetime = append_datetime_to_query(request.query)
     
@@ -53,6 +56,7 @@ async def identify_endpoints(request: IdentifyEndpointsRequest):
 @run_query_router.post("/generate-steps")
 async def generate_steps(request: GenerateStepsSchema):
     """Generate steps for a given query based on available integrations."""
+    use_llm_cache(request.llm_config.cache)
     # Setup deep thinking environment
     integrations = DeepThinkService.setup_deep_think(
         request.llm_config, 
@@ -71,7 +75,7 @@ async def generate_steps(request: GenerateStepsSchema):
     # Associate each step with an integration
     steps_with_integrations = []
     for step in steps:
-        integration_uuid = DeepThinkService.select_integration_for_step(step, integrations)
+        integration_uuid = await DeepThinkService.select_integration_for_step(step, integrations)
         steps_with_integrations.append({
             "step": step,
             "integration_uuid": integration_uuid
@@ -87,8 +91,20 @@ async def generate_steps(request: GenerateStepsSchema):
 @run_query_router.post("/action")
 async def run_endpoint(request: RunQuerySchema, _called_from_deep: bool = False):
     """Execute a query against the identified endpoint."""
+    use_llm_cache(request.llm_config.cache)
+    return await _run_query(request, called_from_deep=_called_from_deep)
+
+
+async def _run_query(request: RunQuerySchema, called_from_deep: bool = False,
+                     prefetched: Optional[Tuple[str, List[Any]]] = None):
+    """
+    Identify the endpoint for the query and call it.
+
+    Deep mode passes `prefetched` as the (rephrased query, retrieved
+    endpoints) of its batched retrieval round so the step is not searched again.
+    """
     # Setup LM environment if called individually (not from deep)
-    if not _called_from_deep:
+    if not called_from_deep:
         DeepThinkService.setup_deep_think(
             request.llm_config, 
             [request.integration_id]
@@ -101,9 +117,10 @@ async def run_endpoint(request: RunQuerySchema, _called_from_deep: bool = False)
     retrieved_vectors = await EndpointService.identify_endpoints(
         integration_id=request.integration_id,
         api_base=request.api_base,
-        query=query_with_datetime,
+        query=prefetched[0] if prefetched else query_with_datetime,
         rephraser=request.rephraser,
-        rephrasal_instructions=request.rephrasal_instructions
+        rephrasal_instructions=request.rephrasal_instructions,
+        search_result=prefetched[1] if prefetched else None
     )
     print(retrieved_vectors)
     
@@ -130,6 +147,7 @@ async def run_endpoint(request: RunQuerySchema, _called_from_deep: bool = False)
 
 async def deep_stream_generator(request: DeepThinkSchema):
     """Generator function that yields streaming data for deep thinking query."""
+    use_llm_cache(request.llm_config.cache)
     # Setup deep thinking environment
     integrations = DeepThinkService.setup_deep_think(
         request.llm_config, 
@@ -167,8 +185,18 @@ async def deep_stream_generator(request: DeepThinkSchema):
         if is_complete or next_step is None:
             break
         
-        # Select integration for this step
-        integration_uuid = DeepThinkService.select_integration_for_step(next_step, integrations)
+        # One retrieval round over every connected integration; the pick below
+        # reuses its results instead of searching its collection again
+        matches = await EndpointService.search_integrations(
+            request.integrations,
+            append_datetime_to_query(next_step),
+            request.rephraser,
+            request.rephrasal_instructions,
+        )
+
+        # Select integration for this step, routing on the retrieval round's scores
+        integration_uuid = await DeepThinkService.select_integration_for_step(
+            next_step, integrations, matches.query_vectors.dense, matches.similarities)
         
         # Find integration name for display
         integration_name = integration_uuid
@@ -193,7 +221,7 @@ async def deep_stream_generator(request: DeepThinkSchema):
         integration_manual = load_integration_manual(integration_uuid)
 
         # Execute the step via /action endpoint
-        result = await run_endpoint(RunQuerySchema(
+        result = await _run_query(RunQuerySchema(
             rephraser=request.rephraser,
             rephrasal_instructions=request.rephrasal_instructions,
             integration_id=integration_uuid,
@@ -206,7 +234,8 @@ async def deep_stream_generator(request: DeepThinkSchema):
             llm_config=request.llm_config,
             query=next_step,
             natural_language_response=True  # Get natural language response for streaming
-        ), _called_from_deep=True)
+        ), called_from_deep=True, prefetched=(
+            (matches.query, matches.points[integration_uuid]) if integration_uuid in matches.points else None))
 
         # Store the raw response data for the next step
         context_data[f"step_{step_counter}"] = {
@@ -254,6 +283,12 @@ async def deep_stream_generator(request: DeepThinkSchema):
     }) + "\n"
 
 
+@run_query_router.get("/llm-cache")
+async def llm_cache():
+    """Hit, miss and bypass counters of the agent response cache in this process."""
+    return llm_cache_stats.report()
+
+
 @run_query_router.post("/deep")
 async def deep(request: DeepThinkSchema):
     """Execute a deep thinking query that may require multiple steps with streaming response."""
@@ -1,152 +1,200 @@
+import asyncio
 from fastapi import HTTPException
-from fastembed import LateInteractionTextEmbedding, SparseTextEmbedding, TextEmbedding
 from qdrant_client import models
-import requests
-from typing import List, Callable
+from typing import Any, Dict, List, Optional
 from qdrant_client.models import ScoredPoint
 from schemas.raapi_schemas.query import Query
-from utils.upsert import qdrant_client
-import json
+from utils.embeddings import DENSE, LATE, SPARSE
+from utils.query_embeddings import QueryVectors, query_embedder
+from utils.retrieval_config import FUSION, RERANK, SPARSE_ONLY, get_retrieval_settings
+from utils.retrieval_cache import cache_results, catalog_version, get_cached_results
+from utils.local_index import local_index
+from utils.qdrant_collections import collection_registry, quantization_search_params
 
-from config import DENSE_EMBEDDING_MODEL, LATE_EMBEDDING_MODEL, SPARSE_EMBEDDING_MODEL
+from config import DENSE_EMBEDDING_MODEL, LATE_EMBEDDING_MODEL, SPARSE_EMBEDDING_MODEL, async_qdrant_client
 
 
-dense_embedding_model = TextEmbedding(
-    f"sentence-transformers/{DENSE_EMBEDDING_MODEL}")
-bm25_embedding_model = SparseTextEmbedding(
-    f"Qdrant/{SPARSE_EMBEDDING_MODEL}")
-late_interaction_embedding_model = LateInteractionTextEmbedding(
-    f"colbert-ir/{LATE_EMBEDDING_MODEL}")
+FUSIONS = {
+    'rrf': models.Fusion.RRF,
+    'dbsf': models.Fusion.DBSF,
+}
 
+# Models whose query vectors each retrieval mode needs
+MODE_KINDS = {
+    FUSION: (DENSE, SPARSE, LATE),
+    RERANK: (DENSE, SPARSE, LATE),
+    SPARSE_ONLY: (SPARSE,),
+}
 
-async def query_db(request: Query):
+
+def _sparse_query(sparse_query_vector) -> models.SparseVector:
+    return models.SparseVector(**sparse_query_vector.as_object())
+
+
+def build_retrieval_query(settings: Dict[str, Any], query_vectors: QueryVectors) -> Dict[str, Any]:
     """
-    Run a query against the vector database using multiple embedding models.
+    Build the `query_points` arguments for the integration's retrieval mode.
+
+    - fusion: dense, sparse and ColBERT searches fused with RRF or DBSF
+    - rerank: dense and sparse candidates rescored by ColBERT MaxSim, so
+      ColBERT never searches the whole collection
+    - sparse: a single BM25 search
     """
-    try:
-        dense_query_vector = next(
-            dense_embedding_model.query_embed(request.query))
-        sparse_query_vector = next(
-            bm25_embedding_model.query_embed(request.query))
-        late_query_vector = next(
-            late_interaction_embedding_model.query_embed(request.query))
-
-        prefetch = [
-            models.Prefetch(
-                query=dense_query_vector,
-                using=DENSE_EMBEDDING_MODEL,
-                limit=20,
-            ),
-            models.Prefetch(
-                query=models.SparseVector(**sparse_query_vector.as_object()),
-                using=SPARSE_EMBEDDING_MODEL,
-                limit=20,
-            ),
+    search_params = quantization_search_params()
+
+    if settings['mode'] == SPARSE_ONLY:
+        return {
+            'query': _sparse_query(query_vectors.sparse),
+            'using': SPARSE_EMBEDDING_MODEL,
+        }
+
+    candidates = [
+        models.Prefetch(
+            query=query_vectors.dense,
+            using=DENSE_EMBEDDING_MODEL,
+            params=search_params,
+            limit=settings['dense_limit'],
+        ),
+        models.Prefetch(
+            query=_sparse_query(query_vectors.sparse),
+            using=SPARSE_EMBEDDING_MODEL,
+            limit=settings['sparse_limit'],
+        ),
+    ]
+    late_query_vector = query_vectors.late.tolist()
+
+    if settings['mode'] == RERANK:
+        return {
+            'prefetch': candidates,
+            'query': late_query_vector,
+            'using': LATE_EMBEDDING_MODEL,
+            'search_params': search_params,
+        }
+
+    return {
+        'prefetch': candidates + [
             models.Prefetch(
                 query=late_query_vector,
                 using=LATE_EMBEDDING_MODEL,
-                limit=20,
+                params=search_params,
+                limit=settings['late_limit'],
             ),
-        ]
+        ],
+        'query': models.FusionQuery(fusion=FUSIONS[settings['fusion']]),
+    }
+
+
+async def _retrieve(
+    integration_id: str,
+    query: str,
+    settings: Dict[str, Any],
+    version: Optional[int],
+    query_vectors: QueryVectors
+) -> List[ScoredPoint]:
+    """Search one integration with already embedded query vectors and cache the result."""
+    if local_index is not None:
+        points = await local_index.search(integration_id, version, settings, query_vectors)
+        if points is not None:
+            await cache_results(integration_id, query, version, settings, points)
+            return points
+
+    points = await async_qdrant_client.query_points(
+        integration_id,
+        with_payload=True,
+        limit=settings['top_k'],
+        **build_retrieval_query(settings, query_vectors),
+    )
+
+    await cache_results(integration_id, query, version, settings, points.points)
+    return points.points
 
-        points = qdrant_client.query_points(
-            request.integration_id,
-            prefetch=prefetch,
-            query=models.FusionQuery(fusion=models.Fusion.RRF),
-            with_payload=True,
-            limit=5,
-        )
 
-        return points.points
+async def query_db(request: Query):
+    """
+    Run a query against the vector database with the integration's retrieval pipeline.
+    """
+    try:
+        settings = get_retrieval_settings(request.integration_id)
+        version = await catalog_version(request.integration_id)
+        cached = await get_cached_results(request.integration_id, request.query, version, settings)
+        if cached is not None:
+            return cached
+
+        query_vectors = await query_embedder.embed(request.query, MODE_KINDS[settings['mode']])
+        return await _retrieve(request.integration_id, request.query, settings, version, query_vectors)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def get_all_endpoints(integration_id: str):
-    points = qdrant_client.query_points(
-        collection_name=integration_id, with_payload=True)
-    return points.points
-
-
-def tool_factory(api_base: str, endpoints: List[ScoredPoint]) -> List[Callable]:
+async def query_integrations(
+    query: str,
+    integration_ids: List[str],
+    query_vectors: Optional[QueryVectors] = None
+) -> Dict[str, List[ScoredPoint]]:
     """
-    Creates a list of callable functions for GET endpoints that are marked as tools.
-    Each function makes an HTTP request to the corresponding endpoint.
+    Run one query against several integrations at once.
 
-    Args:
-        endpoints: A list of ScoredPoint objects representing the endpoints.
-
-    Returns:
-        A list of callable functions, each corresponding to a GET tool endpoint.
+    The query is embedded once, for every model the integrations' retrieval
+    modes need (unless the caller passes `query_vectors` for all of them),
+    and the collections are searched concurrently. Returns each
+    integration's points, best first; integrations without a collection are
+    left out.
     """
-    tools = []
-
-    for endpoint in endpoints:
-        # Check if the endpoint is a tool and uses the GET method
-        if endpoint.payload.get('tool', False) and endpoint.payload['method'] == 'GET':
-            # Extract relevant information from the payload
-            url = endpoint.payload['url']
-            description = endpoint.payload['description']
-            parameters_str = endpoint.payload.get(
-                'parameters', '[]')  # Default to '[]' if not present
-
-            # Parse the parameters field from a JSON string to a Python object
-            try:
-                parameters = json.loads(parameters_str)
-            except json.JSONDecodeError as e:
-                raise ValueError(
-                    f"Failed to parse 'parameters' field for endpoint {url}: {e}")
-
-            # Extract parameter names and their required status
-            param_definitions = []
-            for param in parameters:
-                param_name = param['name']
-                # Default to False if 'required' is not specified
-                is_required = param.get('required', False)
-                if is_required:
-                    # Required parameters have no default value
-                    param_definitions.append(param_name)
-                else:
-                    # Optional parameters default to None
-                    param_definitions.append(f"{param_name}=None")
-
-            # Dynamically create the function with explicit arguments
-            def create_tool_function(url, description, param_definitions):
-                # Define the function signature dynamically
-                arg_list = ", ".join(param_definitions)
-                param_names = [param.split('=')[0]
-                               for param in param_definitions]
-                # print(arg_list)
-                function_code = f"""
-def tool_function({arg_list}):
-    \"\"\"
-    {description}
-    \"\"\"
-    params = {{}}
-    # Explicitly add arguments to the params dictionary
-    for param in {param_names}:
-        if locals().get(param) is not None:
-            params[param] = locals()[param]
     try:
-        print("Making request to:", url)
-        print("Request parameters:", params)
-        response = requests.get(api_base + url, params=params)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        return response.json()
+        integration_ids = [
+            integration_id for integration_id in dict.fromkeys(integration_ids)
+            if await collection_registry.exists(integration_id)
+        ]
+        settings = {integration_id: get_retrieval_settings(integration_id) for integration_id in integration_ids}
+        versions = dict(zip(integration_ids, await asyncio.gather(
+            *(catalog_version(integration_id) for integration_id in integration_ids))))
+        results = dict(zip(integration_ids, await asyncio.gather(*(
+            get_cached_results(integration_id, query, versions[integration_id], settings[integration_id])
+            for integration_id in integration_ids
+        ))))
+
+        pending = [integration_id for integration_id, points in results.items() if points is None]
+        if pending:
+            if query_vectors is None:
+                kinds = {kind for integration_id in pending for kind in MODE_KINDS[settings[integration_id]['mode']]}
+                query_vectors = await query_embedder.embed(query, [kind for kind in (DENSE, SPARSE, LATE) if kind in kinds])
+            retrieved = await asyncio.gather(*(
+                _retrieve(integration_id, query, settings[integration_id], versions[integration_id], query_vectors)
+                for integration_id in pending
+            ))
+            results.update(zip(pending, retrieved))
+        return results
+
     except Exception as e:
-        print(f"Error making request: {{e}}")
-        return {{"error": str(e)}}
-"""
-                # Execute the function code in a local namespace
-                local_namespace = {}
-                exec(function_code, {
-                     'requests': requests, 'url': url, 'api_base': api_base}, local_namespace)
-                return local_namespace['tool_function']
-
-            # Create the tool function and add it to the list
-            tool_function = create_tool_function(
-                url, description, param_definitions)
-            tools.append(tool_function)
-
-    return tools
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def dense_matches(integration_id: str, dense_vector: Any, limit: int, with_payload: bool = True) -> List[ScoredPoint]:
+    """The integration's `limit` endpoints closest to `dense_vector`, scored by cosine similarity."""
+    return (await async_qdrant_client.query_points(
+        integration_id,
+        query=dense_vector,
+        using=DENSE_EMBEDDING_MODEL,
+        limit=limit,
+        with_payload=with_payload,
+        search_params=quantization_search_params(),
+    )).points
+
+
+async def get_all_endpoints(integration_id: str):
+    """Every endpoint of the integration, scrolled page by page."""
+    points = []
+    offset = None
+    while True:
+        page, offset = await async_qdrant_client.scroll(
+            collection_name=integration_id,
+            limit=256,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False,
+        )
+        points.extend(page)
+        if offset is None:
+            return points
+
@@ -8,14 +8,14 @@ where each step calls a single platform's API via the /action endpoint.
 import json
 from typing import Dict, List, Any, Optional, Tuple
 
-import dspy
-
 from rag.agents.decomposer_agent import DECOMPOSER_AGENT, InputModel as DecomposerInputModel, DYNAMIC_STEP_AGENT, DynamicStepInputModel
 from rag.agents.integration_picker import INTEGRATION_PICKER, InputModel as IntegrationPickerInputModel
 from rag.agents.text_response_generator import TEXT_RESPONSE_GENERATOR, InputModel as TextInputModel
 from models import session, Integration
 from utils.general import sqlalchemy_object_to_dict
-from config import LLM_API_KEYS
+from utils.integration_router import integration_router
+from utils.lm_pool import bind_lm
+from config import INTEGRATION_ROUTER_ENABLED
 
 
 class DeepThinkService:
@@ -23,16 +23,8 @@ class DeepThinkService:
 
     @staticmethod
     def _configure_dspy(llm_config: Any) -> None:
-        """Configure DSPy with the provided LLM configuration."""
-        api_key = LLM_API_KEYS.get(llm_config.llm, "")
-        if not api_key:
-            raise ValueError(f"No API key found for LLM: {llm_config.llm}")
-
-        lm = dspy.LM(
-            model=llm_config.llm,
-            api_key=api_key
-        )
-        dspy.configure(lm=lm)
+        """Bind the pooled LM for the configured LLM to this request's agent calls."""
+        bind_lm(llm_config.llm)
 
     @staticmethod
     def _get_integrations(integration_uuids: List[str]) -> List[Dict]:
@@ -120,11 +112,38 @@ class DeepThinkService:
         return result.output.next_step, result.output.is_complete, result.output.reasoning
 
     @staticmethod
-    def select_integration_for_step(step: str, integrations: List[Dict]) -> str:
-        """Select the appropriate integration for a step."""
+    def _picker_integrations(integrations: List[Dict]) -> List[Dict]:
+        """Only the fields the integration picker needs to decide."""
+        return [
+            {'uuid': i['uuid'], 'name': i.get('name'), 'description': i.get('description')}
+            for i in integrations
+        ]
+
+    @staticmethod
+    async def select_integration_for_step(
+        step: str,
+        integrations: List[Dict],
+        step_vector: Optional[Any] = None,
+        endpoint_similarities: Optional[Dict[str, float]] = None
+    ) -> str:
+        """
+        Select the appropriate integration for a step.
+
+        Steps are routed by embedding similarity; the LLM picker only decides
+        when the router finds the best candidates too close. `step_vector`
+        and `endpoint_similarities` come from the step's retrieval round
+        (`EndpointService.search_integrations`) so the step is not embedded
+        again.
+        """
+        if INTEGRATION_ROUTER_ENABLED:
+            integration_uuid = await integration_router.route(
+                step, integrations, step_vector, endpoint_similarities)
+            if integration_uuid is not None:
+                return integration_uuid
+
         id_agent = INTEGRATION_PICKER(input=IntegrationPickerInputModel(
             query=step,
-            integrations=integrations
+            integrations=DeepThinkService._picker_integrations(integrations)
         ))
         return id_agent.output.uuid
 
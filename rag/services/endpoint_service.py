@@ -5,13 +5,33 @@ This service handles the identification of relevant API endpoints based on user
 including query rephrasing, vector search, and endpoint filtering.
 """
 
-import json
-from typing import Dict, List, Any
+import asyncio
+from typing import Dict, List, Any, NamedTuple, Optional
+
+from qdrant_client.models import ScoredPoint
 
 from rag.agents.rephraser_signature import REPHRASER_AGENT, InputModel as RephraserInputModel
 from rag.agents.endpoint_filterer_signature import ENDPOINT_FILTERER_AGENT, Endpoint, InputModel as EndpointFiltererInputModel
-from rag.query import query_db
+from config import SMALL_CATALOG_THRESHOLD
+from rag.catalog import IntegrationCatalog, catalog_cache, compile_endpoint
+from rag.query import MODE_KINDS, dense_matches, query_db, query_integrations
 from schemas.raapi_schemas.query import Query
+from utils.embeddings import DENSE, LATE, SPARSE
+from utils.qdrant_collections import collection_registry
+from utils.query_embeddings import QueryVectors, query_embedder
+from utils.retrieval_cache import cached_catalog_size
+from utils.retrieval_config import get_retrieval_settings
+
+
+class IntegrationMatches(NamedTuple):
+    """One query's candidates across integrations."""
+    # The query that was searched, after rephrasing
+    query: str
+    # Candidate endpoints per integration, best first
+    points: Dict[str, List[ScoredPoint]]
+    # Cosine similarity of the query to each integration's closest endpoint
+    similarities: Dict[str, float]
+    query_vectors: QueryVectors
 
 
 class EndpointService:
@@ -35,19 +55,96 @@ class EndpointService:
         return rephrased_agent_output.output.rephrased_query
     
     @staticmethod
-    def _build_vector_data(search_result: List[Any], api_base: str) -> List[Dict[str, Any]]:
-        """Build vector data from search results."""
+    async def _is_small_catalog(integration_id: str) -> bool:
+        """Check whether the whole catalog fits what vector search would return anyway."""
+        if SMALL_CATALOG_THRESHOLD <= 0 or not await collection_registry.exists(integration_id):
+            return False
+        return await cached_catalog_size(integration_id) <= SMALL_CATALOG_THRESHOLD
+
+    @classmethod
+    async def _search_endpoints(cls, integration_id: str, query: str) -> List[Any]:
+        """Return candidate endpoints, skipping vector search for small catalogs."""
+        if await cls._is_small_catalog(integration_id):
+            return (await catalog_cache.get(integration_id)).points
+
+        return await query_db(request=Query(
+            integration_id=integration_id,
+            query=query
+        ))
+
+    @classmethod
+    async def search_integrations(
+        cls,
+        integration_ids: List[str],
+        query: str,
+        rephraser: bool = False,
+        rephrasal_instructions: Optional[str] = None
+    ) -> IntegrationMatches:
+        """
+        Candidate endpoints of every integration for one query, in a single retrieval round.
+
+        The query is rephrased first if `rephraser` is set, then embedded
+        once. Small catalogs are returned whole, ranked by dense similarity;
+        the others run their retrieval pipeline concurrently, plus a single
+        dense match so every integration gets a comparable best-endpoint
+        similarity for routing.
+        """
+        query = cls._rephrase_query(query, rephraser, rephrasal_instructions)
+        integration_ids = [
+            integration_id for integration_id in dict.fromkeys(integration_ids)
+            if await collection_registry.exists(integration_id)
+        ]
+        small = await asyncio.gather(*(cls._is_small_catalog(integration_id) for integration_id in integration_ids))
+        searched = [integration_id for integration_id, is_small in zip(integration_ids, small) if not is_small]
+
+        kinds = {DENSE} | {
+            kind for integration_id in searched
+            for kind in MODE_KINDS[get_retrieval_settings(integration_id)['mode']]
+        }
+        query_vectors = await query_embedder.embed(query, [kind for kind in (DENSE, SPARSE, LATE) if kind in kinds])
+
+        closest, retrieved = await asyncio.gather(
+            asyncio.gather(*(
+                dense_matches(
+                    integration_id,
+                    query_vectors.dense,
+                    SMALL_CATALOG_THRESHOLD if is_small else 1,
+                    with_payload=is_small,
+                )
+                for integration_id, is_small in zip(integration_ids, small)
+            )),
+            query_integrations(query, searched, query_vectors),
+        )
+        points = {
+            integration_id: matches
+            for integration_id, matches, is_small in zip(integration_ids, closest, small) if is_small
+        }
+        points.update(retrieved)
+        similarities = {
+            integration_id: matches[0].score
+            for integration_id, matches in zip(integration_ids, closest) if matches
+        }
+        return IntegrationMatches(query, points, similarities, query_vectors)
+
+    @staticmethod
+    def _build_vector_data(
+        search_result: List[Any],
+        api_base: str,
+        catalog: Optional[IntegrationCatalog] = None
+    ) -> List[Dict[str, Any]]:
+        """Build vector data from search results, with schemas from the cached catalog or parsed here."""
         fetched_vectors = []
         for result in search_result:
+            endpoint = catalog.endpoint_for(result.payload) if catalog is not None else compile_endpoint(result.payload)
             vector_data = {
-                'id': f"{result.payload.get('method')}_{api_base}{result.payload.get('url')}",
+                'id': f"{endpoint.method}_{api_base}{endpoint.url}",
                 'metadata': {
-                    'description': result.payload.get('description'),
-                    'method': result.payload.get('method'),
-                    'url': result.payload.get('url'),
-                    'parameters': result.payload.get('parameters'),
-                    'body': result.payload.get("body"),
-                    'response': result.payload.get("response")
+                    'description': endpoint.description,
+                    'method': endpoint.method,
+                    'url': endpoint.url,
+                    'parameters': endpoint.parameters,
+                    'body': endpoint.body,
+                    'response': endpoint.response
                 }
             }
             fetched_vectors.append(vector_data)
@@ -80,30 +177,39 @@ class EndpointService:
                 if endpoint.method + "_" + endpoint.url == fetched_vector['id']:
                     data = dict(endpoint)
                     data['id'] = fetched_vector['id']
-                    data['parameters'] = json.loads(fetched_vector['metadata']['parameters'])
-                    data['body'] = json.loads(fetched_vector['metadata']['body'])
-                    data['response'] = json.loads(fetched_vector['metadata']['response'])
+                    data['parameters'] = fetched_vector['metadata']['parameters']
+                    data['body'] = fetched_vector['metadata']['body']
+                    data['response'] = fetched_vector['metadata']['response']
                     final_response.append(data)
         return final_response
     
     @classmethod
     async def identify_endpoints(cls, integration_id: str, api_base: str, query: str, 
-                                rephraser: bool, rephrasal_instructions: str) -> Dict[str, Any]:
-        """Main method to identify relevant endpoints for a given query."""
+                                rephraser: bool, rephrasal_instructions: str,
+                                search_result: Optional[List[Any]] = None) -> Dict[str, Any]:
+        """
+        Main method to identify relevant endpoints for a given query.
+
+        When `search_result` is given (endpoints already retrieved for `query`,
+        e.g. by `search_integrations`), `query` is taken as already rephrased
+        and neither rephrasing nor search runs again.
+        """
         # Normalize API base
         normalized_api_base = cls._normalize_api_base(api_base)
         
-        # Rephrase query if needed
-        rephrased_query = cls._rephrase_query(query, rephraser, rephrasal_instructions)
-        
-        # Search for relevant endpoints
-        search_result = await query_db(request=Query(
-            integration_id=integration_id, 
-            query=rephrased_query
-        ))
+        if search_result is None:
+            # Rephrase query if needed
+            rephrased_query = cls._rephrase_query(query, rephraser, rephrasal_instructions)
+            
+            # Search for relevant endpoints
+            search_result = await cls._search_endpoints(integration_id, rephrased_query)
+        else:
+            rephrased_query = query
         
         # Build vector data
-        fetched_vectors = cls._build_vector_data(search_result, normalized_api_base)
+        # Only the retrieved endpoints are compiled unless the catalog is cached already
+        catalog = await catalog_cache.cached(integration_id)
+        fetched_vectors = cls._build_vector_data(search_result, normalized_api_base, catalog)
         
         # Filter endpoints
         filtered_endpoints = cls._filter_endpoints(fetched_vectors, rephrased_query)
@@ -7,18 +7,16 @@ including parameter generation, API calls, and natural language response generat
 
 import json
 import time
-from typing import Dict, List, Any
+from typing import Dict, Any
 
-import dspy
 import requests
 
 from rag.agents.final_response_signature import FINAL_RESPONSE_GENERATOR_AGENT, InputModel as FinalResponseGeneratorInputModel
 from rag.agents.request_generator import (
-    DataExtractorSignature,
+    DATA_EXTRACTOR_AGENT,
     DataExtractorInputModel
 )
-from rag.query import get_all_endpoints, tool_factory
-from config import LLM_API_KEYS
+from utils.lm_pool import bind_lm
 
 
 class QueryExecutionService:
@@ -26,19 +24,11 @@ class QueryExecutionService:
     
     @staticmethod
     def _configure_dspy(llm_config: Any) -> None:
-        """Configure DSPy with the provided LLM configuration."""
-        api_key = LLM_API_KEYS.get(llm_config.llm, "")
-        if not api_key:
-            raise ValueError(f"No API key found for LLM: {llm_config.llm}")
-        
-        lm = dspy.LM(
-            model=llm_config.llm,
-            api_key=api_key
-        )
-        dspy.configure(lm=lm)
+        """Bind the pooled LM for the configured LLM to this request's agent calls."""
+        bind_lm(llm_config.llm)
     
     @staticmethod
-    def _extract_data(schema: Dict, tools: List, query: str, schema_type: str, additional_context: Dict[str, Any] = None) -> Dict:
+    def _extract_data(schema: Dict, query: str, schema_type: str, additional_context: Dict[str, Any] = None) -> Dict:
         """Extract structured data from query using the provided schema with strict validation."""
         if not schema:
             return {}
@@ -60,8 +50,7 @@ class QueryExecutionService:
             if "integration_manual" in additional_context and additional_context["integration_manual"]:
                 enhanced_query = f"{enhanced_query}\n\nIntegration Manual:\n{additional_context['integration_manual']}"
         
-        data_extractor = dspy.Predict(DataExtractorSignature)
-        result = data_extractor(input=DataExtractorInputModel(
+        result = DATA_EXTRACTOR_AGENT(input=DataExtractorInputModel(
             query=enhanced_query,
             schema=schema,
             schema_type=schema_type
@@ -85,22 +74,20 @@ class QueryExecutionService:
         return extracted_data
     
     @staticmethod
-    def _generate_parameters(vector: Dict, tools: List, query: str, additional_context: Dict[str, Any] = None) -> Dict:
+    def _generate_parameters(vector: Dict, query: str, additional_context: Dict[str, Any] = None) -> Dict:
         """Generate parameters for the API request using the unified data extractor."""
         return QueryExecutionService._extract_data(
             schema=vector['parameters'], 
-            tools=tools, 
             query=query, 
             schema_type="parameters",
             additional_context=additional_context
         )
     
     @staticmethod
-    def _generate_body(vector: Dict, tools: List, query: str, additional_context: Dict[str, Any] = None) -> Dict:
+    def _generate_body(vector: Dict, query: str, additional_context: Dict[str, Any] = None) -> Dict:
         """Generate body for the API request using the unified data extractor."""
         return QueryExecutionService._extract_data(
             schema=vector['body'], 
-            tools=tools, 
             query=query, 
             schema_type="body",
             additional_context=additional_context
@@ -171,13 +158,9 @@ class QueryExecutionService:
         # Configure DSPy
         cls._configure_dspy(llm_config)
         
-        # Setup tools
-        all_endpoints = await get_all_endpoints(integration_id)
-        tools = tool_factory(api_base, all_endpoints)
-        
         # Generate parameters and body with context
-        params = cls._generate_parameters(vector, tools, query, additional_context)
-        body = cls._generate_body(vector, tools, query, additional_context)
+        params = cls._generate_parameters(vector, query, additional_context)
+        body = cls._generate_body(vector, query, additional_context)
 
         # Print params for debugging
         print(f"[DEBUG] Params being sent to requests: {params}")
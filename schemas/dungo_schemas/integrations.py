@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, List, Literal
 
 
 class CreateIntegrationModel(BaseModel):
@@ -16,8 +16,45 @@ class DeleteIntegrationModel(BaseModel):
 class DeleteIntegrationEndpointModel(BaseModel):
     url: str
     integration_id: str
+    # Without a method every endpoint at `url` is deleted
+    method: Optional[str] = None
+
+
+class EndpointSelectorModel(BaseModel):
+    # Unset lists match any value; at least one of them must be set
+    urls: Optional[List[str]] = None
+    methods: Optional[List[str]] = None
+
+
+class BulkDeleteEndpointsModel(BaseModel):
+    integration_id: str
+    selector: EndpointSelectorModel
+
+
+class BulkEditEndpointsModel(BaseModel):
+    integration_id: str
+    selector: EndpointSelectorModel
+    metadata: Dict[str, Any]
 
 
 class UpdateIntegrationDescriptionModel(BaseModel):
     id: int
-    description: str
\ No newline at end of file
+    description: str
+
+class ConvertCollectionModel(BaseModel):
+    integration_id: str
+    # Unset options keep the collection's current setting
+    quantization: Optional[Literal["none", "scalar", "binary"]] = None
+    late_datatype: Optional[Literal["float32", "float16"]] = None
+    late_on_disk: Optional[bool] = None
+
+
+class RetrievalConfigModel(BaseModel):
+    integration_id: str
+    # Unset fields are left as they are, null resets a field to the default
+    mode: Optional[Literal["fusion", "rerank", "sparse"]] = None
+    fusion: Optional[Literal["rrf", "dbsf"]] = None
+    dense_limit: Optional[int] = Field(None, ge=1)
+    sparse_limit: Optional[int] = Field(None, ge=1)
+    late_limit: Optional[int] = Field(None, ge=1)
+    top_k: Optional[int] = Field(None, ge=1)
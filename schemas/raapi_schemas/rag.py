@@ -4,6 +4,8 @@ from pydantic import BaseModel, Field
 
 class LLMConfig(BaseModel):
     llm: str = Field(default="gpt-4.1", description="Identifier for the LLM")
+    cache: bool = Field(
+        default=True, description="Serve identical agent calls from the LLM response cache; false always calls the LLM")
 
 
 class IdentifyEndpointsRequest(BaseModel):
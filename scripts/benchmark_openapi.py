@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark OpenAPI schema flattening for Kramen Backend
+
+This script builds a synthetic spec with deeply shared component schemas and
+compares the uncached `convert_schema_to_fields` against `ComponentTable`.
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path to import modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.openapi import ComponentTable, convert_schema_to_fields, find_ref_schema
+
+
+def build_components(layers: int, width: int, fan_out: int, seed: int) -> dict:
+    """Build `layers` of `width` object schemas, each referencing `fan_out` schemas of the next layer."""
+    rng = random.Random(seed)
+    components = {}
+    for layer in range(layers):
+        for index in range(width):
+            properties = {
+                "id": {"type": "string", "description": f"Identifier of L{layer}_{index}"},
+                "count": {"type": "integer"},
+            }
+            if layer + 1 < layers:
+                for target in rng.sample(range(width), fan_out):
+                    ref = f"#/components/schemas/L{layer + 1}_{target}"
+                    properties[f"child_{target}"] = {"type": "object", "$ref": ref}
+                    properties[f"children_{target}"] = {"type": "array", "items": {"$ref": ref}}
+            else:
+                # Close a cycle back to the top layer
+                properties["parent"] = {"type": "object", "$ref": f"#/components/schemas/L0_{index}"}
+            components[f"L{layer}_{index}"] = {"type": "object", "properties": properties}
+    return components
+
+
+def build_operations(count: int, width: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [
+        {"$ref": f"#/components/schemas/L0_{rng.randrange(width)}"}
+        for _ in range(count)
+    ]
+
+
+def flatten_uncached(operations: list, components: dict) -> None:
+    for schema in operations:
+        convert_schema_to_fields(find_ref_schema(schema["$ref"], components), components)
+
+
+def flatten_with_table(operations: list, components: dict) -> ComponentTable:
+    table = ComponentTable(components)
+    for schema in operations:
+        table.fields_for(schema)
+    return table
+
+
+def timed(func, *args):
+    # Both implementations print on cycles, keep that out of the timings
+    with contextlib.redirect_stdout(io.StringIO()):
+        start_time = time.perf_counter()
+        result = func(*args)
+        return time.perf_counter() - start_time, result
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--width", type=int, default=10)
+    parser.add_argument("--fan-out", type=int, default=2)
+    parser.add_argument("--operations", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    components = build_components(args.layers, args.width, args.fan_out, args.seed)
+    operations = build_operations(args.operations, args.width, args.seed)
+
+    print("📐 OpenAPI schema flattening benchmark")
+    print("=" * 40)
+    print(f"Components: {len(components)}  Operations: {len(operations)}")
+
+    uncached_seconds, _ = timed(flatten_uncached, operations, components)
+    table_seconds, table = timed(flatten_with_table, operations, components)
+
+    print(f"convert_schema_to_fields: {uncached_seconds:.3f}s")
+    print(f"ComponentTable:           {table_seconds:.3f}s "
+          f"({table.misses} components flattened, {table.hits} cache hits)")
+    if table_seconds:
+        print(f"Speedup: {uncached_seconds / table_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
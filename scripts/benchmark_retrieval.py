@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Benchmark endpoint retrieval for Kramen Backend
+
+This script generates synthetic OpenAPI catalogs of several sizes, ingests
+them through the regular upsert path into an in-memory Qdrant, replays a
+labelled set of paraphrased queries and reports recall@k, MRR and latency
+percentiles (query embedding included) for every retrieval configuration.
+
+With `--embedder hashing` the fastembed models are replaced by deterministic
+feature-hashing stand-ins, so the run needs no network or model downloads;
+those numbers measure the pipeline, not the models. `--local-index` also
+scores every configuration with the in-process NumPy mirror.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+from fastembed.sparse.sparse_embedding_base import SparseEmbedding
+
+# Add parent directory to path to import modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+# Every query must be embedded and searched, and nothing may need Redis
+os.environ.setdefault("RETRIEVAL_CACHE_ENABLED", "false")
+os.environ.setdefault("QUERY_EMBED_CACHE_SIZE", "0")
+os.environ.setdefault("EMBEDDING_CACHE_BACKEND", "none")
+os.environ.setdefault("EMBEDDING_POOL_WORKERS", "0")
+os.environ.setdefault("LOCAL_INDEX_ENABLED", "false")
+# Queries are replayed one at a time; set the window to measure batching on its own
+os.environ.setdefault("QUERY_EMBED_BATCH_WINDOW_MS", "0")
+
+RESOURCES = [
+    ("invoice", "invoices"), ("customer", "customers"), ("subscription", "subscriptions"),
+    ("payment", "payments"), ("refund", "refunds"), ("product", "products"),
+    ("order", "orders"), ("shipment", "shipments"), ("issue", "issues"),
+    ("project", "projects"), ("comment", "comments"), ("label", "labels"),
+    ("milestone", "milestones"), ("user", "users"), ("team", "teams"),
+    ("channel", "channels"), ("message", "messages"), ("file", "files"),
+    ("folder", "folders"), ("event", "events"), ("meeting", "meetings"),
+    ("contact", "contacts"), ("deal", "deals"), ("ticket", "tickets"),
+    ("webhook", "webhooks"), ("report", "reports"), ("dashboard", "dashboards"),
+    ("task", "tasks"), ("note", "notes"), ("repository", "repositories"),
+    ("branch", "branches"), ("deployment", "deployments"), ("alert", "alerts"),
+    ("incident", "incidents"), ("employee", "employees"), ("expense", "expenses"),
+    ("budget", "budgets"), ("campaign", "campaigns"), ("coupon", "coupons"),
+    ("document", "documents"),
+]
+
+# (method, path suffix, description, paraphrased queries)
+ACTIONS = [
+    ("get", "", "List all {plural}{scope}",
+     ["show me all my {plural}{scope}", "what {plural} do we have{scope}", "give me a list of {plural}{scope}"]),
+    ("post", "", "Create a new {singular}{scope}",
+     ["make a new {singular}{scope}", "add a {singular}{scope}", "I want to set up another {singular}{scope}"]),
+    ("get", "/{{id}}", "Retrieve a single {singular} by its id{scope}",
+     ["get the details of {singular} 42{scope}", "open {singular} number 7{scope}", "look up one {singular}{scope}"]),
+    ("patch", "/{{id}}", "Update an existing {singular}{scope}",
+     ["change the name of my {singular}{scope}", "edit the {singular}{scope}", "modify {singular} 12{scope}"]),
+    ("delete", "/{{id}}", "Delete a {singular}{scope}",
+     ["remove the {singular}{scope}", "get rid of {singular} 9{scope}", "permanently delete this {singular}{scope}"]),
+    ("get", "/search", "Search {plural} matching a text query{scope}",
+     ["find {plural} that mention budget{scope}", "search through {plural} for overdue{scope}", "which {plural} contain the word launch{scope}"]),
+]
+
+# Path prefix and description suffix that scope an operation, for catalogs
+# larger than one operation per resource and action
+SCOPES = [
+    ("", ""), ("/teams/{team_id}", " of a team"), ("/projects/{project_id}", " in a project"),
+    ("/organizations/{org_id}", " of an organization"), ("/accounts/{account_id}", " for an account"),
+    ("/workspaces/{workspace_id}", " in a workspace"), ("/regions/{region}", " in a region"),
+    ("/folders/{folder_id}", " inside a folder"),
+]
+
+CONFIGURATIONS = {
+    "fusion-rrf": {"mode": "fusion", "fusion": "rrf"},
+    "fusion-dbsf": {"mode": "fusion", "fusion": "dbsf"},
+    "rerank": {"mode": "rerank"},
+    "sparse": {"mode": "sparse"},
+}
+
+
+def build_catalog(size: int, seed: int):
+    """A synthetic OpenAPI spec of `size` operations and their query templates."""
+    operations = [
+        (scope, resource, action)
+        for scope in SCOPES for resource in RESOURCES for action in ACTIONS
+    ]
+    if size > len(operations):
+        raise ValueError(f"Catalogs are limited to {len(operations)} operations")
+    # Unscoped operations first, so small catalogs look like real ones
+    unscoped = len(RESOURCES) * len(ACTIONS)
+    rng = random.Random(seed)
+    chosen = rng.sample(operations[:unscoped], min(size, unscoped))
+    chosen += rng.sample(operations[unscoped:], size - len(chosen))
+
+    paths = {}
+    templates = []
+    for (prefix, scope), (singular, plural), (method, suffix, description, queries) in chosen:
+        path = f"{prefix}/{plural}{suffix.format()}"
+        words = {"singular": singular, "plural": plural, "scope": scope}
+        operation = {
+            "description": description.format(**words),
+            "parameters": [
+                {"name": name, "in": "path", "required": True, "schema": {"type": "string"}}
+                for name in re.findall(r"{(\w+)}", path)
+            ],
+            "responses": {"200": {"content": {"application/json": {"schema": {"$ref": "#/components/schemas/Record"}}}}},
+        }
+        if method in ("post", "patch"):
+            operation["requestBody"] = {"content": {"application/json": {"schema": {"$ref": "#/components/schemas/Record"}}}}
+        paths.setdefault(path, {})[method] = operation
+        templates.append(((method.upper(), path), [query.format(**words) for query in queries]))
+
+    spec = {
+        "openapi": "3.0.0",
+        "paths": paths,
+        "components": {"schemas": {"Record": {"type": "object", "properties": {
+            "id": {"type": "string"}, "name": {"type": "string"}, "created": {"type": "string"},
+        }}}},
+    }
+    return spec, templates
+
+
+def build_queries(templates, count: int, seed: int):
+    """`count` labelled (query, (method, url)) pairs."""
+    rng = random.Random(seed)
+    return [
+        (rng.choice(queries), label)
+        for label, queries in (rng.choice(templates) for _ in range(count))
+    ]
+
+
+def _tokens(text: str):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def _hash(token: str, salt: str = "") -> int:
+    return zlib.crc32(f"{salt}{token}".encode("utf-8"))
+
+
+def _token_vector(token: str, dimensions: int) -> np.ndarray:
+    vector = np.random.default_rng(_hash(token, "late")).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class HashingDense:
+    """Signed feature hashing of words and word bigrams."""
+
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        tokens = _tokens(text)
+        for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            digest = _hash(feature, "dense")
+            vector[digest % self.dimensions] += 1.0 if digest & 1 << 31 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def passage_embed(self, texts, batch_size: int = 256, **kwargs):
+        for text in texts:
+            yield self._embed(text)
+
+    def query_embed(self, query, **kwargs):
+        for text in [query] if isinstance(query, str) else query:
+            yield self._embed(text)
+
+
+class HashingSparse:
+    """Saturated term frequencies on hashed term ids; Qdrant applies IDF."""
+
+    def _embed(self, text: str) -> SparseEmbedding:
+        counts = {}
+        for token in _tokens(text) or ["empty"]:
+            term = _hash(token, "sparse") % (1 << 31)
+            counts[term] = counts.get(term, 0) + 1
+        terms = sorted(counts)
+        values = [counts[term] * 2.2 / (counts[term] + 1.2) for term in terms]
+        return SparseEmbedding(values=np.asarray(values, dtype=np.float32), indices=np.asarray(terms))
+
+    def passage_embed(self, texts, batch_size: int = 256, **kwargs):
+        for text in texts:
+            yield self._embed(text)
+
+    def query_embed(self, query, **kwargs):
+        for text in [query] if isinstance(query, str) else query:
+            yield self._embed(text)
+
+
+class HashingLate:
+    """One pseudo-random unit vector per word."""
+
+    def __init__(self, dimensions: int = 128):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> np.ndarray:
+        return np.stack([_token_vector(token, self.dimensions) for token in _tokens(text) or ["empty"]])
+
+    def passage_embed(self, texts, batch_size: int = 256, **kwargs):
+        for text in texts:
+            yield self._embed(text)
+
+    def query_embed(self, query, **kwargs):
+        for text in [query] if isinstance(query, str) else query:
+            yield self._embed(text)
+
+
+def percentile(values, q: float) -> float:
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+
+def score(ranked, label, k: int):
+    """(hit within k, reciprocal rank) of `label` in the ranked (method, url) list."""
+    for rank, key in enumerate(ranked[:k], start=1):
+        if key == label:
+            return 1.0, 1.0 / rank
+    return 0.0, 0.0
+
+
+async def run(args) -> None:
+    import config
+    from qdrant_client import AsyncQdrantClient
+
+    config.async_qdrant_client = AsyncQdrantClient(args.qdrant_url)
+    # Keep the benchmark's retrieval settings out of the application database
+    config.DATABASE_URL = "sqlite://"
+
+    from rag.query import MODE_KINDS, build_retrieval_query
+    from utils.embeddings import DENSE, LATE, SPARSE, embedding_models
+    from utils.local_index import IntegrationMirror, load_records
+    from utils.openapi import extract_routes
+    from utils.qdrant_collections import collection_registry
+    from utils.query_embeddings import query_embedder
+    from utils.retrieval_config import DEFAULT_SETTINGS
+    from utils.upsert import upsert_vectors
+
+    if args.embedder == "hashing":
+        embedding_models.install(DENSE, HashingDense(), "hashing/dense")
+        embedding_models.install(SPARSE, HashingSparse(), "hashing/sparse")
+        embedding_models.install(LATE, HashingLate(), "hashing/late")
+
+    client = config.async_qdrant_client
+    names = args.configs.split(",") if args.configs else list(CONFIGURATIONS)
+
+    print("🔎 Endpoint retrieval benchmark")
+    print("=" * 40)
+    print(f"Embedder: {args.embedder}  k: {args.k}  Queries per catalog: {args.queries}  "
+          f"Query batch window: {config.QUERY_EMBED_BATCH_WINDOW_MS:g} ms")
+
+    for size in [int(size) for size in args.sizes.split(",")]:
+        integration_id = f"benchmark_{size}"
+        spec, templates = build_catalog(size, args.seed)
+        queries = build_queries(templates, args.queries, args.seed + size)
+
+        if await collection_registry.exists(integration_id):
+            await collection_registry.drop(integration_id)
+        start_time = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            routes = list(extract_routes(io.StringIO(json.dumps(spec)), integration_id, []))
+            await upsert_vectors(integration_id, [{'text': route['text'], 'metadata': route} for route in routes])
+        ingest_seconds = time.perf_counter() - start_time
+
+        mirror = None
+        if args.local_index:
+            mirror = IntegrationMirror(await load_records(client, integration_id))
+
+        print(f"\nCatalog of {size} endpoints (ingested in {ingest_seconds:.1f}s)")
+        print(f"{'configuration':<20}{'recall@k':>10}{'MRR':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+
+        for name in names:
+            settings = {**DEFAULT_SETTINGS, **CONFIGURATIONS[name], 'top_k': args.k}
+            backends = [("", None)] + ([("+local", mirror)] if mirror is not None else [])
+            for suffix, local in backends:
+                hits, reciprocal_ranks, latencies = [], [], []
+                for query, label in queries:
+                    start_time = time.perf_counter()
+                    query_vectors = await query_embedder.embed(query, MODE_KINDS[settings['mode']])
+                    if local is not None:
+                        points = local.search(settings, query_vectors)
+                    else:
+                        points = (await client.query_points(
+                            integration_id,
+                            with_payload=['method', 'url'],
+                            limit=settings['top_k'],
+                            **build_retrieval_query(settings, query_vectors),
+                        )).points
+                    latencies.append(time.perf_counter() - start_time)
+
+                    ranked = [(point.payload['method'], point.payload['url']) for point in points]
+                    hit, reciprocal_rank = score(ranked, label, args.k)
+                    hits.append(hit)
+                    reciprocal_ranks.append(reciprocal_rank)
+
+                print(f"{name + suffix:<20}{np.mean(hits):>10.3f}{np.mean(reciprocal_ranks):>8.3f}"
+                      f"{percentile(latencies, 50):>9.2f}{percentile(latencies, 95):>9.2f}"
+                      f"{percentile(latencies, 99):>9.2f}")
+
+        await collection_registry.drop(integration_id)
+
+    query_embedder.shutdown()
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="50,500,1500", help="comma-separated catalog sizes")
+    parser.add_argument("--queries", type=int, default=200, help="labelled queries per catalog")
+    parser.add_argument("--k", type=int, default=5, help="results per query (top_k)")
+    parser.add_argument("--configs", default="", help=f"subset of {','.join(CONFIGURATIONS)}")
+    parser.add_argument("--embedder", choices=("fastembed", "hashing"), default="fastembed")
+    parser.add_argument("--local-index", action="store_true", help="also score with the NumPy mirror")
+    parser.add_argument("--qdrant-url", default=":memory:", help="Qdrant location, in-memory by default")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
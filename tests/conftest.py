@@ -0,0 +1,89 @@
+"""
+Shared test setup: in-memory Qdrant, fake Redis and deterministic embedders.
+
+Modules import `async_qdrant_client` and `redis_client` from `config` by name,
+so both are replaced before any application module is imported.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pytest
+
+os.environ.setdefault("EMBEDDING_CACHE_BACKEND", "none")
+os.environ.setdefault("EMBEDDING_POOL_WORKERS", "0")
+os.environ.setdefault("LOCAL_INDEX_ENABLED", "false")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+import fakeredis  # noqa: E402
+from fastembed.sparse.sparse_embedding_base import SparseEmbedding  # noqa: E402
+from qdrant_client import AsyncQdrantClient  # noqa: E402
+
+import config  # noqa: E402
+
+config.DATABASE_URL = "sqlite://"
+config.async_qdrant_client = AsyncQdrantClient(":memory:")
+config.redis_client = fakeredis.FakeAsyncRedis()
+
+from utils.embeddings import DENSE, LATE, SPARSE, embedding_models  # noqa: E402
+
+
+def _vector(text: str, dimensions: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeModel:
+    def __init__(self, embed_one):
+        self._embed_one = embed_one
+
+    def passage_embed(self, texts, batch_size: int = 256, **kwargs):
+        for text in texts:
+            yield self._embed_one(text)
+
+    def query_embed(self, query, **kwargs):
+        for text in [query] if isinstance(query, str) else query:
+            yield self._embed_one(text)
+
+
+def _sparse(text: str) -> SparseEmbedding:
+    terms = sorted({int(hashlib.md5(word.encode('utf-8')).hexdigest()[:7], 16) for word in text.split() or ['empty']})
+    return SparseEmbedding(values=np.ones(len(terms), dtype=np.float32), indices=np.asarray(terms))
+
+
+embedding_models.install(DENSE, FakeModel(lambda text: _vector(text, 64)), "fake/dense")
+embedding_models.install(SPARSE, FakeModel(_sparse), "fake/sparse")
+embedding_models.install(LATE, FakeModel(lambda text: np.stack([_vector(word, 16) for word in text.split() or ['empty']])), "fake/late")
+
+
+def _spec(*operations):
+    paths = {}
+    for method, path in operations:
+        paths.setdefault(path, {})[method] = {'description': f"{method} {path}"}
+    return {'paths': paths}
+
+
+@pytest.fixture
+def spec():
+    """Build an OpenAPI document from (method, path) pairs."""
+    return _spec
+
+
+@pytest.fixture
+def ingest():
+    """Run an ingestion job for a spec document to completion."""
+    from utils.ingestion_jobs import COMPLETED, QUEUE_KEY, create_job, get_job, run_job
+
+    async def ingest(integration_id, document, selected_endpoints=(), prune=True):
+        async def chunks():
+            yield json.dumps(document).encode('utf-8')
+
+        job = await create_job(integration_id, list(selected_endpoints), chunks(), prune=prune)
+        await config.redis_client.lrem(QUEUE_KEY, 0, job['id'])
+        await run_job(job['id'])
+        assert (await get_job(job['id']))['status'] == COMPLETED
+
+    return ingest
@@ -0,0 +1,45 @@
+import importlib.util
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+SCRIPT = Path(__file__).parent.parent / "scripts" / "benchmark_retrieval.py"
+
+spec = importlib.util.spec_from_file_location("benchmark_retrieval", SCRIPT)
+benchmark = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(benchmark)
+
+
+def test_catalogs_are_deterministic_and_label_real_operations():
+    document, templates = benchmark.build_catalog(60, seed=1)
+    assert benchmark.build_catalog(60, seed=1) == (document, templates)
+
+    operations = {(method.upper(), path) for path, item in document['paths'].items() for method in item}
+    assert len(operations) == len(templates) == 60
+    for query, label in benchmark.build_queries(templates, 30, seed=2):
+        assert label in operations and query
+
+
+def test_scores_count_hits_within_k_and_reciprocal_rank():
+    ranked = [('GET', '/a'), ('POST', '/a'), ('GET', '/b')]
+    assert benchmark.score(ranked, ('POST', '/a'), k=3) == (1.0, 0.5)
+    assert benchmark.score(ranked, ('GET', '/b'), k=2) == (0.0, 0.0)
+    assert benchmark.percentile([0.001, 0.002, 0.003], 50) == 2.0
+
+
+def test_hashing_embedders_are_deterministic():
+    for embedder in (benchmark.HashingDense(), benchmark.HashingSparse(), benchmark.HashingLate()):
+        first, second = embedder.passage_embed(["list open invoices", "list open invoices"])
+        assert np.array_equal(getattr(first, 'values', first), getattr(second, 'values', second))
+
+
+def test_offline_run_reports_every_configuration():
+    result = subprocess.run(
+        [sys.executable, str(SCRIPT), "--embedder", "hashing", "--sizes", "20", "--queries", "10", "--local-index"],
+        capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    rows = [line.split()[0] for line in result.stdout.splitlines() if line[:1].islower() and len(line.split()) == 6]
+    assert rows == [name + suffix for name in benchmark.CONFIGURATIONS for suffix in ("", "+local")]
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import uuid
+
+from rag import catalog
+from rag.catalog import CatalogCache
+
+
+def test_cancelled_build_hands_over_to_waiters(monkeypatch):
+    calls = []
+
+    async def get_all_endpoints(integration_id):
+        calls.append(integration_id)
+        if len(calls) == 1:
+            await asyncio.Event().wait()
+        return []
+
+    monkeypatch.setattr(catalog, 'get_all_endpoints', get_all_endpoints)
+    cache = CatalogCache(4, 1 << 20)
+    integration_id = str(uuid.uuid4())
+
+    async def scenario():
+        builder = asyncio.create_task(cache.get(integration_id))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.get(integration_id))
+        await asyncio.sleep(0.01)
+        builder.cancel()
+        return await asyncio.wait_for(waiter, 1)
+
+    assert asyncio.run(scenario()).points == []
+    assert len(calls) == 2
+
+
+def test_endpoint_for_returns_the_compiled_schemas(spec, ingest):
+    integration_id = str(uuid.uuid4())
+
+    async def scenario():
+        await ingest(integration_id, spec(('get', '/a'), ('post', '/b')))
+        return await CatalogCache(4, 1 << 20).get(integration_id)
+
+    compiled = asyncio.run(scenario())
+    payload = compiled.points[0].payload
+    endpoint = compiled.endpoint_for(payload)
+    assert endpoint in compiled.endpoints
+    assert (endpoint.method, endpoint.url) == (payload['method'], payload['url'])
+    assert endpoint.parameters == [] and endpoint.body == []
+
+    missing = compiled.endpoint_for({**payload, 'url': '/missing', 'body': '[{"key": "x"}]'})
+    assert missing.url == '/missing' and missing.body == [{'key': 'x'}]
+
+
+class Point:
+    def __init__(self, url, size):
+        self.payload = {'method': 'GET', 'url': url, 'body': '[]', 'response': json.dumps(["x" * size])}
+
+
+def test_cached_never_builds_and_the_cache_stays_within_its_budget(monkeypatch):
+    built = []
+
+    async def get_all_endpoints(integration_id):
+        built.append(integration_id)
+        return [Point(f"/{index}", 10_000) for index in range(10)]
+
+    async def catalog_version(integration_id):
+        return 1
+
+    monkeypatch.setattr(catalog, 'get_all_endpoints', get_all_endpoints)
+    monkeypatch.setattr(catalog, 'catalog_version', catalog_version)
+    cache = CatalogCache(8, 250_000)
+
+    async def scenario():
+        assert await cache.cached('first') is None
+        assert built == []
+        await cache.get('first')
+        assert await cache.cached('first') is not None
+        await cache.get('second')
+        await cache.get('third')
+        return cache.stats()
+
+    stats = asyncio.run(scenario())
+    assert built == ['first', 'second', 'third']
+    assert stats['bytes'] <= 250_000 < 3 * (stats['bytes'] // stats['entries'])
+    assert stats['evictions'] >= 1
@@ -0,0 +1,46 @@
+import asyncio
+import uuid
+
+import pytest
+
+import config
+from dungo import integrations
+from dungo.integrations import edit_vector
+from schemas.raapi_schemas.rag import EditVectorSchema
+from utils.endpoint_points import find_endpoint_points
+from utils.upsert import point_id_for
+
+
+def edit(integration_id, description):
+    return EditVectorSchema(integration_id=integration_id, new_metadata={
+        'method': 'GET', 'url': '/a', 'description': description})
+
+
+def test_reworded_endpoint_is_overwritten_in_place(spec, ingest):
+    integration_id = str(uuid.uuid4())
+
+    async def scenario():
+        await ingest(integration_id, spec(('get', '/a'), ('get', '/b')))
+        await edit_vector(edit(integration_id, "list the alpha records"))
+        return await find_endpoint_points(integration_id, '/a', 'GET')
+
+    points = asyncio.run(scenario())
+    assert len(points) == 1
+    assert str(points[0].id) == point_id_for(integration_id, 'GET', '/a')
+    assert points[0].payload['description'] == "list the alpha records"
+
+
+def test_failed_embedding_keeps_the_endpoint(monkeypatch, spec, ingest):
+    integration_id = str(uuid.uuid4())
+
+    async def failing_upsert(request):
+        raise RuntimeError("embedder unavailable")
+
+    async def scenario():
+        await ingest(integration_id, spec(('get', '/a')))
+        monkeypatch.setattr(integrations, 'upsert_vector', failing_upsert)
+        with pytest.raises(RuntimeError):
+            await edit_vector(edit(integration_id, "list the alpha records"))
+        return await config.async_qdrant_client.count(integration_id)
+
+    assert asyncio.run(scenario()).count == 1
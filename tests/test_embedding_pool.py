@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils import embedding_pool
+from utils.embedding_pool import EmbeddingPool
+from utils.embeddings import DENSE
+
+TEXTS = [f"GET /resource/{index}" for index in range(10)]
+
+
+def pool_with_threads(monkeypatch, workers):
+    """A pool whose workers are threads sharing the conftest's fake models."""
+    slices = []
+    embed_slice = embedding_pool._embed_slice
+
+    def recording_embed_slice(kind, texts, batch_size):
+        slices.append(list(texts))
+        return embed_slice(kind, texts, batch_size)
+
+    monkeypatch.setattr(embedding_pool, '_embed_slice', recording_embed_slice)
+    pool = EmbeddingPool(workers, threads_per_worker=1)
+    pool._executor = ThreadPoolExecutor(workers)
+    return pool, slices
+
+
+def test_slices_come_back_in_input_order(monkeypatch):
+    pool, slices = pool_with_threads(monkeypatch, 4)
+    try:
+        vectors = pool.embed(DENSE, TEXTS, batch_size=256)
+    finally:
+        pool.shutdown()
+
+    assert len(slices) == 4 and sum(slices, []) == TEXTS
+    inline = EmbeddingPool(0, 1).embed(DENSE, TEXTS)
+    assert all(np.array_equal(pooled, expected) for pooled, expected in zip(vectors, inline))
+
+
+def test_slices_never_exceed_a_batch(monkeypatch):
+    pool, slices = pool_with_threads(monkeypatch, 2)
+    try:
+        pool.embed(DENSE, TEXTS, batch_size=3)
+    finally:
+        pool.shutdown()
+
+    assert [len(texts) for texts in slices] == [3, 3, 3, 1]
+
+
+def test_single_worker_pools_embed_inline():
+    pool = EmbeddingPool(1, 1)
+    assert not pool.enabled
+    assert len(pool.embed(DENSE, TEXTS)) == len(TEXTS)
+    assert pool._executor is None
@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+from utils.embeddings import DENSE, SPARSE, EmbeddingModelRegistry
+
+
+class RecordingModel:
+    loads = []
+
+    def __init__(self, model_name, threads=None):
+        self.model_name = model_name
+        self.threads = threads
+        RecordingModel.loads.append(model_name)
+
+
+def registry():
+    RecordingModel.loads = []
+    return EmbeddingModelRegistry({
+        DENSE: {'cls': RecordingModel, 'model_name': 'fake/dense', 'vector_name': 'dense', 'threads': 0},
+        SPARSE: {'cls': RecordingModel, 'model_name': 'fake/sparse', 'vector_name': 'sparse', 'threads': 0},
+    })
+
+
+def test_models_load_on_first_use_only_once():
+    models = registry()
+    assert not models.describe()[DENSE]['loaded']
+
+    threads = [threading.Thread(target=models.get, args=(DENSE,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert RecordingModel.loads == ['fake/dense']
+    assert models.get(DENSE) is models.dense
+    assert models.describe()[DENSE]['loaded'] and not models.describe()[SPARSE]['loaded']
+
+
+def test_thread_overrides_only_reach_unloaded_models():
+    models = registry()
+    models.get(DENSE)
+    models.set_threads(2)
+
+    assert models.get(DENSE).threads is None
+    assert models.get(SPARSE).threads == 2
+
+
+def test_unknown_kinds_are_rejected():
+    with pytest.raises(ValueError):
+        registry().get('late')
@@ -0,0 +1,62 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from dungo.integrations import endpoints
+from utils.endpoint_points import list_endpoints, parse_cursor, stream_endpoints_ndjson
+
+OPERATIONS = [('get', f"/items/{index}") for index in range(5)]
+
+
+def test_pages_cover_the_catalog_with_only_the_projected_fields(spec, ingest):
+    integration_id = str(uuid.uuid4())
+
+    async def scenario():
+        await ingest(integration_id, spec(*OPERATIONS))
+        pages = []
+        cursor = None
+        while True:
+            payloads, cursor = await list_endpoints(integration_id, 2, cursor, ['method', 'url'])
+            pages.append(payloads)
+            if cursor is None:
+                return pages
+
+    pages = asyncio.run(scenario())
+    assert [len(page) for page in pages] == [2, 2, 1]
+    payloads = [payload for page in pages for payload in page]
+    assert all(set(payload) == {'method', 'url'} for payload in payloads)
+    assert sorted(payload['url'] for payload in payloads) == sorted(url for _, url in OPERATIONS)
+
+
+def test_ndjson_streams_every_page_from_the_cursor(spec, ingest):
+    integration_id = str(uuid.uuid4())
+
+    async def scenario():
+        await ingest(integration_id, spec(*OPERATIONS))
+        first_page, cursor = await list_endpoints(integration_id, 2, None, ['url'])
+        lines = [line async for line in stream_endpoints_ndjson(integration_id, 2, cursor, ['url'])]
+        return first_page, lines
+
+    first_page, lines = asyncio.run(scenario())
+    assert all(line.endswith("\n") for line in lines)
+    urls = [payload['url'] for payload in first_page] + [json.loads(line)['url'] for line in lines]
+    assert sorted(urls) == sorted(url for _, url in OPERATIONS)
+
+
+def test_malformed_cursors_are_rejected(spec, ingest):
+    integration_id = str(uuid.uuid4())
+    assert parse_cursor("42") == 42
+    assert parse_cursor(str(uuid.UUID(int=1))) == str(uuid.UUID(int=1))
+    with pytest.raises(ValueError):
+        parse_cursor("not-a-cursor")
+
+    async def scenario():
+        await ingest(integration_id, spec(*OPERATIONS))
+        await endpoints(integration_id=integration_id, cursor="not-a-cursor", limit=2, fields=None, format="json")
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(scenario())
+    assert error.value.status_code == 400
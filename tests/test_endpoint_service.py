@@ -0,0 +1,35 @@
+import asyncio
+import uuid
+
+from qdrant_client.models import ScoredPoint
+
+from rag.services import endpoint_service
+from rag.services.endpoint_service import EndpointService
+
+
+def test_search_integrations_scores_small_and_large_catalogs(monkeypatch, spec, ingest):
+    monkeypatch.setattr(endpoint_service, 'SMALL_CATALOG_THRESHOLD', 2)
+    small, large = str(uuid.uuid4()), str(uuid.uuid4())
+
+    async def scenario():
+        await ingest(small, spec(('get', '/a'), ('get', '/b')))
+        await ingest(large, spec(('get', '/a'), ('get', '/b'), ('get', '/c')))
+        return await EndpointService.search_integrations([small, large], 'list the a records')
+
+    matches = asyncio.run(scenario())
+    assert set(matches.points) == {small, large}
+    assert set(matches.similarities) == {small, large}
+    for points in matches.points.values():
+        assert points and all(isinstance(point, ScoredPoint) for point in points)
+    assert len(matches.points[small]) == 2
+    assert matches.query_vectors.dense is not None
+
+
+def test_without_a_cached_catalog_only_the_retrieved_payloads_are_parsed():
+    point = ScoredPoint(id=1, version=0, score=1.0, payload={
+        'method': 'GET', 'url': '/a', 'description': 'list a',
+        'parameters': '[]', 'body': '[]', 'response': '[{"key": "id"}]'})
+
+    vectors = EndpointService._build_vector_data([point], 'https://api.example.com')
+    assert vectors[0]['id'] == 'GET_https://api.example.com/a'
+    assert vectors[0]['metadata']['response'] == [{'key': 'id'}]
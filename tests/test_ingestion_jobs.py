@@ -0,0 +1,82 @@
+import asyncio
+import json
+import uuid
+
+import config
+from qdrant_client import models
+
+from config import async_qdrant_client
+from utils.ingestion_jobs import COMPLETED, FAILED, QUEUE_KEY, create_job, get_job, run_job, update_job
+
+
+async def stored_endpoints(integration_id):
+    points, _ = await async_qdrant_client.scroll(integration_id, limit=100, with_payload=['method', 'url'])
+    return sorted((point.payload['method'], point.payload['url']) for point in points)
+
+
+def test_subset_reupload_keeps_the_rest_of_the_spec(spec, ingest):
+    integration_id = str(uuid.uuid4())
+    document = spec(('get', '/a'), ('post', '/a'), ('get', '/b'))
+
+    async def scenario():
+        await ingest(integration_id, document)
+        await ingest(integration_id, document, selected_endpoints=['GET_/a'])
+        return await stored_endpoints(integration_id)
+
+    assert asyncio.run(scenario()) == [('GET', '/a'), ('GET', '/b'), ('POST', '/a')]
+
+
+def test_prune_deletes_endpoints_removed_from_the_spec(spec, ingest):
+    integration_id = str(uuid.uuid4())
+
+    async def scenario():
+        await ingest(integration_id, spec(('get', '/a'), ('get', '/b')))
+        await ingest(integration_id, spec(('get', '/a')))
+        return await stored_endpoints(integration_id)
+
+    assert asyncio.run(scenario()) == [('GET', '/a')]
+
+
+def test_spec_without_operations_prunes_nothing(spec, ingest):
+    integration_id = str(uuid.uuid4())
+
+    async def scenario():
+        await ingest(integration_id, spec(('get', '/a'), ('get', '/b')))
+        await ingest(integration_id, spec())
+        return await stored_endpoints(integration_id)
+
+    assert asyncio.run(scenario()) == [('GET', '/a'), ('GET', '/b')]
+
+
+def test_prune_keeps_points_stored_with_legacy_random_ids(spec, ingest):
+    integration_id = str(uuid.uuid4())
+
+    async def scenario():
+        await ingest(integration_id, spec(('get', '/a'), ('get', '/c')))
+        # A point for GET /b as stored before point IDs were derived from the endpoint
+        [point], _ = await async_qdrant_client.scroll(integration_id, limit=1, with_payload=True, with_vectors=True)
+        await async_qdrant_client.upsert(integration_id, points=[models.PointStruct(
+            id=str(uuid.uuid4()), vector=point.vector, payload={**point.payload, 'url': '/b'})])
+
+        await ingest(integration_id, spec(('get', '/a'), ('get', '/b')), selected_endpoints=['GET_/a'])
+        return await stored_endpoints(integration_id)
+
+    assert asyncio.run(scenario()) == [('GET', '/a'), ('GET', '/b')]
+
+
+def test_resumed_job_adds_to_the_embedded_count_of_earlier_attempts(spec):
+    integration_id = str(uuid.uuid4())
+
+    async def scenario():
+        async def chunks():
+            yield json.dumps(spec(('get', '/a'), ('get', '/b'), ('get', '/c'))).encode('utf-8')
+
+        job = await create_job(integration_id, [], chunks())
+        await config.redis_client.lrem(QUEUE_KEY, 0, job['id'])
+        # As left by an attempt that embedded five texts and indexed the first endpoint
+        await update_job(job['id'], status=FAILED, indexed=1, embedded=5)
+        await run_job(job['id'])
+        return await get_job(job['id'])
+
+    job = asyncio.run(scenario())
+    assert (job['status'], job['indexed'], job['embedded']) == (COMPLETED, 3, 7)
@@ -0,0 +1,59 @@
+import asyncio
+from types import SimpleNamespace
+
+from rag.services import deep_think_service
+from rag.services.deep_think_service import DeepThinkService
+from utils.embedding_pool import embedding_pool
+from utils.integration_router import IntegrationRouter
+
+INTEGRATIONS = [
+    {'uuid': 'github', 'name': 'GitHub', 'description': 'Repositories and pull requests'},
+    {'uuid': 'slack', 'name': 'Slack', 'description': 'Channels and messages'},
+]
+
+
+def test_endpoint_similarities_can_outrank_descriptions():
+    router = IntegrationRouter(margin=0.05, include_endpoints=True)
+    ranked = asyncio.run(router.scores('post a message', INTEGRATIONS, endpoint_similarities={'github': 0.99}))
+    assert ranked[0] == ('github', 0.99)
+
+
+def test_drop_forgets_the_integration():
+    router = IntegrationRouter(margin=0.05, include_endpoints=False)
+
+    async def scenario():
+        await asyncio.gather(*(router.scores('post a message', INTEGRATIONS) for _ in range(3)))
+        router.drop('slack')
+
+    asyncio.run(scenario())
+    assert router.stats()['integrations'] == 1
+
+
+def test_descriptions_are_embedded_without_the_worker_pool(monkeypatch):
+    def embed(kind, texts):
+        raise AssertionError("the router must not start the ingestion embedding pool")
+
+    monkeypatch.setattr(embedding_pool, 'embed', embed)
+    router = IntegrationRouter(margin=0.05, include_endpoints=False)
+    ranked = asyncio.run(router.scores('post a message', INTEGRATIONS))
+    assert {integration_id for integration_id, _ in ranked} == {'github', 'slack'}
+
+
+def test_llm_picker_decides_only_when_the_top_two_are_within_the_margin(monkeypatch):
+    picked = []
+
+    def picker(input):
+        picked.append(input.query)
+        return SimpleNamespace(output=SimpleNamespace(uuid='slack'))
+
+    monkeypatch.setattr(deep_think_service, 'INTEGRATION_ROUTER_ENABLED', True)
+    monkeypatch.setattr(deep_think_service, 'INTEGRATION_PICKER', picker)
+    monkeypatch.setattr(deep_think_service, 'integration_router', IntegrationRouter(margin=0.05, include_endpoints=True))
+
+    async def select(step, endpoint_similarities):
+        return await DeepThinkService.select_integration_for_step(
+            step, INTEGRATIONS, endpoint_similarities=endpoint_similarities)
+
+    assert asyncio.run(select('close call', {'github': 0.99, 'slack': 0.97})) == 'slack'
+    assert asyncio.run(select('clear call', {'github': 0.99, 'slack': 0.5})) == 'github'
+    assert picked == ['close call']
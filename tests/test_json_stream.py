@@ -0,0 +1,71 @@
+import io
+import json
+
+import pytest
+
+from utils.json_stream import JSONStreamReader
+from utils.openapi import extract_routes, has_paths, iter_operations
+
+DOCUMENT = {
+    'info': {'title': 'Tricky "quoted" {braces} [brackets] \\ and é'},
+    'numbers': [123456789, -1.5e10, 0],
+    'paths': {
+        '/a': {'get': {'description': 'list a'}, 'parameters': []},
+        '/b/{id}': {'post': {'description': 'create b'}, 'delete': {'description': 'delete b'}},
+    },
+    'components': {'schemas': {'B': {'type': 'object', 'properties': {'x': {'type': 'string'}}}}},
+}
+
+
+def reader(document, chunk_size=3):
+    return JSONStreamReader(io.StringIO(json.dumps(document)), chunk_size=chunk_size)
+
+
+def test_members_decode_across_tiny_chunks():
+    stream = reader(DOCUMENT)
+    decoded = {key: stream.read_value() for key in stream.iter_object()}
+    assert decoded == DOCUMENT
+
+
+def test_skipped_values_leave_the_reader_on_the_next_key():
+    stream = reader(DOCUMENT)
+    kept = {}
+    for key in stream.iter_object():
+        if key == 'numbers':
+            kept[key] = stream.read_value()
+        else:
+            stream.skip_value()
+    assert kept == {'numbers': DOCUMENT['numbers']}
+
+
+def test_skipping_a_large_value_keeps_the_buffer_bounded():
+    document = {'big': [{'description': 'x' * 100} for _ in range(10_000)], 'after': 1}
+    stream = reader(document, chunk_size=1024)
+    assert next(stream.iter_object()) == 'big'
+    stream.skip_value()
+    assert len(stream._buf) <= 2 * 1024
+
+
+def test_operations_stream_one_path_item_at_a_time():
+    fp = io.StringIO(json.dumps(DOCUMENT))
+    assert has_paths(fp)
+    assert [(path, method) for path, method, _ in iter_operations(fp)] == [
+        ('/a', 'get'), ('/b/{id}', 'post'), ('/b/{id}', 'delete')]
+
+    routes = list(extract_routes(fp, 'integration', ['DELETE_/b/{id}']))
+    assert [(route['method'], route['url']) for route in routes] == [('DELETE', '/b/{id}')]
+
+
+def test_specs_without_paths_are_rejected():
+    fp = io.StringIO(json.dumps({'info': {}}))
+    assert not has_paths(fp)
+    with pytest.raises(ValueError):
+        list(iter_operations(fp))
+
+
+def test_truncated_documents_raise():
+    stream = JSONStreamReader(io.StringIO('{"paths": {"/a": {"get": '), chunk_size=4)
+    with pytest.raises(ValueError):
+        for _ in stream.iter_object():
+            for _ in stream.iter_object():
+                stream.read_value()
@@ -0,0 +1,75 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import dspy
+import fakeredis
+
+from utils import general, llm_cache
+from utils.general import append_datetime_to_query
+from utils.llm_cache import CachedPredictor
+
+
+class CountingPredictor:
+    signature = dspy.Signature("query -> answer")
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, **kwargs):
+        self.calls += 1
+        return dspy.Prediction(answer=f"answer {self.calls}")
+
+
+def asked_at(monkeypatch, second, minute=0):
+    class FixedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2026, 10, 17, 12, minute, second, tzinfo=timezone.utc)
+
+    monkeypatch.setattr(general, 'datetime', FixedDatetime)
+    return append_datetime_to_query("list my open issues")
+
+
+def test_identical_requests_seconds_apart_hit_the_cache(monkeypatch):
+    monkeypatch.setattr(llm_cache, 'LLM_CACHE_ENABLED', True)
+    predictor = CountingPredictor()
+    cached = CachedPredictor("test", predictor, fakeredis.FakeRedis(), ttl_seconds=60)
+    lm = SimpleNamespace(model="test/model", kwargs={})
+
+    first = cached(query=asked_at(monkeypatch, 1), lm=lm)
+    second = cached(query=asked_at(monkeypatch, 4), lm=lm)
+
+    assert predictor.calls == 1
+    assert second.answer == first.answer
+
+
+def test_requests_in_another_minute_miss_the_cache(monkeypatch):
+    monkeypatch.setattr(llm_cache, 'LLM_CACHE_ENABLED', True)
+    predictor = CountingPredictor()
+    cached = CachedPredictor("test", predictor, fakeredis.FakeRedis(), ttl_seconds=600)
+    lm = SimpleNamespace(model="test/model", kwargs={})
+
+    cached(query=asked_at(monkeypatch, 1), lm=lm)
+    cached(query=asked_at(monkeypatch, 1, minute=5), lm=lm)
+
+    assert predictor.calls == 2
+
+
+def test_day_resolution_agents_hit_across_minutes(monkeypatch):
+    monkeypatch.setattr(llm_cache, 'LLM_CACHE_ENABLED', True)
+    predictor = CountingPredictor()
+    cached = CachedPredictor("test", predictor, fakeredis.FakeRedis(), ttl_seconds=600, time_resolution='day')
+    lm = SimpleNamespace(model="test/model", kwargs={})
+
+    cached(query=asked_at(monkeypatch, 1), lm=lm)
+    cached(query=asked_at(monkeypatch, 1, minute=5), lm=lm)
+
+    assert predictor.calls == 1
+
+
+def test_credentials_stay_out_of_the_key():
+    cached = CachedPredictor("test", CountingPredictor(), fakeredis.FakeRedis(), ttl_seconds=60)
+    key = cached._key(SimpleNamespace(model="test/model", kwargs={'api_key': "sk-one", 'temperature': 0.0}), {'query': "q"})
+
+    assert key == cached._key(SimpleNamespace(model="test/model", kwargs={'api_key': "sk-two", 'temperature': 0.0}), {'query': "q"})
+    assert key != cached._key(SimpleNamespace(model="test/model", kwargs={'api_key': "sk-one", 'temperature': 1.0}), {'query': "q"})
@@ -0,0 +1,65 @@
+import asyncio
+
+import dspy
+import pytest
+
+from utils import lm_pool as lm_pool_module
+from utils.llm_cache import CachedPredictor
+from utils.lm_pool import LMPool, bind_lm, current_lm
+
+API_KEYS = {'openai/gpt-4o-mini': 'sk-one', 'anthropic/claude-3-5-haiku': 'sk-two'}
+
+
+def test_each_model_gets_one_shared_lm():
+    pool = LMPool(API_KEYS)
+    first = pool.get('openai/gpt-4o-mini')
+
+    assert pool.get('openai/gpt-4o-mini') is first
+    assert pool.get('anthropic/claude-3-5-haiku') is not first
+    assert pool.stats() == {'models': sorted(API_KEYS)}
+    with pytest.raises(ValueError):
+        pool.get('unknown/model')
+
+
+def test_concurrent_requests_keep_their_own_lm(monkeypatch):
+    monkeypatch.setattr(lm_pool_module, 'lm_pool', LMPool(API_KEYS))
+
+    async def request(model):
+        bound = bind_lm(model)
+        # Let the other request bind its LM in between
+        await asyncio.sleep(0.01)
+        return bound, current_lm()
+
+    async def scenario():
+        return await asyncio.gather(*(asyncio.create_task(request(model)) for model in API_KEYS))
+
+    results = asyncio.run(scenario())
+    assert all(bound is seen for bound, seen in results)
+    assert [seen.model for _, seen in results] == list(API_KEYS)
+    assert current_lm() is None
+
+
+def test_agents_receive_the_bound_lm(monkeypatch):
+    monkeypatch.setattr(lm_pool_module, 'lm_pool', LMPool(API_KEYS))
+    received = []
+
+    class RecordingPredictor:
+        signature = dspy.Signature("query -> answer")
+
+        def __call__(self, **kwargs):
+            received.append(kwargs.get('lm'))
+            return dspy.Prediction(answer="ok")
+
+    agent = CachedPredictor("test", RecordingPredictor(), redis=None, ttl_seconds=0)
+
+    async def request(model):
+        lm = bind_lm(model)
+        await asyncio.sleep(0.01)
+        agent(query="hello")
+        return lm
+
+    async def scenario():
+        return await asyncio.gather(*(asyncio.create_task(request(model)) for model in API_KEYS))
+
+    bound = asyncio.run(scenario())
+    assert received == bound
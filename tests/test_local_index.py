@@ -0,0 +1,110 @@
+import asyncio
+import uuid
+
+import numpy as np
+import pytest
+from fastembed.sparse.sparse_embedding_base import SparseEmbedding
+from qdrant_client import models
+
+from config import DENSE_EMBEDDING_MODEL, LATE_EMBEDDING_MODEL, SPARSE_EMBEDDING_MODEL, async_qdrant_client
+from rag.query import build_retrieval_query
+from utils import local_index
+from utils.local_index import IntegrationMirror, LocalIndex, load_records
+from utils.qdrant_collections import collection_registry, storage_settings
+from utils.query_embeddings import QueryVectors
+from utils.retrieval_config import DEFAULT_SETTINGS, FUSION, RERANK, SPARSE_ONLY
+
+ENDPOINTS = 120
+QUERIES = 10
+
+
+def random_vectors(rng):
+    """Float-valued vectors of every kind, so no two points score the same."""
+    terms = np.sort(rng.choice(300, size=rng.integers(3, 12), replace=False))
+    return QueryVectors(
+        dense=rng.standard_normal(64).astype(np.float32),
+        sparse=SparseEmbedding(values=rng.random(len(terms)).astype(np.float32) + 0.1, indices=terms),
+        late=rng.standard_normal((int(rng.integers(2, 6)), 128)).astype(np.float32),
+    )
+
+
+async def catalog(rng):
+    name = str(uuid.uuid4())
+    await collection_registry._create(name, 64, storage_settings(quantization='none', late_datatype='float32'))
+    points = []
+    for index in range(ENDPOINTS):
+        vectors = random_vectors(rng)
+        points.append(models.PointStruct(
+            id=index,
+            vector={
+                DENSE_EMBEDDING_MODEL: vectors.dense.tolist(),
+                SPARSE_EMBEDDING_MODEL: models.SparseVector(**vectors.sparse.as_object()),
+                LATE_EMBEDDING_MODEL: vectors.late.tolist(),
+            },
+            payload={'url': f"/endpoint/{index}"},
+        ))
+    await async_qdrant_client.upsert(name, points=points)
+    return name
+
+
+@pytest.mark.parametrize('mode, fusion', [(FUSION, 'rrf'), (FUSION, 'dbsf'), (RERANK, 'rrf'), (SPARSE_ONLY, 'rrf')])
+def test_mirror_matches_qdrant(mode, fusion):
+    rng = np.random.default_rng(7)
+    settings = {**DEFAULT_SETTINGS, 'mode': mode, 'fusion': fusion,
+                'dense_limit': 20, 'sparse_limit': 20, 'late_limit': 20, 'top_k': 8}
+
+    async def scenario():
+        name = await catalog(rng)
+        mirror = IntegrationMirror(await load_records(async_qdrant_client, name))
+        pairs = []
+        for _ in range(QUERIES):
+            query_vectors = random_vectors(rng)
+            expected = (await async_qdrant_client.query_points(
+                name, limit=settings['top_k'], **build_retrieval_query(settings, query_vectors))).points
+            pairs.append((expected, mirror.search(settings, query_vectors)))
+        return pairs
+
+    for expected, local in asyncio.run(scenario()):
+        assert [point.id for point in local] == [point.id for point in expected]
+        assert [point.score for point in local] == pytest.approx([point.score for point in expected], abs=1e-4)
+
+
+def test_mirror_size_counts_payloads():
+    async def scenario():
+        return await load_records(async_qdrant_client, await catalog(np.random.default_rng(3)))
+
+    records = asyncio.run(scenario())
+    small = IntegrationMirror(records)
+    for record in records:
+        record.payload['response'] = "x" * 10_000
+    large = IntegrationMirror(records)
+
+    assert large.nbytes - small.nbytes >= ENDPOINTS * 10_000
+
+
+def test_a_build_that_finishes_after_a_drop_is_discarded(monkeypatch):
+    load = local_index.load_records
+
+    async def scenario():
+        name = await catalog(np.random.default_rng(5))
+        index = LocalIndex(async_qdrant_client, min_queries=1, memory_budget_bytes=1 << 30)
+        loading = asyncio.Event()
+        dropped = asyncio.Event()
+
+        async def slow_load(client, integration_id):
+            loading.set()
+            await dropped.wait()
+            return await load(client, integration_id)
+
+        monkeypatch.setattr(local_index, 'load_records', slow_load)
+        index.get(name, 1)
+        building = index._building[name]
+        await loading.wait()
+        index.drop(name)
+        dropped.set()
+        await building
+        return index.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats['builds'] == 1
+    assert stats['mirrors'] == {}
@@ -0,0 +1,71 @@
+import time
+
+from utils.openapi import ComponentTable
+
+COMPONENTS = {
+    'A': {'type': 'object', 'properties': {
+        'name': {'type': 'string'},
+        'b': {'type': 'object', '$ref': '#/components/schemas/B'},
+    }},
+    'B': {'type': 'object', 'properties': {
+        'id': {'type': 'integer'},
+        'a': {'type': 'object', '$ref': '#/components/schemas/A'},
+    }},
+}
+
+A = {'$ref': '#/components/schemas/A'}
+B = {'$ref': '#/components/schemas/B'}
+
+
+def test_mutually_recursive_fields_do_not_depend_on_order():
+    a_first = ComponentTable(COMPONENTS)
+    a_then_b = (a_first.fields_for(A), a_first.fields_for(B))
+
+    b_first = ComponentTable(COMPONENTS)
+    b_then_a = (b_first.fields_for(B), b_first.fields_for(A))
+
+    assert a_then_b == (b_then_a[1], b_then_a[0])
+    assert a_then_b == (ComponentTable(COMPONENTS).fields_for(A), ComponentTable(COMPONENTS).fields_for(B))
+
+
+def test_mutually_recursive_fields_are_expanded_once_per_root():
+    b_fields = ComponentTable(COMPONENTS).fields_for(B)
+
+    nested_a = next(field for field in b_fields if field['key'] == 'a')
+    assert [field['key'] for field in nested_a['fields']] == ['name', 'b']
+    # The cycle back to B is cut below the root
+    assert next(field for field in nested_a['fields'] if field['key'] == 'b')['fields'] == []
+
+
+def test_acyclic_references_are_cached():
+    components = {**COMPONENTS, 'C': {'type': 'object', 'properties': {'x': {'type': 'string'}}}}
+    table = ComponentTable(components)
+    table.fields_for({'$ref': '#/components/schemas/C'})
+    table.fields_for({'$ref': '#/components/schemas/C'})
+    assert (table.misses, table.hits) == (1, 1)
+
+
+def test_cyclic_components_are_flattened_once_per_root():
+    # Each component points at the next two and back at the first, so every
+    # component sits on a cycle and the unbounded expansion is exponential
+    size = 30
+    components = {
+        f'N{index}': {'type': 'object', 'properties': {
+            'id': {'type': 'string'},
+            'next': {'type': 'object', '$ref': f'#/components/schemas/N{(index + 1) % size}'},
+            'skip': {'type': 'array', 'items': {'$ref': f'#/components/schemas/N{(index + 2) % size}'}},
+            'first': {'type': 'object', '$ref': '#/components/schemas/N0'},
+        }}
+        for index in range(size)
+    }
+    roots = [{'$ref': f'#/components/schemas/N{index % 5}'} for index in range(100)]
+
+    start_time = time.perf_counter()
+    table = ComponentTable(components)
+    fields = [table.fields_for(root) for root in roots]
+    elapsed = time.perf_counter() - start_time
+
+    assert elapsed < 1.0
+    assert table.hits == len(roots) - 5
+    assert table.misses <= 5 * size
+    assert fields[0] == ComponentTable(components).fields_for(roots[0])
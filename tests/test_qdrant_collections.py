@@ -0,0 +1,107 @@
+import asyncio
+import uuid
+
+import pytest
+from qdrant_client import AsyncQdrantClient
+
+from config import async_qdrant_client
+from utils.endpoint_points import delete_endpoints, endpoint_filter
+from utils.qdrant_collections import CollectionBusyError, CollectionRegistry, collection_registry, storage_settings
+from utils.upsert import upsert_vectors
+
+
+class NoAliasListing(AsyncQdrantClient):
+    async def get_aliases(self, **kwargs):
+        raise AssertionError("resolving one integration must not list every alias")
+
+
+def items(*urls):
+    return [{'text': f"GET {url}", 'metadata': {'method': 'GET', 'url': url}} for url in urls]
+
+
+def test_rebuilds_swap_between_the_two_collections():
+    client = NoAliasListing(":memory:")
+    registry = CollectionRegistry(client)
+    name = str(uuid.uuid4())
+
+    async def scenario():
+        assert await registry.ensure(name, 64)
+        targets = [await registry._target(name)]
+        for datatype in ('float16', 'float32'):
+            await registry.convert(name, late_datatype=datatype)
+            targets.append(await registry._target(name))
+        await registry.drop(name)
+        return targets, await registry.exists(name), (await client.get_collections()).collections
+
+    targets, exists, collections = asyncio.run(scenario())
+    assert targets == [f"{name}__a", f"{name}__b", f"{name}__a"]
+    assert not exists and not collections
+
+
+def test_legacy_collection_moves_behind_an_alias_with_its_points():
+    name = str(uuid.uuid4())
+
+    async def scenario():
+        await collection_registry._create(name, 64, storage_settings())
+        await upsert_vectors(name, items('/a', '/b'))
+        result = await collection_registry.convert(name, late_datatype='float16')
+        return result, await collection_registry._target(name), (await async_qdrant_client.count(name)).count
+
+    result, target, count = asyncio.run(scenario())
+    assert result['rebuilt'] and result['points'] == 2
+    assert target == f"{name}__a"
+    assert count == 2
+
+
+def test_drop_deletes_what_an_interrupted_rebuild_left_behind():
+    client = AsyncQdrantClient(":memory:")
+    registry = CollectionRegistry(client)
+    name = str(uuid.uuid4())
+
+    async def scenario():
+        await registry.ensure(name, 64)
+        # As left by a convert whose worker died while copying
+        await registry._create(f"{name}__b", 64, storage_settings())
+        await registry.drop(name)
+        return (await client.get_collections()).collections
+
+    assert asyncio.run(scenario()) == []
+
+
+def test_writes_during_a_conversion_are_rejected_and_succeed_after_it(monkeypatch):
+    name = str(uuid.uuid4())
+    copy_points = collection_registry._copy_points
+    rejected = []
+
+    async def copy_with_concurrent_writes(source, target):
+        for write in (upsert_vectors(name, items('/c')), delete_endpoints(name, endpoint_filter(['/a']))):
+            try:
+                await write
+            except CollectionBusyError:
+                rejected.append(True)
+        return await copy_points(source, target)
+
+    monkeypatch.setattr(collection_registry, '_copy_points', copy_with_concurrent_writes)
+
+    async def scenario():
+        await upsert_vectors(name, items('/a', '/b'))
+        result = await collection_registry.convert(name, late_datatype='float16')
+        await upsert_vectors(name, items('/c'))
+        return result, (await async_qdrant_client.count(name)).count
+
+    result, count = asyncio.run(scenario())
+    assert rejected == [True, True]
+    assert result['points'] == 2
+    assert count == 3
+
+
+def test_a_write_overlapping_the_start_of_a_conversion_fails():
+    name = str(uuid.uuid4())
+
+    async def scenario():
+        await upsert_vectors(name, items('/a'))
+        async with collection_registry.writing(name):
+            await collection_registry.convert(name, late_datatype='float16')
+
+    with pytest.raises(CollectionBusyError):
+        asyncio.run(scenario())
@@ -0,0 +1,32 @@
+import asyncio
+import uuid
+
+import config
+from rag.query import get_all_endpoints, query_db
+from schemas.raapi_schemas.query import Query
+
+
+def test_all_endpoints_are_scrolled_past_the_first_page(spec, ingest):
+    integration_id = str(uuid.uuid4())
+
+    async def scenario():
+        await ingest(integration_id, spec(*(('get', f"/items/{index}") for index in range(300))))
+        return await get_all_endpoints(integration_id)
+
+    points = asyncio.run(scenario())
+    assert len({point.payload['url'] for point in points}) == 300
+
+
+def test_concurrent_retrievals_share_the_async_client(spec, ingest):
+    integration_id = str(uuid.uuid4())
+    queries = [f"fetch item {index}" for index in range(20)]
+
+    async def scenario():
+        await ingest(integration_id, spec(*(('get', f"/items/{index}") for index in range(10))))
+        return await asyncio.gather(*(
+            query_db(Query(integration_id=integration_id, query=query)) for query in queries))
+
+    results = asyncio.run(scenario())
+    assert len(results) == len(queries) and all(results)
+    # Only the async client exists; nothing on the request path can block on a sync one
+    assert not hasattr(config, 'qdrant_client')
@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import numpy as np
+
+from utils import query_embeddings
+from utils.embeddings import DENSE
+from utils.query_embeddings import QueryEmbeddingBatcher, embed_query_batch
+
+QUERIES = [f"find record {index}" for index in range(6)]
+
+
+def test_concurrent_queries_share_one_batch_and_get_their_own_vectors():
+    embedder = QueryEmbeddingBatcher(window_ms=50, max_batch=64, threads=1)
+
+    async def scenario():
+        return await asyncio.gather(*(embedder.embed(query, (DENSE,)) for query in QUERIES))
+
+    vectors = asyncio.run(scenario())
+    embedder.shutdown()
+
+    expected = embed_query_batch(QUERIES, [(DENSE,)] * len(QUERIES))
+    assert all(np.array_equal(got.dense, want.dense) for got, want in zip(vectors, expected))
+    assert embedder.stats()['batching']['batches'] == 1
+    assert embedder.stats()['batching']['largest_batch'] == len(QUERIES)
+
+
+def test_a_lone_query_does_not_wait_for_the_window():
+    embedder = QueryEmbeddingBatcher(window_ms=10_000, max_batch=64, threads=1)
+
+    async def scenario():
+        start_time = time.perf_counter()
+        await asyncio.wait_for(embedder.embed(QUERIES[0], (DENSE,)), 5)
+        return time.perf_counter() - start_time
+
+    elapsed = asyncio.run(scenario())
+    embedder.shutdown()
+    assert elapsed < 1
+
+
+def test_full_batches_flush_without_waiting_for_the_window():
+    embedder = QueryEmbeddingBatcher(window_ms=10_000, max_batch=3, threads=1)
+
+    async def scenario():
+        return await asyncio.wait_for(
+            asyncio.gather(*(embedder.embed(query, (DENSE,)) for query in QUERIES)), 5)
+
+    asyncio.run(scenario())
+    embedder.shutdown()
+    assert embedder.stats()['batching']['batches'] == 2
+
+
+def test_a_cancelled_waiter_does_not_fail_its_batch():
+    embedder = QueryEmbeddingBatcher(window_ms=20, max_batch=64, threads=1)
+
+    async def scenario():
+        cancelled = asyncio.create_task(embedder.embed(QUERIES[0], (DENSE,)))
+        kept = asyncio.create_task(embedder.embed(QUERIES[1], (DENSE,)))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        return await kept
+
+    assert asyncio.run(scenario()).dense is not None
+    embedder.shutdown()
+
+
+def test_inference_errors_reach_every_waiter(monkeypatch):
+    def failing(texts, kinds=None):
+        raise RuntimeError("inference failed")
+
+    monkeypatch.setattr(query_embeddings, 'embed_query_batch', failing)
+    embedder = QueryEmbeddingBatcher(window_ms=20, max_batch=64, threads=1)
+
+    async def scenario():
+        return await asyncio.gather(
+            *(embedder.embed(query, (DENSE,)) for query in QUERIES[:3]), return_exceptions=True)
+
+    errors = asyncio.run(scenario())
+    embedder.shutdown()
+    assert all(isinstance(error, RuntimeError) for error in errors)
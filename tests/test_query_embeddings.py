@@ -0,0 +1,61 @@
+import asyncio
+
+import fakeredis
+import numpy as np
+
+from utils import query_embeddings
+from utils.embeddings import DENSE, LATE, SPARSE
+from utils.query_embeddings import QueryEmbeddingBatcher, QueryEmbeddingCache
+
+
+def counting_inference(monkeypatch):
+    runs = []
+    embed_query_batch = query_embeddings.embed_query_batch
+
+    def counted(texts, kinds=None):
+        runs.append(sorted(kind for needed in kinds for kind in needed))
+        return embed_query_batch(texts, kinds)
+
+    monkeypatch.setattr(query_embeddings, 'embed_query_batch', counted)
+    return runs
+
+
+def test_cache_hits_skip_inference_per_model(monkeypatch):
+    runs = counting_inference(monkeypatch)
+    cache = QueryEmbeddingCache(100)
+    embedder = QueryEmbeddingBatcher(window_ms=0, max_batch=8, threads=1, cache=cache)
+
+    async def scenario():
+        sparse = await embedder.embed("List open issues", (SPARSE,))
+        again = await embedder.embed("  list OPEN issues", (SPARSE,))
+        full = await embedder.embed("list open issues", (DENSE, SPARSE, LATE))
+        return sparse, again, full
+
+    sparse, again, full = asyncio.run(scenario())
+    embedder.shutdown()
+
+    assert runs == [[SPARSE], [DENSE, LATE]]
+    assert again.dense is None and np.array_equal(again.sparse.indices, sparse.sparse.indices)
+    assert full.sparse is sparse.sparse and full.dense is not None and full.late is not None
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 3
+
+
+def test_redis_shares_vectors_between_processes(monkeypatch):
+    runs = counting_inference(monkeypatch)
+    redis = fakeredis.FakeAsyncRedis()
+    first = QueryEmbeddingBatcher(window_ms=0, max_batch=8, threads=1, cache=QueryEmbeddingCache(100, redis=redis))
+    second_cache = QueryEmbeddingCache(100, redis=redis)
+    second = QueryEmbeddingBatcher(window_ms=0, max_batch=8, threads=1, cache=second_cache)
+
+    async def scenario():
+        await first.embed("list open issues", (DENSE,))
+        return await second.embed("list open issues", (DENSE,))
+
+    vectors = asyncio.run(scenario())
+    first.shutdown()
+    second.shutdown()
+
+    assert runs == [[DENSE]]
+    assert vectors.dense is not None
+    assert second_cache.stats()['redis_hits'] == 1
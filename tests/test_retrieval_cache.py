@@ -0,0 +1,29 @@
+import asyncio
+import uuid
+
+from rag import query as rag_query
+from rag.query import query_db
+from schemas.raapi_schemas.query import Query
+
+FIRST_ASKED = "[Current date and time: 2026-10-17 12:00:01 UTC (Saturday, October 17, 2026)]\n\nList my open issues"
+ASKED_AGAIN = "[Current date and time: 2026-10-17 12:00:04 UTC (Saturday, October 17, 2026)]\n\nlist my  open issues"
+
+
+class NoEmbedder:
+    async def embed(self, text, kinds=()):
+        raise AssertionError("a cached intent must not be embedded again")
+
+
+def test_repeated_intent_is_served_from_the_cache(monkeypatch, spec, ingest):
+    integration_id = str(uuid.uuid4())
+
+    async def scenario():
+        await ingest(integration_id, spec(('get', '/issues'), ('get', '/users')))
+        first = await query_db(Query(integration_id=integration_id, query=FIRST_ASKED))
+        monkeypatch.setattr(rag_query, 'query_embedder', NoEmbedder())
+        monkeypatch.setattr(rag_query, 'async_qdrant_client', None)
+        again = await query_db(Query(integration_id=integration_id, query=ASKED_AGAIN))
+        return first, again
+
+    first, again = asyncio.run(scenario())
+    assert [point.id for point in again] == [point.id for point in first]
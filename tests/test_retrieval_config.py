@@ -0,0 +1,80 @@
+import asyncio
+import uuid
+
+import pytest
+from qdrant_client import models
+
+from config import DENSE_EMBEDDING_MODEL, LATE_EMBEDDING_MODEL, SPARSE_EMBEDDING_MODEL
+from rag.query import build_retrieval_query, query_db
+from schemas.raapi_schemas.query import Query
+from utils.embeddings import DENSE, LATE, SPARSE
+from utils.query_embeddings import embed_query_batch
+from utils.retrieval_config import (
+    DEFAULT_SETTINGS,
+    FUSION,
+    RERANK,
+    SPARSE_ONLY,
+    delete_retrieval_settings,
+    get_retrieval_settings,
+    update_retrieval_settings,
+    validate_pipeline,
+)
+
+VECTORS = embed_query_batch(["list open issues"], [(DENSE, SPARSE, LATE)])[0]
+
+
+def test_overrides_fall_back_to_the_defaults():
+    integration_id = str(uuid.uuid4())
+    settings = update_retrieval_settings(integration_id, mode=SPARSE_ONLY, top_k=3)
+    assert settings == {**DEFAULT_SETTINGS, 'mode': SPARSE_ONLY, 'top_k': 3}
+    assert get_retrieval_settings(integration_id) == settings
+
+    assert update_retrieval_settings(integration_id, top_k=None)['top_k'] == DEFAULT_SETTINGS['top_k']
+    delete_retrieval_settings(integration_id)
+    assert get_retrieval_settings(integration_id) == DEFAULT_SETTINGS
+
+
+@pytest.mark.parametrize('mode, fusion', [('colbert', None), (None, 'max')])
+def test_unknown_modes_and_fusions_are_rejected(mode, fusion):
+    with pytest.raises(ValueError):
+        validate_pipeline(mode, fusion)
+    with pytest.raises(ValueError):
+        update_retrieval_settings(str(uuid.uuid4()), mode=mode, fusion=fusion)
+
+
+def test_rerank_only_rescores_the_dense_and_sparse_candidates():
+    settings = {**DEFAULT_SETTINGS, 'mode': RERANK, 'dense_limit': 7, 'sparse_limit': 9}
+    query = build_retrieval_query(settings, VECTORS)
+
+    assert query['using'] == LATE_EMBEDDING_MODEL
+    assert [(prefetch.using, prefetch.limit) for prefetch in query['prefetch']] == [
+        (DENSE_EMBEDDING_MODEL, 7), (SPARSE_EMBEDDING_MODEL, 9)]
+
+
+def test_fusion_searches_every_model_and_fuses_them():
+    settings = {**DEFAULT_SETTINGS, 'mode': FUSION, 'fusion': 'dbsf', 'late_limit': 4}
+    query = build_retrieval_query(settings, VECTORS)
+
+    assert query['query'] == models.FusionQuery(fusion=models.Fusion.DBSF)
+    assert [prefetch.using for prefetch in query['prefetch']] == [
+        DENSE_EMBEDDING_MODEL, SPARSE_EMBEDDING_MODEL, LATE_EMBEDDING_MODEL]
+    assert query['prefetch'][-1].limit == 4
+
+
+def test_sparse_mode_is_a_single_search():
+    query = build_retrieval_query({**DEFAULT_SETTINGS, 'mode': SPARSE_ONLY}, VECTORS)
+    assert query['using'] == SPARSE_EMBEDDING_MODEL and 'prefetch' not in query
+
+
+@pytest.mark.parametrize('mode', [FUSION, RERANK, SPARSE_ONLY])
+def test_every_mode_returns_at_most_top_k(spec, ingest, mode):
+    integration_id = str(uuid.uuid4())
+    update_retrieval_settings(integration_id, mode=mode, top_k=2)
+
+    async def scenario():
+        await ingest(integration_id, spec(*(('get', f"/issues/{index}") for index in range(6))))
+        return await query_db(Query(integration_id=integration_id, query="get issues"))
+
+    points = asyncio.run(scenario())
+    delete_retrieval_settings(integration_id)
+    assert 0 < len(points) <= 2
@@ -0,0 +1,60 @@
+import asyncio
+import uuid
+
+from config import async_qdrant_client
+from utils import upsert
+from utils.upsert import upsert_vectors
+
+
+def items(description):
+    return [
+        {'text': f"GET /{path}", 'metadata': {'method': 'GET', 'url': f"/{path}", 'description': description}}
+        for path in ('a', 'b')
+    ]
+
+
+def test_only_new_or_reworded_items_count_as_embedded():
+    integration_id = str(uuid.uuid4())
+
+    async def scenario():
+        first = await upsert_vectors(integration_id, items("v1"))
+        unchanged = await upsert_vectors(integration_id, items("v1"))
+        payload_only = await upsert_vectors(integration_id, items("v2"))
+        return first, unchanged, payload_only
+
+    first, unchanged, payload_only = asyncio.run(scenario())
+    assert (first['embedded'], first['indexed']) == (2, 2)
+    assert (unchanged['embedded'], unchanged['unchanged']) == (0, 2)
+    assert (payload_only['embedded'], payload_only['payload_updated']) == (0, 2)
+
+
+def test_items_are_embedded_and_written_per_chunk(monkeypatch):
+    integration_id = str(uuid.uuid4())
+    embedded_batches = []
+    progress = []
+    embed_passages = upsert.embed_passages
+
+    def recording_embed_passages(texts, batch_size):
+        embedded_batches.append(len(texts))
+        return embed_passages(texts, batch_size)
+
+    monkeypatch.setattr(upsert, 'embed_passages', recording_embed_passages)
+    endpoints = [
+        {'text': f"GET /{index}", 'metadata': {'method': 'GET', 'url': f"/{index}"}}
+        for index in range(5)
+    ]
+
+    async def scenario():
+        summary = await upsert_vectors(
+            integration_id, iter(endpoints), chunk_size=2,
+            on_progress=lambda report: progress.append((report['stage'], report['chunk'], report['indexed'])))
+        return summary, (await async_qdrant_client.count(integration_id)).count
+
+    summary, count = asyncio.run(scenario())
+    assert embedded_batches == [2, 2, 1]
+    assert progress == [
+        ('embedded', 0, 0), ('indexed', 0, 2),
+        ('embedded', 1, 2), ('indexed', 1, 4),
+        ('embedded', 2, 4), ('indexed', 2, 5),
+    ]
+    assert summary['indexed'] == count == 5
@@ -0,0 +1,188 @@
+"""
+Persistent cache of passage embeddings keyed by model name and text hash.
+
+Sits in front of the fastembed `passage_embed` calls made during ingestion so
+texts that were embedded before (shared boilerplate descriptions, re-uploads,
+edits) skip ONNX inference. Entries live on local disk (diskcache, capped in
+bytes) or in Redis (capped in entries), both with least-recently-used eviction.
+
+Both backends block, so `EmbeddingCache.embed` must run off the event loop,
+next to the inference it guards (`upsert_vectors` calls it through
+`asyncio.to_thread`); calling it on the loop raises instead of stalling it.
+"""
+
+import asyncio
+import hashlib
+import io
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from fastembed import SparseEmbedding
+
+from config import (
+    EMBEDDING_CACHE_BACKEND,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_SIZE_MB,
+    REDIS_URL,
+)
+
+
+def _cache_key(model_name: str, text: str) -> str:
+    return f"{model_name}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def serialize_embedding(embedding: Any) -> bytes:
+    buffer = io.BytesIO()
+    if isinstance(embedding, SparseEmbedding):
+        np.savez(buffer, values=embedding.values, indices=embedding.indices)
+    else:
+        np.save(buffer, np.asarray(embedding), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def deserialize_embedding(data: bytes) -> Any:
+    loaded = np.load(io.BytesIO(data), allow_pickle=False)
+    if isinstance(loaded, np.lib.npyio.NpzFile):
+        return SparseEmbedding(values=loaded['values'], indices=loaded['indices'])
+    return loaded
+
+
+class DiskBackend:
+    def __init__(self, directory: str, size_limit_bytes: int):
+        import diskcache
+
+        self._cache = diskcache.Cache(
+            directory,
+            size_limit=size_limit_bytes,
+            eviction_policy='least-recently-used',
+        )
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        return [self._cache.get(key) for key in keys]
+
+    def set_many(self, items: Dict[str, bytes]) -> None:
+        for key, value in items.items():
+            self._cache.set(key, value)
+
+
+class RedisBackend:
+    """Stores entries as plain keys and tracks recency in a sorted set."""
+
+    PREFIX = "embcache:"
+    LRU_KEY = "embcache:lru"
+
+    def __init__(self, url: str, max_entries: int):
+        from redis import Redis
+
+        self._client = Redis.from_url(url)
+        self._max_entries = max_entries
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        values = self._client.mget([self.PREFIX + key for key in keys])
+        hits = {key: time.time() for key, value in zip(keys, values) if value is not None}
+        if hits:
+            self._client.zadd(self.LRU_KEY, hits)
+        return values
+
+    def set_many(self, items: Dict[str, bytes]) -> None:
+        now = time.time()
+        pipe = self._client.pipeline()
+        pipe.mset({self.PREFIX + key: value for key, value in items.items()})
+        pipe.zadd(self.LRU_KEY, {key: now for key in items})
+        pipe.zcard(self.LRU_KEY)
+        size = pipe.execute()[-1]
+
+        overflow = size - self._max_entries
+        if overflow > 0:
+            evicted = [key.decode() for key, _ in self._client.zpopmin(self.LRU_KEY, overflow)]
+            self._client.delete(*[self.PREFIX + key for key in evicted])
+
+
+class EmbeddingCache:
+    """Looks embeddings up per text and only computes the missing ones."""
+
+    def __init__(self, backend: Optional[Any]):
+        self._backend = backend
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._backend is not None
+
+    def _count(self, model_name: str, hits: int, misses: int) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(model_name, {'hits': 0, 'misses': 0})
+            stats['hits'] += hits
+            stats['misses'] += misses
+
+    def embed(
+        self,
+        model_name: str,
+        texts: Sequence[str],
+        compute: Callable[[List[str]], List[Any]]
+    ) -> List[Any]:
+        """Return embeddings for `texts` in order, calling `compute` only for cache misses."""
+        if self._backend is None:
+            return compute(list(texts))
+        if _on_event_loop():
+            raise RuntimeError("EmbeddingCache.embed blocks on its backend, call it through asyncio.to_thread")
+
+        keys = [_cache_key(model_name, text) for text in texts]
+        results: List[Any] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        for index, (key, value) in enumerate(zip(keys, self._backend.get_many(keys))):
+            if value is not None:
+                results[index] = deserialize_embedding(value)
+            else:
+                missing.setdefault(key, []).append(index)
+
+        misses = sum(len(indexes) for indexes in missing.values())
+        self._count(model_name, hits=len(texts) - misses, misses=misses)
+
+        if missing:
+            missing_keys = list(missing)
+            computed = compute([texts[missing[key][0]] for key in missing_keys])
+            for key, embedding in zip(missing_keys, computed):
+                for index in missing[key]:
+                    results[index] = embedding
+            self._backend.set_many({
+                key: serialize_embedding(embedding)
+                for key, embedding in zip(missing_keys, computed)
+            })
+
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters per model for this process."""
+        with self._lock:
+            report = {}
+            for model_name, stats in self._stats.items():
+                lookups = stats['hits'] + stats['misses']
+                report[model_name] = {
+                    **stats,
+                    'hit_rate': stats['hits'] / lookups if lookups else 0.0,
+                }
+        return {'backend': EMBEDDING_CACHE_BACKEND, 'models': report}
+
+
+def _build_backend() -> Optional[Any]:
+    if EMBEDDING_CACHE_BACKEND == 'disk':
+        return DiskBackend(EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_SIZE_MB * 1024 * 1024)
+    if EMBEDDING_CACHE_BACKEND == 'redis':
+        return RedisBackend(REDIS_URL, EMBEDDING_CACHE_MAX_ENTRIES)
+    return None
+
+
+embedding_cache = EmbeddingCache(_build_backend())
@@ -0,0 +1,93 @@
+"""
+Process pool for ingestion-time passage embedding.
+
+Splits the texts of each embedding call into contiguous slices, runs them on
+worker processes that each hold their own ONNX sessions (with a per-worker
+thread limit), and reassembles the results in input order. With
+`EMBEDDING_POOL_WORKERS` below 2 embedding runs inline in the calling process.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Optional
+
+from config import (
+    EMBEDDING_POOL_THREADS_PER_WORKER,
+    EMBEDDING_POOL_WORKERS,
+    EMBEDDING_WARMUP,
+    INGESTION_EMBED_BATCH_SIZE,
+)
+from utils.embeddings import embedding_models
+
+# ONNX Runtime sessions are not fork-safe, workers start from a fresh interpreter
+MP_START_METHOD = "spawn"
+
+
+def _init_worker(threads_per_worker: int, warmup: bool) -> None:
+    embedding_models.set_threads(threads_per_worker)
+    if warmup:
+        embedding_models.warmup()
+
+
+def _embed_slice(kind: str, texts: List[str], batch_size: int) -> List[Any]:
+    return list(embedding_models.get(kind).passage_embed(texts, batch_size=batch_size))
+
+
+class EmbeddingPool:
+    """Distributes passage embedding over a lazily started process pool."""
+
+    def __init__(self, workers: int, threads_per_worker: int):
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 1
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(MP_START_METHOD),
+                    initializer=_init_worker,
+                    initargs=(self.threads_per_worker, EMBEDDING_WARMUP),
+                )
+            return self._executor
+
+    def start(self) -> None:
+        """Spawn (and, with EMBEDDING_WARMUP, warm) every worker up front."""
+        if not self.enabled:
+            return
+        executor = self._get_executor()
+        # One no-op task per worker makes the pool spawn all of its processes
+        for future in [executor.submit(int) for _ in range(self.workers)]:
+            future.result()
+
+    def embed(self, kind: str, texts: List[str], batch_size: int = INGESTION_EMBED_BATCH_SIZE) -> List[Any]:
+        """Embed `texts` with the `kind` model and return vectors in input order."""
+        if not self.enabled or len(texts) <= 1:
+            return _embed_slice(kind, texts, batch_size)
+
+        # Give every worker work, but never more than one batch per slice
+        slice_size = max(1, min(batch_size, -(-len(texts) // self.workers)))
+        slices = [texts[start:start + slice_size] for start in range(0, len(texts), slice_size)]
+        results = self._get_executor().map(
+            _embed_slice, [kind] * len(slices), slices, [batch_size] * len(slices))
+
+        vectors = []
+        for slice_vectors in results:
+            vectors.extend(slice_vectors)
+        return vectors
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+embedding_pool = EmbeddingPool(EMBEDDING_POOL_WORKERS, EMBEDDING_POOL_THREADS_PER_WORKER)
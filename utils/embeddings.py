@@ -0,0 +1,128 @@
+"""
+Process-wide registry of the fastembed models used for ingestion and retrieval.
+
+Every ONNX session is created once per process, on first use or through an
+explicit warmup, and shared by `utils.upsert` and `rag.query`.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from fastembed import LateInteractionTextEmbedding, SparseTextEmbedding, TextEmbedding
+
+from config import (
+    DENSE_EMBEDDING_MODEL,
+    DENSE_EMBEDDING_THREADS,
+    LATE_EMBEDDING_MODEL,
+    LATE_EMBEDDING_THREADS,
+    SPARSE_EMBEDDING_MODEL,
+    SPARSE_EMBEDDING_THREADS,
+)
+
+DENSE = "dense"
+SPARSE = "sparse"
+LATE = "late"
+
+MODEL_KINDS = (DENSE, SPARSE, LATE)
+
+
+class EmbeddingModelRegistry:
+    """Lazily loads and holds one instance of each embedding model."""
+
+    def __init__(self, specs: Dict[str, Dict[str, Any]]):
+        self._specs = specs
+        self._models: Dict[str, Any] = {}
+        self._load_seconds: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind: str) -> Any:
+        """Return the model for `kind`, loading it on first access."""
+        model = self._models.get(kind)
+        if model is not None:
+            return model
+
+        if kind not in self._specs:
+            raise ValueError(f"Unknown embedding model kind: {kind}")
+
+        with self._lock:
+            # Another thread may have finished loading while we waited
+            model = self._models.get(kind)
+            if model is None:
+                spec = self._specs[kind]
+                start_time = time.time()
+                model = spec['cls'](spec['model_name'], threads=spec['threads'] or None)
+                self._load_seconds[kind] = time.time() - start_time
+                self._models[kind] = model
+                print(f"Loaded {kind} embedding model {spec['model_name']} "
+                      f"in {self._load_seconds[kind]:.2f}s")
+        return model
+
+    def set_threads(self, threads: int) -> None:
+        """Override the ONNX thread count of every model that is not loaded yet."""
+        for kind, spec in self._specs.items():
+            if kind not in self._models:
+                spec['threads'] = threads
+
+    def install(self, kind: str, model: Any, model_name: str) -> None:
+        """Use an already constructed `model` for `kind` (e.g. an offline stand-in for benchmarks)."""
+        with self._lock:
+            self._specs[kind]['model_name'] = model_name
+            self._models[kind] = model
+            self._load_seconds[kind] = 0.0
+
+    def model_name(self, kind: str) -> str:
+        return self._specs[kind]['model_name']
+
+    @property
+    def dense(self) -> TextEmbedding:
+        return self.get(DENSE)
+
+    @property
+    def sparse(self) -> SparseTextEmbedding:
+        return self.get(SPARSE)
+
+    @property
+    def late(self) -> LateInteractionTextEmbedding:
+        return self.get(LATE)
+
+    def warmup(self, kinds: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Load the given (or all) models up front and return `describe()`."""
+        for kind in kinds or MODEL_KINDS:
+            self.get(kind)
+        return self.describe()
+
+    def describe(self) -> Dict[str, Any]:
+        """Report which models are configured and which are loaded."""
+        return {
+            kind: {
+                'model_name': spec['model_name'],
+                'vector_name': spec['vector_name'],
+                'threads': spec['threads'] or None,
+                'loaded': kind in self._models,
+                'load_seconds': self._load_seconds.get(kind),
+            }
+            for kind, spec in self._specs.items()
+        }
+
+
+embedding_models = EmbeddingModelRegistry({
+    DENSE: {
+        'cls': TextEmbedding,
+        'model_name': f"sentence-transformers/{DENSE_EMBEDDING_MODEL}",
+        'vector_name': DENSE_EMBEDDING_MODEL,
+        'threads': DENSE_EMBEDDING_THREADS,
+    },
+    SPARSE: {
+        'cls': SparseTextEmbedding,
+        'model_name': f"Qdrant/{SPARSE_EMBEDDING_MODEL}",
+        'vector_name': SPARSE_EMBEDDING_MODEL,
+        'threads': SPARSE_EMBEDDING_THREADS,
+    },
+    LATE: {
+        'cls': LateInteractionTextEmbedding,
+        'model_name': f"colbert-ir/{LATE_EMBEDDING_MODEL}",
+        'vector_name': LATE_EMBEDDING_MODEL,
+        'threads': LATE_EMBEDDING_THREADS,
+    },
+})
@@ -0,0 +1,149 @@
+"""
+Filter-based lookups of the endpoint points stored in an integration collection.
+
+Endpoints are addressed by their `url` and `method` payload fields, which are
+keyword-indexed when the collection is created, so finding, editing or
+deleting them costs the same for ten endpoints as for ten thousand.
+
+Catalog listings page through the collection with Qdrant scroll offsets as
+opaque cursors and only fetch the payload fields that were asked for.
+"""
+
+import json
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+
+from qdrant_client import models
+
+from config import async_qdrant_client
+from utils.qdrant_collections import collection_registry
+from utils.retrieval_cache import bump_catalog_version
+from utils.upsert import CONTENT_FIELDS
+
+# Payload fields derived from the embedded text or used for syncing; bulk
+# edits must not touch them or stored points would disagree with their vectors
+PROTECTED_FIELDS = CONTENT_FIELDS + ('url', 'method', 'text', 'text_hash', 'content_hash')
+
+SCROLL_PAGE_SIZE = 256
+
+
+def points_filter(point_ids: Sequence[str]) -> models.Filter:
+    """Match the points whose ID is in `point_ids`."""
+    return models.Filter(must=[models.HasIdCondition(has_id=list(point_ids))])
+
+
+def points_except_filter(point_ids: Sequence[str]) -> models.Filter:
+    """Match every point whose ID is not in `point_ids`."""
+    return models.Filter(must_not=[models.HasIdCondition(has_id=list(point_ids))] if point_ids else [])
+
+
+def endpoint_filter(
+    urls: Optional[Sequence[str]] = None,
+    methods: Optional[Sequence[str]] = None
+) -> models.Filter:
+    """Match endpoints whose url is in `urls` and whose method is in `methods`; unset means any."""
+    conditions = []
+    if urls:
+        conditions.append(models.FieldCondition(key='url', match=models.MatchAny(any=list(urls))))
+    if methods:
+        conditions.append(models.FieldCondition(
+            key='method', match=models.MatchAny(any=[method.upper() for method in methods])))
+    return models.Filter(must=conditions)
+
+
+async def find_endpoint_points(
+    integration_id: str,
+    url: str,
+    method: Optional[str] = None
+) -> List[models.Record]:
+    """Every point for `url` (and `method`, when given), with payloads."""
+    points = []
+    offset = None
+    while True:
+        page, offset = await async_qdrant_client.scroll(
+            collection_name=integration_id,
+            scroll_filter=endpoint_filter([url], [method] if method else None),
+            limit=SCROLL_PAGE_SIZE,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False,
+        )
+        points.extend(page)
+        if offset is None:
+            return points
+
+
+async def count_endpoints(integration_id: str, selector: models.Filter) -> int:
+    return (await async_qdrant_client.count(integration_id, count_filter=selector, exact=True)).count
+
+
+async def delete_endpoints(integration_id: str, selector: models.Filter) -> int:
+    """Delete every endpoint matching `selector` and return how many there were."""
+    matched = await count_endpoints(integration_id, selector)
+    if matched:
+        async with collection_registry.writing(integration_id):
+            await async_qdrant_client.delete(
+                collection_name=integration_id,
+                points_selector=models.FilterSelector(filter=selector),
+            )
+        await bump_catalog_version(integration_id)
+    return matched
+
+
+async def set_endpoint_payload(integration_id: str, selector: models.Filter, payload: Dict[str, Any]) -> int:
+    """Merge `payload` into every endpoint matching `selector` and return how many there were."""
+    protected = sorted(set(payload) & set(PROTECTED_FIELDS))
+    if protected:
+        raise ValueError(f"These fields cannot be edited in bulk: {', '.join(protected)}")
+
+    matched = await count_endpoints(integration_id, selector)
+    if matched:
+        async with collection_registry.writing(integration_id):
+            await async_qdrant_client.set_payload(
+                collection_name=integration_id,
+                payload=payload,
+                points=selector,
+            )
+        await bump_catalog_version(integration_id)
+    return matched
+
+
+def parse_cursor(cursor: Optional[str]) -> Optional[Union[int, str]]:
+    """The point ID a listing cursor encodes; raises ValueError for anything else."""
+    if cursor is None:
+        return None
+    if cursor.isdigit():
+        return int(cursor)
+    return str(uuid.UUID(cursor))
+
+
+async def list_endpoints(
+    integration_id: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    fields: Optional[Sequence[str]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of endpoint payloads (only `fields` when given) and the cursor of the next page."""
+    points, offset = await async_qdrant_client.scroll(
+        collection_name=integration_id,
+        limit=limit,
+        offset=parse_cursor(cursor),
+        with_payload=list(fields) if fields else True,
+        with_vectors=False,
+    )
+    return [point.payload for point in points], str(offset) if offset is not None else None
+
+
+async def stream_endpoints_ndjson(
+    integration_id: str,
+    page_size: int,
+    cursor: Optional[str] = None,
+    fields: Optional[Sequence[str]] = None
+) -> AsyncIterator[str]:
+    """Yield every endpoint from `cursor` on as one JSON line, fetching `page_size` at a time."""
+    while True:
+        payloads, cursor = await list_endpoints(integration_id, page_size, cursor, fields)
+        for payload in payloads:
+            yield json.dumps(payload) + "\n"
+        if cursor is None:
+            return
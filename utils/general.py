@@ -1,6 +1,12 @@
+import re
+import sys
 from datetime import datetime, timezone
+from typing import Any
 from sqlalchemy import inspect
 
+# The prefix added by `append_datetime_to_query`
+TEMPORAL_CONTEXT_PATTERN = re.compile(r"\[Current date and time: (\d{4}-\d{2}-\d{2}) (\d{2}:\d{2})[^\]]*\]")
+
 def sqlalchemy_object_to_dict(obj):
     def serialize(value):
         if isinstance(value, datetime):
@@ -35,3 +41,31 @@ def append_datetime_to_query(query: str) -> str:
     temporal_context = f"[Current date and time: {formatted_datetime} ({formatted_date})]"
     
     return f"{temporal_context}\n\n{query}"
+
+
+def coarsen_temporal_context(text: str, resolution: str = 'day') -> str:
+    """
+    Reduce every temporal context in `text` to its date (`resolution='day'`)
+    or to its date and minute (`resolution='minute'`).
+
+    Used for cache keys, so identical queries asked within the same day or
+    minute share an entry instead of one per second.
+    """
+    if resolution == 'minute':
+        return TEMPORAL_CONTEXT_PATTERN.sub(r"[Current date and time: \1 \2 UTC]", text)
+    return TEMPORAL_CONTEXT_PATTERN.sub(r"[Current date: \1]", text)
+
+
+def strip_temporal_context(text: str) -> str:
+    """Remove the temporal context from `text`, for retrieval, which never uses it."""
+    return TEMPORAL_CONTEXT_PATTERN.sub("", text).strip()
+
+
+def approximate_nbytes(value: Any) -> int:
+    """Approximate memory held by a decoded JSON value: the object itself plus its containers' contents."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximate_nbytes(key) + approximate_nbytes(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(approximate_nbytes(item) for item in value)
+    return size
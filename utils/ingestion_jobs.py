@@ -0,0 +1,344 @@
+"""
+Redis-backed background jobs for OpenAPI ingestion.
+
+The upload handler streams the raw spec into Redis and enqueues a job id;
+`worker.py` pops jobs, spools the spec to a local temporary file and streams
+operations from it into parsing, embedding and indexing outside the API
+process.
+
+Progress counters live in a Redis hash so `/integrations/jobs/{id}` can report
+them, and a failed job resumes from its last fully indexed chunk. A running
+job holds a lease its worker keeps renewing; when a worker dies mid-job the
+lease expires and the job is re-queued by the next idle worker (or by
+`retry_job`).
+
+Every job is a sync of the integration's catalog: unchanged endpoints are
+not re-embedded and, when `prune` is set, endpoints that are no longer in the
+uploaded spec are deleted once the job completes. Pruning compares against
+every operation of the spec, not only `selected_endpoints`, so uploading a
+subset never deletes the spec's other endpoints. A spec without operations
+prunes nothing, and only points with deterministic IDs are pruned: points
+stored before IDs were derived from the endpoint cannot be told apart from
+the spec's and are kept.
+"""
+
+import asyncio
+import io
+import json
+import tempfile
+import time
+import traceback
+import uuid
+from itertools import islice
+from typing import Any, AsyncIterable, Dict, List, Optional, Tuple
+
+from config import (
+    INGESTION_CHUNK_SIZE,
+    INGESTION_JOB_LEASE_SECONDS,
+    INGESTION_JOB_TTL_SECONDS,
+    SPEC_TRANSFER_CHUNK_BYTES,
+    async_qdrant_client,
+    redis_client,
+)
+from utils.embedding_cache import embedding_cache
+from utils.endpoint_points import SCROLL_PAGE_SIZE, delete_endpoints, points_except_filter, points_filter
+from utils.openapi import extract_routes, iter_operations
+from utils.qdrant_collections import collection_registry
+from utils.upsert import point_id_for, upsert_vectors
+
+QUEUE_KEY = "ingestion:queue"
+# Ids of jobs a worker has started; checked for expired leases
+RUNNING_KEY = "ingestion:running"
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Per-endpoint outcome counters reported by `upsert_vectors`
+CHANGE_FIELDS = ('reembedded', 'payload_updated', 'unchanged')
+
+
+def _job_key(job_id: str) -> str:
+    return f"ingestion:job:{job_id}"
+
+
+def _spec_key(job_id: str) -> str:
+    return f"ingestion:job:{job_id}:spec"
+
+
+def _decode_job(raw: Dict[bytes, bytes]) -> Dict[str, Any]:
+    job = {key.decode(): value.decode() for key, value in raw.items()}
+    for field in ('parsed', 'embedded', 'indexed', 'total', 'chunk_size', 'attempts') + CHANGE_FIELDS:
+        if field in job:
+            job[field] = int(job[field])
+    job['selected_endpoints'] = json.loads(job.get('selected_endpoints', '[]'))
+    job['prune'] = job.get('prune', '1') == '1'
+    job['lease_expires'] = float(job.get('lease_expires') or 0)
+    return job
+
+
+def lease_expired(job: Dict[str, Any]) -> bool:
+    """Whether a running job's worker stopped renewing its lease."""
+    return job['status'] == RUNNING and job['lease_expires'] < time.time()
+
+
+async def create_job(
+    integration_id: str,
+    selected_endpoints: List[str],
+    spec_chunks: AsyncIterable[bytes],
+    prune: bool = True
+) -> Dict[str, Any]:
+    """Stream the spec into Redis chunk by chunk and enqueue a new ingestion job."""
+    job_id = str(uuid.uuid4())
+    async for chunk in spec_chunks:
+        await redis_client.append(_spec_key(job_id), chunk)
+
+    now = str(time.time())
+    job = {
+        'id': job_id,
+        'integration_id': integration_id,
+        'selected_endpoints': json.dumps(selected_endpoints),
+        'prune': '1' if prune else '0',
+        'status': QUEUED,
+        'parsed': 0,
+        'embedded': 0,
+        'indexed': 0,
+        'total': 0,
+        **{field: 0 for field in CHANGE_FIELDS},
+        'chunk_size': INGESTION_CHUNK_SIZE,
+        'attempts': 0,
+        'error': '',
+        'created': now,
+        'updated': now,
+    }
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.expire(_spec_key(job_id), INGESTION_JOB_TTL_SECONDS)
+        pipe.hset(_job_key(job_id), mapping=job)
+        pipe.expire(_job_key(job_id), INGESTION_JOB_TTL_SECONDS)
+        pipe.lpush(QUEUE_KEY, job_id)
+        await pipe.execute()
+    return await get_job(job_id)
+
+
+async def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    raw = await redis_client.hgetall(_job_key(job_id))
+    if not raw:
+        return None
+    return _decode_job(raw)
+
+
+async def update_job(job_id: str, **fields: Any) -> None:
+    fields['updated'] = str(time.time())
+    await redis_client.hset(_job_key(job_id), mapping=fields)
+
+
+async def _requeue(job_id: str, error: str = '') -> None:
+    await update_job(job_id, status=QUEUED, error=error)
+    await redis_client.lpush(QUEUE_KEY, job_id)
+
+
+async def retry_job(job_id: str) -> Dict[str, Any]:
+    """Re-enqueue a failed or abandoned job; it resumes after its last indexed chunk."""
+    job = await get_job(job_id)
+    if job is None:
+        raise KeyError(job_id)
+    if job['status'] != FAILED and not lease_expired(job):
+        raise ValueError(f"Only failed or abandoned jobs can be retried, job is {job['status']}")
+    if not await redis_client.exists(_spec_key(job_id)):
+        raise ValueError("The uploaded spec for this job has expired, upload it again")
+
+    # Removing the id from the running set claims an abandoned job, so it is re-queued once
+    if job['status'] == RUNNING and not await redis_client.srem(RUNNING_KEY, job_id):
+        raise ValueError("This job has already been re-queued")
+
+    await _requeue(job_id)
+    return await get_job(job_id)
+
+
+async def reclaim_expired_jobs() -> int:
+    """Re-queue running jobs whose worker stopped renewing the lease, returning how many."""
+    reclaimed = 0
+    for raw_id in await redis_client.smembers(RUNNING_KEY):
+        job_id = raw_id.decode()
+        job = await get_job(job_id)
+        if job is None or job['status'] != RUNNING:
+            await redis_client.srem(RUNNING_KEY, job_id)
+        elif lease_expired(job) and await redis_client.srem(RUNNING_KEY, job_id):
+            print(f"Ingestion job {job_id} lost its worker, re-queueing it")
+            await _requeue(job_id, error="Worker stopped renewing the job lease")
+            reclaimed += 1
+    return reclaimed
+
+
+async def _renew_lease(job_id: str) -> None:
+    while True:
+        await asyncio.sleep(INGESTION_JOB_LEASE_SECONDS / 3)
+        await update_job(job_id, lease_expires=time.time() + INGESTION_JOB_LEASE_SECONDS)
+
+
+async def _download_spec(job_id: str, fp) -> bool:
+    """Copy a stored spec into `fp` with bounded GETRANGE reads."""
+    offset = 0
+    while True:
+        chunk = await redis_client.getrange(
+            _spec_key(job_id), offset, offset + SPEC_TRANSFER_CHUNK_BYTES - 1)
+        if not chunk:
+            break
+        fp.write(chunk)
+        offset += len(chunk)
+        if len(chunk) < SPEC_TRANSFER_CHUNK_BYTES:
+            break
+    fp.seek(0)
+    return offset > 0
+
+
+async def _index_spec(job_id: str, job: Dict[str, Any], spec_file) -> Tuple[Dict[str, Any], int]:
+    """Stream the job's routes into the collection, returning the summary and the resume offset."""
+    text_file = io.TextIOWrapper(spec_file, encoding='utf-8')
+    routes = extract_routes(text_file, job['integration_id'], job['selected_endpoints'])
+
+    # Chunks before `indexed` were fully written by a previous attempt
+    resume_from = job['indexed']
+    if resume_from:
+        print(f"Resuming ingestion job {job_id} after endpoint {resume_from}")
+    parsed = {'count': resume_from}
+
+    def counted_items():
+        for route in islice(routes, resume_from, None):
+            parsed['count'] += 1
+            yield {'text': route['text'], 'metadata': route}
+
+    async def report_progress(progress: Dict[str, Any]):
+        await update_job(
+            job_id,
+            parsed=parsed['count'],
+            indexed=resume_from + progress['indexed'],
+            # Texts sent to the embedder, added to what earlier attempts sent
+            **{field: job.get(field, 0) + progress[field] for field in ('embedded',) + CHANGE_FIELDS},
+        )
+        if progress['stage'] == 'indexed':
+            print(f"Job {job_id}: indexed {resume_from + progress['indexed']} endpoints "
+                  f"({progress['endpoints_per_second']:.1f} endpoints/s)")
+
+    try:
+        summary = await upsert_vectors(
+            job['integration_id'],
+            counted_items(),
+            chunk_size=job['chunk_size'],
+            on_progress=report_progress,
+        )
+    finally:
+        # Leave closing the underlying temporary file to the with block
+        text_file.detach()
+    return summary, resume_from
+
+
+def _spec_point_ids(spec_file, integration_id: str) -> List[str]:
+    """Point IDs of every operation in the spec, selected or not."""
+    spec_file.seek(0)
+    text_file = io.TextIOWrapper(spec_file, encoding='utf-8')
+    try:
+        return [point_id_for(integration_id, method, path) for path, method, _ in iter_operations(text_file)]
+    finally:
+        text_file.detach()
+
+
+async def _stale_point_ids(integration_id: str, keep_ids: List[str]) -> List[str]:
+    """Deterministic point IDs stored for the integration that are not in `keep_ids`."""
+    stale = []
+    offset = None
+    while True:
+        page, offset = await async_qdrant_client.scroll(
+            collection_name=integration_id,
+            scroll_filter=points_except_filter(keep_ids),
+            limit=SCROLL_PAGE_SIZE,
+            offset=offset,
+            with_payload=['method', 'url'],
+            with_vectors=False,
+        )
+        for point in page:
+            payload = point.payload or {}
+            # Legacy random IDs are skipped, their endpoint may still be in the spec
+            if payload.get('method') and payload.get('url') and \
+                    str(point.id) == point_id_for(integration_id, payload['method'], payload['url']):
+                stale.append(str(point.id))
+        if offset is None:
+            return stale
+
+
+async def _prune(integration_id: str, spec_file) -> int:
+    """Delete the integration's endpoints that are not operations of the spec."""
+    if not await collection_registry.exists(integration_id):
+        return 0
+    keep_ids = await asyncio.to_thread(_spec_point_ids, spec_file, integration_id)
+    if not keep_ids:
+        print(f"The spec of {integration_id} has no operations, not pruning")
+        return 0
+    stale_ids = await _stale_point_ids(integration_id, keep_ids)
+    if not stale_ids:
+        return 0
+    pruned = await delete_endpoints(integration_id, points_filter(stale_ids))
+    if pruned:
+        print(f"Pruned {pruned} endpoints missing from the spec of {integration_id}")
+    return pruned
+
+
+async def run_job(job_id: str) -> None:
+    """Parse, embed and index one job, resuming from its indexed count."""
+    job = await get_job(job_id)
+    if job is None:
+        print(f"Ingestion job {job_id} no longer exists, skipping")
+        return
+    if job['status'] == COMPLETED or (job['status'] == RUNNING and not lease_expired(job)):
+        print(f"Ingestion job {job_id} is {job['status']}, skipping")
+        return
+
+    with tempfile.TemporaryFile() as spec_file:
+        if not await _download_spec(job_id, spec_file):
+            await update_job(job_id, status=FAILED, error="The uploaded spec for this job has expired")
+            return
+
+        await update_job(
+            job_id,
+            status=RUNNING,
+            attempts=job['attempts'] + 1,
+            lease_expires=time.time() + INGESTION_JOB_LEASE_SECONDS,
+        )
+        await redis_client.sadd(RUNNING_KEY, job_id)
+
+        heartbeat = asyncio.create_task(_renew_lease(job_id))
+        try:
+            summary, resume_from = await _index_spec(job_id, job, spec_file)
+            if job['prune']:
+                await _prune(job['integration_id'], spec_file)
+        finally:
+            heartbeat.cancel()
+            await redis_client.srem(RUNNING_KEY, job_id)
+
+    total = resume_from + summary['indexed']
+    await update_job(job_id, status=COMPLETED, parsed=total, total=total)
+    await redis_client.delete(_spec_key(job_id))
+
+
+async def worker_loop(poll_timeout: int = 5) -> None:
+    """Consume ingestion jobs from the Redis queue forever."""
+    print("Ingestion worker started")
+    await reclaim_expired_jobs()
+    while True:
+        item = await redis_client.brpop(QUEUE_KEY, timeout=poll_timeout)
+        if item is None:
+            await reclaim_expired_jobs()
+            continue
+
+        job_id = item[1].decode()
+        print(f"Starting ingestion job {job_id}")
+        try:
+            await run_job(job_id)
+            print(f"Finished ingestion job {job_id}, embedding cache: {embedding_cache.stats()}")
+        except asyncio.CancelledError:
+            await update_job(job_id, status=FAILED, error="Worker was shut down")
+            raise
+        except Exception as exc:
+            traceback.print_exc()
+            await update_job(job_id, status=FAILED, error=str(exc))
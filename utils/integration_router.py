@@ -0,0 +1,128 @@
+"""
+Similarity routing of deep-mode steps to integrations.
+
+Each integration is represented by the dense embedding of its name and
+description, embedded in-process (through the embedding cache) once and
+again only when the description changes; deleting an integration drops it. A
+step scores against an integration with the cosine similarity of its dense
+vector to that embedding or, with `INTEGRATION_ROUTER_ENDPOINTS`, to the
+integration's closest endpoint when that is higher. Callers that already
+searched the integrations for the step pass its vector and those endpoint
+similarities, so routing needs no extra embedding or Qdrant call.
+
+`route` only answers when the best integration leads the runner-up by at
+least `INTEGRATION_ROUTER_MARGIN`; otherwise the caller falls back to the
+LLM picker.
+"""
+
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import INTEGRATION_ROUTER_ENDPOINTS, INTEGRATION_ROUTER_MARGIN
+from utils.embedding_cache import embedding_cache
+from utils.embeddings import DENSE, embedding_models
+from utils.query_embeddings import query_embedder
+
+
+def _normalize(vector: Any) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+def _description(integration: Dict[str, Any]) -> str:
+    return f"{integration.get('name', '')}: {integration.get('description', '')}"
+
+
+class IntegrationRouter:
+    """Routes step texts to the most similar integration."""
+
+    def __init__(self, margin: float, include_endpoints: bool):
+        self._margin = margin
+        self._include_endpoints = include_endpoints
+        # uuid -> (description hash, normalized description vector)
+        self._index: Dict[str, Tuple[str, np.ndarray]] = {}
+        self._stats = {'routed': 0, 'fallbacks': 0}
+
+    async def _vectors(self, integrations: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        """Description vectors of `integrations`, embedding only new or changed descriptions."""
+        vectors = {}
+        stale = []
+        for integration in integrations:
+            text = _description(integration)
+            digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+            entry = self._index.get(integration['uuid'])
+            if entry is not None and entry[0] == digest:
+                vectors[integration['uuid']] = entry[1]
+            else:
+                stale.append((integration['uuid'], text, digest))
+        if not stale:
+            return vectors
+
+        # A few short texts: embedded in this process, like queries, rather
+        # than on the ingestion worker pool. Concurrent callers may embed the
+        # same description; the embedding cache makes the repeat cheap, so no
+        # lock is held across inference
+        descriptions = await asyncio.to_thread(
+            embedding_cache.embed,
+            embedding_models.model_name(DENSE),
+            [text for _, text, _ in stale],
+            lambda missing: list(embedding_models.get(DENSE).passage_embed(missing)),
+        )
+        for (integration_id, _, digest), description in zip(stale, descriptions):
+            vectors[integration_id] = _normalize(description)
+            self._index[integration_id] = (digest, vectors[integration_id])
+        return vectors
+
+    def drop(self, integration_id: str) -> None:
+        self._index.pop(integration_id, None)
+
+    async def scores(
+        self,
+        step: str,
+        integrations: List[Dict[str, Any]],
+        step_vector: Optional[Any] = None,
+        endpoint_similarities: Optional[Dict[str, float]] = None
+    ) -> List[Tuple[str, float]]:
+        """Every integration's similarity to `step`, best first."""
+        vectors = await self._vectors(integrations)
+        if step_vector is None:
+            step_vector = (await query_embedder.embed(step, (DENSE,))).dense
+        query = _normalize(step_vector)
+        endpoint_similarities = endpoint_similarities if self._include_endpoints else None
+
+        scored = []
+        for integration in integrations:
+            score = float(vectors[integration['uuid']] @ query)
+            if endpoint_similarities and integration['uuid'] in endpoint_similarities:
+                score = max(score, endpoint_similarities[integration['uuid']])
+            scored.append((integration['uuid'], score))
+        return sorted(scored, key=lambda item: item[1], reverse=True)
+
+    async def route(
+        self,
+        step: str,
+        integrations: List[Dict[str, Any]],
+        step_vector: Optional[Any] = None,
+        endpoint_similarities: Optional[Dict[str, float]] = None
+    ) -> Optional[str]:
+        """The integration for `step`, or None when the top two are too close to call."""
+        if not integrations:
+            return None
+        if len(integrations) == 1:
+            return integrations[0]['uuid']
+        ranked = await self.scores(step, integrations, step_vector, endpoint_similarities)
+        if ranked[0][1] - ranked[1][1] < self._margin:
+            self._stats['fallbacks'] += 1
+            print(f"Routing '{step}' is ambiguous: {ranked[:2]}")
+            return None
+        self._stats['routed'] += 1
+        return ranked[0][0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, 'integrations': len(self._index)}
+
+
+integration_router = IntegrationRouter(INTEGRATION_ROUTER_MARGIN, INTEGRATION_ROUTER_ENDPOINTS)
@@ -0,0 +1,130 @@
+"""
+Incremental JSON reader for large documents.
+
+`JSONStreamReader` walks a text file object one object member at a time so a
+caller can decode only the values it needs (e.g. one OpenAPI path item) and
+skip the rest without ever holding the whole document in memory.
+"""
+
+import json
+from typing import Any, IO, Iterator
+
+_WHITESPACE = ' \t\n\r'
+
+
+class JSONStreamReader:
+    """Pull-style reader over a JSON document in a text file object."""
+
+    def __init__(self, fp: IO[str], chunk_size: int = 64 * 1024):
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        """Read more input, dropping the consumed prefix of the buffer."""
+        if self._eof:
+            return False
+        # Grow reads with the pending value so re-decoding stays amortised linear
+        data = self._fp.read(max(self._chunk_size, len(self._buf) - self._pos))
+        if not data:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, char: str) -> None:
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found or 'end of input'}'")
+        self._pos += 1
+
+    def read_value(self) -> Any:
+        """Decode and return the next complete JSON value."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            if not self._fill():
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                self._pos = end
+                return value
+
+    def skip_value(self) -> None:
+        """Consume the next JSON value without building it."""
+        first = self._peek()
+        if first not in '{[':
+            self.read_value()
+            return
+
+        depth = 0
+        in_string = False
+        escaped = False
+        while True:
+            if self._pos >= len(self._buf) and not self._fill():
+                raise ValueError("Unexpected end of input while skipping a value")
+            char = self._buf[self._pos]
+            self._pos += 1
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == '\\':
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in '{[':
+                depth += 1
+            elif char in '}]':
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def iter_object(self) -> Iterator[str]:
+        """
+        Yield the keys of the next JSON object one at a time.
+
+        After each key the reader is positioned at its value, which the caller
+        must consume (read_value, skip_value or iter_object) before resuming.
+        """
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.read_value()
+            if not isinstance(key, str):
+                raise ValueError("Object keys must be strings")
+            self._expect(':')
+            yield key
+            separator = self._peek()
+            self._pos += 1
+            if separator == '}':
+                return
+            if separator != ',':
+                raise ValueError(f"Expected ',' or '}}' but found '{separator or 'end of input'}'")
+
+    def peek_type(self) -> str:
+        """Return the first character of the next value ('{', '[', '"', ...)."""
+        return self._peek()
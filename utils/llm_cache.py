@@ -0,0 +1,202 @@
+"""
+Redis cache of DSPy agent outputs.
+
+Every agent predictor is wrapped in `CachedPredictor`, which also passes the
+request's pooled LM (`utils.lm_pool`) to the predictor. A call is keyed by the
+agent name, the LM's model and generation settings, a fingerprint of the
+signature (instructions and input/output schemas) and the hash of the
+serialized inputs, so prompt or schema changes never serve stale outputs.
+Credentials among the LM's settings never enter the key. The per-second
+temporal context added to queries is keyed by the minute, so retries and
+repeats hit while relative times ("in 2 hours") resolve at most a minute
+off; agents created with `time_resolution='day'`, whose outputs do not
+depend on the time of day, key it by its date only.
+Outputs are stored for the agent's TTL (`LLM_CACHE_AGENT_TTLS`, falling
+back to `LLM_CACHE_TTL_SECONDS`).
+
+Agents run synchronously inside request handlers, so this uses a blocking
+Redis client; Redis errors count as misses. A request opts out with
+`use_llm_cache(False)` (its `llm_config.cache`), other code by running inside
+`bypass_llm_cache()`.
+"""
+
+import contextlib
+import contextvars
+import hashlib
+import json
+import threading
+from typing import Any, Dict, Iterator
+
+import dspy
+from pydantic import BaseModel
+from redis import Redis
+from redis.exceptions import RedisError
+
+from config import LLM_CACHE_AGENT_TTLS, LLM_CACHE_ENABLED, LLM_CACHE_TTL_SECONDS, REDIS_URL
+from utils.general import coarsen_temporal_context
+from utils.lm_pool import current_lm
+
+# LM settings that authenticate rather than shape generation
+CREDENTIAL_KWARGS = {'api_key', 'headers', 'extra_headers'}
+
+_bypass = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+
+def use_llm_cache(enabled: bool) -> None:
+    """Enable or skip the cache for the rest of the current context (one request's task)."""
+    _bypass.set(not enabled)
+
+
+@contextlib.contextmanager
+def bypass_llm_cache(bypass: bool = True) -> Iterator[None]:
+    """Make agent calls in this context (request, task) skip the cache."""
+    token = _bypass.set(bypass)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def _serialize(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode='json')
+    if isinstance(value, dict):
+        return {str(key): _serialize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_serialize(item) for item in value]
+    return value
+
+
+def _schema(annotation: Any) -> Any:
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation.model_json_schema()
+    return str(annotation)
+
+
+def signature_fingerprint(signature: Any) -> str:
+    described = {
+        'instructions': signature.instructions,
+        'inputs': {name: _schema(field.annotation) for name, field in signature.input_fields.items()},
+        'outputs': {name: _schema(field.annotation) for name, field in signature.output_fields.items()},
+    }
+    return hashlib.sha256(json.dumps(described, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class CachedPredictor:
+    """Serves a `dspy.Predict` agent's outputs from Redis for identical calls."""
+
+    PREFIX = "llmcache:"
+
+    def __init__(
+        self,
+        name: str,
+        predictor: dspy.Predict,
+        redis: Redis,
+        ttl_seconds: int,
+        time_resolution: str = 'minute'
+    ):
+        self.name = name
+        self.predictor = predictor
+        self._redis = redis
+        self._ttl_seconds = ttl_seconds
+        self._time_resolution = time_resolution
+        self._fingerprint = signature_fingerprint(predictor.signature)
+
+    def __getattr__(self, attribute: str) -> Any:
+        # Only reached for attributes this wrapper lacks; the predictor's are served from it
+        if attribute == 'predictor':
+            raise AttributeError(attribute)
+        return getattr(self.predictor, attribute)
+
+    def _key(self, lm: Any, inputs: Dict[str, Any]) -> str:
+        described = {
+            'model': lm.model,
+            'lm_kwargs': {
+                name: value for name, value in getattr(lm, 'kwargs', {}).items()
+                if name not in CREDENTIAL_KWARGS
+            },
+            'signature': self._fingerprint,
+            'inputs': _serialize(inputs),
+        }
+        # Queries carry a per-second timestamp; keyed coarser, retries and repeats hit
+        serialized = coarsen_temporal_context(
+            json.dumps(described, sort_keys=True, default=str), self._time_resolution)
+        digest = hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+        return f"{self.PREFIX}{self.name}:{digest}"
+
+    def _decode(self, stored: bytes) -> dspy.Prediction:
+        outputs = json.loads(stored)
+        fields = self.predictor.signature.output_fields
+        return dspy.Prediction(**{
+            name: fields[name].annotation.model_validate(value)
+            if isinstance(fields[name].annotation, type) and issubclass(fields[name].annotation, BaseModel)
+            else value
+            for name, value in outputs.items()
+        })
+
+    def __call__(self, **kwargs: Any) -> dspy.Prediction:
+        # The request's pooled LM, passed explicitly instead of through global settings
+        if kwargs.get('lm') is None and current_lm() is not None:
+            kwargs['lm'] = current_lm()
+        lm = kwargs.get('lm') or dspy.settings.lm
+        if not LLM_CACHE_ENABLED or self._ttl_seconds <= 0 or _bypass.get() or lm is None:
+            llm_cache_stats.count(self.name, 'bypassed')
+            return self.predictor(**kwargs)
+
+        inputs = {name: value for name, value in kwargs.items() if name in self.predictor.signature.input_fields}
+        key = self._key(lm, inputs)
+        try:
+            stored = self._redis.get(key)
+        except RedisError as exc:
+            print(f"LLM cache lookup failed for {self.name}: {exc}")
+            stored = None
+        if stored is not None:
+            llm_cache_stats.count(self.name, 'hits')
+            return self._decode(stored)
+
+        llm_cache_stats.count(self.name, 'misses')
+        prediction = self.predictor(**kwargs)
+        outputs = {name: _serialize(prediction[name]) for name in self.predictor.signature.output_fields}
+        try:
+            self._redis.set(key, json.dumps(outputs), ex=self._ttl_seconds)
+        except RedisError as exc:
+            print(f"LLM cache write failed for {self.name}: {exc}")
+        return prediction
+
+
+class LLMCacheStats:
+    """Per-agent hit, miss and bypass counters for this process."""
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, outcome: str) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(name, {'hits': 0, 'misses': 0, 'bypassed': 0})
+            stats[outcome] += 1
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            agents = {}
+            for name, stats in self._stats.items():
+                lookups = stats['hits'] + stats['misses']
+                agents[name] = {**stats, 'hit_rate': stats['hits'] / lookups if lookups else 0.0}
+        return {'enabled': LLM_CACHE_ENABLED, 'agents': agents}
+
+
+llm_cache_stats = LLMCacheStats()
+
+_redis = Redis.from_url(REDIS_URL)
+
+
+def cached_predictor(name: str, predictor: dspy.Predict, time_resolution: str = 'minute') -> CachedPredictor:
+    """
+    Wrap an agent predictor with the shared cache and its configured TTL.
+
+    Pass `time_resolution='day'` only for agents whose output does not depend
+    on the time of day (e.g. ones that pick endpoints rather than fill in
+    request parameters), so their calls are shared across a whole day.
+    """
+    return CachedPredictor(
+        name, predictor, _redis, int(LLM_CACHE_AGENT_TTLS.get(name, LLM_CACHE_TTL_SECONDS)), time_resolution)
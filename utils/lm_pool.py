@@ -0,0 +1,64 @@
+"""
+Process-wide pool of DSPy LMs, bound per request.
+
+One `dspy.LM` is kept per (model, API key) and reused by every request that
+asks for that model, keeping its HTTP clients warm. DSPy's own response
+cache is off for pooled LMs; `utils.llm_cache` is the only one. Instead of the global
+`dspy.configure`, a request binds its LM to the current context with
+`bind_lm`; agents pick it up through `current_lm()` (see
+`utils.llm_cache.CachedPredictor`), so concurrent requests on different
+models never see each other's LM.
+"""
+
+import contextvars
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import dspy
+
+from config import LLM_API_KEYS
+
+_current_lm: contextvars.ContextVar[Optional[dspy.LM]] = contextvars.ContextVar("current_lm", default=None)
+
+
+class LMPool:
+    """Creates each (model, API key) LM once and hands out the shared instance."""
+
+    def __init__(self, api_keys: Dict[str, str]):
+        self._api_keys = api_keys
+        self._lms: Dict[Tuple[str, str], dspy.LM] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str) -> dspy.LM:
+        api_key = self._api_keys.get(model, "")
+        if not api_key:
+            raise ValueError(f"No API key found for LLM: {model}")
+
+        key = (model, api_key)
+        lm = self._lms.get(key)
+        if lm is None:
+            with self._lock:
+                lm = self._lms.get(key)
+                if lm is None:
+                    # The Redis cache in utils.llm_cache is the only response cache,
+                    # so a request that opts out of it always reaches the model
+                    lm = dspy.LM(model=model, api_key=api_key, cache=False, cache_in_memory=False)
+                    self._lms[key] = lm
+        return lm
+
+    def stats(self) -> Dict[str, Any]:
+        return {'models': sorted({model for model, _ in self._lms})}
+
+
+lm_pool = LMPool(LLM_API_KEYS)
+
+
+def bind_lm(model: str) -> dspy.LM:
+    """Use the pooled LM for `model` for agent calls in the current context (one request's task)."""
+    lm = lm_pool.get(model)
+    _current_lm.set(lm)
+    return lm
+
+
+def current_lm() -> Optional[dspy.LM]:
+    return _current_lm.get()
@@ -0,0 +1,333 @@
+"""
+In-process NumPy mirror of hot integrations' vectors.
+
+Once an integration has served `LOCAL_INDEX_MIN_QUERIES` queries in this
+process, its dense, sparse and ColBERT vectors are copied out of Qdrant into
+contiguous arrays and retrieval is scored locally, skipping the network
+round trip. Scoring follows Qdrant's own: cosine for dense vectors, BM25
+dot products with the same IDF formula for sparse ones, MaxSim over cosine
+token similarities for ColBERT, and the same RRF/DBSF fusion, so a mirror
+returns the top-k `query_db` would.
+
+Equally scored points are where the two can differ. Fused results keep
+Qdrant's tie order: points seen first, across the dense, sparse and ColBERT
+candidates in that order, rank first. Within a single search, Qdrant leaves
+the order of equal scores unspecified, and the mirror keeps point (id)
+order. When equal scores straddle a prefetch limit, as with coarse sparse
+scores, the two can keep different candidates, and so fuse to different
+top-k.
+
+A mirror is tied to the catalog version it was built at and is rebuilt in
+the background when the version moves; until then queries go to Qdrant.
+Without a readable catalog version (caching disabled, Redis down) mirrors
+are not used. Mirrors are evicted least recently used first to keep their
+vectors and payloads within `LOCAL_INDEX_MEMORY_MB`. Dropping an integration
+advances its generation, and a build started before the drop is discarded
+when it finishes.
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import ScoredPoint
+
+from config import (
+    DENSE_EMBEDDING_MODEL,
+    LATE_EMBEDDING_MODEL,
+    LOCAL_INDEX_ENABLED,
+    LOCAL_INDEX_MEMORY_MB,
+    LOCAL_INDEX_MIN_QUERIES,
+    SPARSE_EMBEDDING_MODEL,
+    async_qdrant_client,
+)
+from utils.general import approximate_nbytes
+from utils.retrieval_config import RERANK, SPARSE_ONLY
+
+# Qdrant's RRF ranking constant
+RRF_K = 2
+
+SCROLL_PAGE_SIZE = 256
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0.0, 1.0, norms)
+
+
+def _top(scores: np.ndarray, candidates: np.ndarray, limit: int) -> np.ndarray:
+    """Indexes from `candidates` with the highest `scores`, best first; equal scores keep candidate order."""
+    if len(candidates) > limit:
+        values = scores[candidates]
+        cutoff = np.partition(values, len(values) - limit)[len(values) - limit]
+        keep = values > cutoff
+        tied = np.flatnonzero(values == cutoff)
+        keep[tied[:limit - int(keep.sum())]] = True
+        candidates = candidates[keep]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def _first_seen(rankings: List[np.ndarray]) -> np.ndarray:
+    """Every index in `rankings`, once, in order of first appearance."""
+    seen = np.concatenate(rankings)
+    _, first = np.unique(seen, return_index=True)
+    return seen[np.sort(first)]
+
+
+def rrf(rankings: List[np.ndarray], size: int) -> np.ndarray:
+    scores = np.zeros(size)
+    for ranking in rankings:
+        scores[ranking] += 1.0 / (RRF_K + np.arange(len(ranking)))
+    return scores
+
+
+def dbsf(rankings: List[np.ndarray], raw_scores: List[np.ndarray], size: int) -> np.ndarray:
+    """Qdrant's distribution-based score fusion: mean ± 3 std normalization, summed."""
+    scores = np.zeros(size)
+    for ranking, raw in zip(rankings, raw_scores):
+        if len(ranking) == 0:
+            continue
+        values = raw[ranking].astype(np.float64)
+        if len(values) == 1 or values.var(ddof=1) == 0:
+            scores[ranking] += 0.5
+            continue
+        std = values.std(ddof=1)
+        low = values.mean() - 3 * std
+        scores[ranking] += (values - low) / (6 * std)
+    return scores
+
+
+class IntegrationMirror:
+    """The vectors and payloads of one integration collection as NumPy arrays."""
+
+    def __init__(self, records: Sequence[Any], version: Optional[int] = None):
+        self.version = version
+        self.ids = [record.id for record in records]
+        self.payloads = [record.payload for record in records]
+        # Payloads hold the serialized body/response schemas, often the bulk of a mirror
+        self.payload_nbytes = sum(approximate_nbytes(payload) for payload in self.payloads)
+        size = len(records)
+
+        self.dense = _normalize_rows(np.asarray(
+            [record.vector[DENSE_EMBEDDING_MODEL] for record in records], dtype=np.float32))
+
+        # Inverted index of the sparse vectors: term -> (documents, values)
+        postings: Dict[int, List[List[float]]] = {}
+        for doc, record in enumerate(records):
+            sparse = record.vector[SPARSE_EMBEDDING_MODEL]
+            for term, value in zip(sparse.indices, sparse.values):
+                entry = postings.setdefault(term, [[], []])
+                entry[0].append(doc)
+                entry[1].append(value)
+        self.postings = {
+            term: (np.asarray(docs, dtype=np.int64), np.asarray(values, dtype=np.float32))
+            for term, (docs, values) in postings.items()
+        }
+
+        # All ColBERT token vectors stacked, with each document's first row
+        late = [np.asarray(record.vector[LATE_EMBEDDING_MODEL], dtype=np.float32) for record in records]
+        self.token_counts = np.asarray([len(matrix) for matrix in late], dtype=np.int64)
+        self.token_offsets = np.concatenate([[0], np.cumsum(self.token_counts)[:-1]]).astype(np.int64)
+        self.tokens = _normalize_rows(np.concatenate(late)) if late else np.zeros((0, 128), dtype=np.float32)
+        self.size = size
+
+    @property
+    def nbytes(self) -> int:
+        postings = sum(docs.nbytes + values.nbytes for docs, values in self.postings.values())
+        return (self.dense.nbytes + self.tokens.nbytes + self.token_offsets.nbytes
+                + self.token_counts.nbytes + postings + self.payload_nbytes)
+
+    def dense_scores(self, query: Any) -> np.ndarray:
+        query = np.asarray(query, dtype=np.float32)
+        return self.dense @ (query / (np.linalg.norm(query) or 1.0))
+
+    def sparse_scores(self, query: Any) -> np.ndarray:
+        """BM25 scores with IDF applied to the query; -inf where no term overlaps."""
+        scores = np.full(self.size, -np.inf, dtype=np.float32)
+        for term, value in zip(query.indices, query.values):
+            entry = self.postings.get(int(term))
+            if entry is None:
+                continue
+            docs, values = entry
+            idf = math.log((self.size - len(docs) + 0.5) / (len(docs) + 0.5) + 1)
+            hit = docs[scores[docs] == -np.inf]
+            scores[hit] = 0.0
+            scores[docs] += value * idf * values
+        return scores
+
+    def late_scores(self, query: Any, candidates: Optional[np.ndarray] = None) -> np.ndarray:
+        """MaxSim of the query tokens against every (or every candidate) document."""
+        query = _normalize_rows(np.asarray(query, dtype=np.float32))
+        if candidates is None:
+            similarities = query @ self.tokens.T
+            return np.maximum.reduceat(similarities, self.token_offsets, axis=1).sum(axis=0)
+
+        # Only multiply the candidates' token rows
+        counts = self.token_counts[candidates]
+        rows = np.concatenate([
+            np.arange(start, start + count)
+            for start, count in zip(self.token_offsets[candidates], counts)
+        ])
+        similarities = query @ self.tokens[rows].T
+        offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        scores = np.full(self.size, -np.inf, dtype=np.float32)
+        scores[candidates] = np.maximum.reduceat(similarities, offsets, axis=1).sum(axis=0)
+        return scores
+
+    def search(self, settings: Dict[str, Any], query_vectors: Any) -> List[ScoredPoint]:
+        """Score and fuse locally the way `build_retrieval_query` asks Qdrant to."""
+        everything = np.arange(self.size)
+        sparse = self.sparse_scores(query_vectors.sparse)
+        sparse_matches = everything[sparse != -np.inf]
+
+        if settings['mode'] == SPARSE_ONLY:
+            ranking = _top(sparse, sparse_matches, settings['top_k'])
+            return self._points(ranking, sparse[ranking])
+
+        dense = self.dense_scores(query_vectors.dense)
+        dense_ranking = _top(dense, everything, settings['dense_limit'])
+        sparse_ranking = _top(sparse, sparse_matches, settings['sparse_limit'])
+
+        if settings['mode'] == RERANK:
+            candidates = np.union1d(dense_ranking, sparse_ranking)
+            late = self.late_scores(query_vectors.late, candidates)
+            ranking = _top(late, candidates, settings['top_k'])
+            return self._points(ranking, late[ranking])
+
+        late = self.late_scores(query_vectors.late)
+        late_ranking = _top(late, everything, settings['late_limit'])
+        rankings = [dense_ranking, sparse_ranking, late_ranking]
+        if settings['fusion'] == 'dbsf':
+            fused = dbsf(rankings, [dense, sparse, late], self.size)
+        else:
+            fused = rrf(rankings, self.size)
+        # Ties keep the order Qdrant's fusion sees points in
+        ranking = _top(fused, _first_seen(rankings), settings['top_k'])
+        return self._points(ranking, fused[ranking])
+
+    def _points(self, ranking: np.ndarray, scores: np.ndarray) -> List[ScoredPoint]:
+        return [
+            ScoredPoint(id=self.ids[index], version=0, score=float(score), payload=self.payloads[index])
+            for index, score in zip(ranking.tolist(), scores.tolist())
+        ]
+
+
+async def load_records(client: AsyncQdrantClient, integration_id: str) -> List[Any]:
+    records = []
+    offset = None
+    while True:
+        page, offset = await client.scroll(
+            integration_id,
+            limit=SCROLL_PAGE_SIZE,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        records.extend(page)
+        if offset is None:
+            return records
+
+
+class LocalIndex:
+    """Builds, serves and evicts integration mirrors."""
+
+    def __init__(self, client: AsyncQdrantClient, min_queries: int, memory_budget_bytes: int):
+        self._client = client
+        self._min_queries = min_queries
+        self._budget = memory_budget_bytes
+        self._mirrors: "OrderedDict[str, IntegrationMirror]" = OrderedDict()
+        self._queries: Dict[str, int] = {}
+        self._building: Dict[str, asyncio.Task] = {}
+        # Advanced by `drop`, so builds that were running are not kept
+        self._generations: Dict[str, int] = {}
+        self._stats = {'local_searches': 0, 'builds': 0, 'evictions': 0, 'build_seconds': 0.0}
+
+    def get(self, integration_id: str, version: Optional[int]) -> Optional[IntegrationMirror]:
+        """
+        The integration's mirror if it is current; counts the query and
+        schedules a (re)build when the integration is hot but not mirrored.
+        """
+        if version is None:
+            return None
+
+        mirror = self._mirrors.get(integration_id)
+        if mirror is not None and mirror.version == version:
+            self._mirrors.move_to_end(integration_id)
+            return mirror
+
+        self._queries[integration_id] = self._queries.get(integration_id, 0) + 1
+        if self._queries[integration_id] >= self._min_queries and integration_id not in self._building:
+            self._building[integration_id] = asyncio.create_task(
+                self._build(integration_id, version, self._generations.get(integration_id, 0)))
+        return None
+
+    async def search(
+        self,
+        integration_id: str,
+        version: Optional[int],
+        settings: Dict[str, Any],
+        query_vectors: Any
+    ) -> Optional[List[ScoredPoint]]:
+        """Local results, or None when the integration is not (yet) mirrored."""
+        mirror = self.get(integration_id, version)
+        if mirror is None:
+            return None
+        self._stats['local_searches'] += 1
+        return await asyncio.to_thread(mirror.search, settings, query_vectors)
+
+    async def _build(self, integration_id: str, version: int, generation: int) -> None:
+        try:
+            start_time = time.perf_counter()
+            records = await load_records(self._client, integration_id)
+            mirror = await asyncio.to_thread(IntegrationMirror, records, version)
+            self._stats['builds'] += 1
+            self._stats['build_seconds'] += time.perf_counter() - start_time
+
+            if self._generations.get(integration_id, 0) != generation:
+                print(f"Discarding the mirror of {integration_id}, it was dropped while building")
+                return
+            self._mirrors.pop(integration_id, None)
+            if mirror.size == 0 or mirror.nbytes > self._budget:
+                print(f"Not mirroring {integration_id}: {mirror.nbytes} bytes for {mirror.size} endpoints")
+                return
+            self._mirrors[integration_id] = mirror
+            self._evict()
+            print(f"Mirrored {integration_id} at catalog version {version} "
+                  f"({mirror.size} endpoints, {mirror.nbytes / 1024 / 1024:.1f} MB)")
+        except Exception as exc:
+            print(f"Failed to mirror {integration_id}: {exc}")
+        finally:
+            # A build scheduled after a drop may have replaced this one
+            if self._building.get(integration_id) is asyncio.current_task():
+                del self._building[integration_id]
+
+    def _evict(self) -> None:
+        while sum(mirror.nbytes for mirror in self._mirrors.values()) > self._budget:
+            integration_id, _ = self._mirrors.popitem(last=False)
+            self._queries.pop(integration_id, None)
+            self._stats['evictions'] += 1
+
+    def drop(self, integration_id: str) -> None:
+        self._generations[integration_id] = self._generations.get(integration_id, 0) + 1
+        self._building.pop(integration_id, None)
+        self._mirrors.pop(integration_id, None)
+        self._queries.pop(integration_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            'mirrors': {
+                integration_id: {'version': mirror.version, 'endpoints': mirror.size, 'bytes': mirror.nbytes}
+                for integration_id, mirror in self._mirrors.items()
+            },
+            'memory_budget_bytes': self._budget,
+        }
+
+
+local_index = LocalIndex(
+    async_qdrant_client, LOCAL_INDEX_MIN_QUERIES, LOCAL_INDEX_MEMORY_MB * 1024 * 1024
+) if LOCAL_INDEX_ENABLED else None
@@ -1,5 +1,7 @@
 import json
-from typing import Dict, Any, List, Set
+from typing import Dict, Any, IO, Iterator, List, Set, Tuple
+
+from utils.json_stream import JSONStreamReader
 
 
 def find_ref_schema(ref_path: str, components: Dict[str, Any]) -> Dict[str, Any]:
@@ -16,6 +18,12 @@ def convert_schema_to_fields(
     depth: int = 0,
     max_depth: int = 200
 ) -> List[Dict[str, Any]]:
+    """
+    Flatten a schema without caching, re-resolving every `$ref` it meets.
+
+    Ingestion uses `ComponentTable`; this version is kept as the baseline for
+    `scripts/benchmark_openapi.py`.
+    """
     if visited_refs is None:
         visited_refs = set()
 
@@ -119,6 +127,127 @@ def convert_schema_to_fields(
     return fields
 
 
+class ComponentTable:
+    """
+    Per-spec table of component schemas flattened into field lists.
+
+    Each `#/components/schemas/...` reference gets one canonical expansion,
+    built the first time an operation reaches it and reused by every later
+    operation. Inside that expansion a reference met a second time is cut to
+    an empty field list, so the cut depends only on the root and never on
+    operation order, and the work per root is bounded by the number of
+    components. Expansions that no cycle cut are the same under every root
+    and are also shared between roots. Returned field lists are shared between
+    callers and must not be mutated.
+    """
+
+    def __init__(self, components: Dict[str, Any], max_depth: int = 200):
+        self.components = components
+        self.max_depth = max_depth
+        # Complete expansions, valid wherever the reference appears
+        self._compiled: Dict[str, List[Dict[str, Any]]] = {}
+        # Canonical expansions of references that some cut made root-specific
+        self._roots: Dict[str, List[Dict[str, Any]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def fields_for(self, schema: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Flatten a schema (inline or `$ref`) into the field list format of `convert_schema_to_fields`."""
+        if '$ref' in schema:
+            ref_path = schema['$ref']
+            if ref_path in self._roots:
+                self.hits += 1
+                return self._roots[ref_path]
+            fields, truncated = self._ref_fields(ref_path, set(), 0)
+            if truncated:
+                self._roots[ref_path] = fields
+            return fields
+        return self._schema_fields(schema, set(), 0)[0]
+
+    def _ref_fields(self, ref_path: str, seen: Set[str], depth: int) -> Tuple[List[Dict[str, Any]], bool]:
+        if ref_path in self._compiled:
+            self.hits += 1
+            return self._compiled[ref_path], False
+
+        if ref_path in seen:
+            print(f"Circular reference detected: {ref_path}")
+            return [], True
+
+        if depth > self.max_depth:
+            print(f"Max depth reached for schema: {ref_path}")
+            return [], True
+
+        schema = find_ref_schema(ref_path, self.components)
+        if not schema:
+            print(f"Could not resolve reference: {ref_path}")
+            return [], False
+
+        self.misses += 1
+        seen.add(ref_path)
+        fields, truncated = self._schema_fields(schema, seen, depth + 1)
+        if not truncated:
+            self._compiled[ref_path] = fields
+        return fields, truncated
+
+    def _resolve(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        if '$ref' in schema:
+            return find_ref_schema(schema['$ref'], self.components)
+        return schema
+
+    def _schema_fields(self, schema: Dict[str, Any], seen: Set[str], depth: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """The schema's fields and whether a revisited reference or `max_depth` cut any of them short."""
+        if '$ref' in schema:
+            return self._ref_fields(schema['$ref'], seen, depth)
+
+        fields = []
+        truncated = False
+        schema_type = schema.get('type', 'object')
+
+        if schema_type == 'object':
+            properties = schema.get('properties', {})
+            required = schema.get('required', [])
+
+            for key, prop in properties.items():
+                field = {
+                    'key': key,
+                    'type': prop.get('type', 'string'),
+                    'description': prop.get('description', ''),
+                    'required': key in required,
+                    'fields': []
+                }
+
+                if prop.get('type') == 'object':
+                    field['fields'], cut = self._schema_fields(prop, seen, depth)
+                    truncated = truncated or cut
+
+                elif prop.get('type') == 'array':
+                    items = prop.get('items', {})
+                    if self._resolve(items).get('type') == 'object':
+                        field['fields'], cut = self._schema_fields(items, seen, depth)
+                        truncated = truncated or cut
+
+                fields.append(field)
+
+        elif schema_type == 'array':
+            items = schema.get('items', {})
+            if self._resolve(items).get('type') == 'object':
+                fields, truncated = self._schema_fields(items, seen, depth)
+
+        elif schema_type in ['string', 'number', 'integer', 'boolean']:
+            fields.append({
+                'key': 'value',
+                'type': schema_type,
+                'description': schema.get('description', ''),
+                'required': True,
+                'fields': []
+            })
+
+        else:
+            print(f"Unhandled schema type: {schema_type} for schema: {schema}")
+
+        return fields, truncated
+
+
 def process_parameters(parameters: List[Dict[str, Any]]) -> str:
     processed_params = []
     for param in parameters:
@@ -130,3 +259,137 @@ def process_parameters(parameters: List[Dict[str, Any]]) -> str:
         }
         processed_params.append(processed_param)
     return json.dumps(processed_params)
+
+
+def select_request_body_schema(request_body: Dict[str, Any]) -> Dict[str, Any]:
+    content_types = request_body.get('content', {})
+
+    # Try different content types in order of preference
+    for content_type in ['application/json', 'application/x-www-form-urlencoded', 'multipart/form-data']:
+        if content_type in content_types:
+            return content_types[content_type].get('schema', {})
+
+    # If no specific content type found, try to get any schema from content
+    for content_type, content_data in content_types.items():
+        if 'schema' in content_data:
+            return content_data['schema']
+
+    return {}
+
+
+def build_route(
+    path: str,
+    method: str,
+    request_content: Dict[str, Any],
+    component_table: ComponentTable,
+    integration_id: str
+) -> Dict[str, Any]:
+    route = {
+        'method': method.upper(),
+        'url': path,
+        'description': request_content.get('description', ''),
+        'text': request_content.get('description', ''),
+        'integration_id': integration_id,
+        'tool': False
+    }
+
+    print(f"\nProcessing endpoint: {method.upper()} {path}")
+    print(f"Has requestBody: {'requestBody' in request_content}")
+    if 'requestBody' in request_content:
+        print(f"requestBody content types: {list(request_content['requestBody'].get('content', {}).keys())}")
+
+    parameters = request_content.get('parameters', [])
+    route['parameters'] = process_parameters(parameters)
+
+    body_schema = select_request_body_schema(request_content.get('requestBody', {}))
+    if body_schema:
+        body_fields = component_table.fields_for(body_schema)
+        route['body'] = json.dumps(body_fields)
+        print(f"Body fields for {method.upper()} {path}: {body_fields}")
+    else:
+        route['body'] = '[]'
+        print(f"No body schema found for {method.upper()} {path}")
+
+    success_response = request_content.get('responses', {}).get('200', {})
+    content = success_response.get('content', {}).get('application/json', {})
+    response_schema = content.get('schema', {})
+
+    if response_schema:
+        response_fields = component_table.fields_for(response_schema)
+        route['response'] = json.dumps(response_fields)
+    else:
+        route['response'] = '[]'
+
+    return route
+
+
+HTTP_METHODS = {'get', 'put', 'post', 'delete', 'options', 'head', 'patch', 'trace'}
+
+
+def load_component_schemas(fp: IO[str]) -> Dict[str, Any]:
+    """Read only `components.schemas` from a spec, skipping everything else."""
+    fp.seek(0)
+    reader = JSONStreamReader(fp)
+    schemas = {}
+    for key in reader.iter_object():
+        if key != 'components':
+            reader.skip_value()
+            continue
+        for component_type in reader.iter_object():
+            if component_type == 'schemas':
+                schemas = reader.read_value()
+            else:
+                reader.skip_value()
+    return schemas
+
+
+def iter_operations(fp: IO[str]) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """Yield `(path, method, operation)` from a spec, decoding one path item at a time."""
+    fp.seek(0)
+    reader = JSONStreamReader(fp)
+    found_paths = False
+    for key in reader.iter_object():
+        if key != 'paths':
+            reader.skip_value()
+            continue
+        found_paths = True
+        for path in reader.iter_object():
+            path_content = reader.read_value()
+            for method, request_content in path_content.items():
+                if method.lower() in HTTP_METHODS:
+                    yield path, method, request_content
+    if not found_paths:
+        raise ValueError("OpenAPI spec has no 'paths' object")
+
+
+def has_paths(fp: IO[str]) -> bool:
+    """Cheaply check that a spec is a JSON object with a top-level `paths` object."""
+    fp.seek(0)
+    reader = JSONStreamReader(fp)
+    for key in reader.iter_object():
+        if key == 'paths':
+            return reader.peek_type() == '{'
+        reader.skip_value()
+    return False
+
+
+def extract_routes(
+    fp: IO[str],
+    integration_id: str,
+    selected_endpoints: List[str]
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield one route dict per selected path/method operation of an OpenAPI spec.
+
+    The spec is streamed from `fp`: only component schemas and the current
+    path item are held in memory. An empty `selected_endpoints` list selects
+    every operation.
+    """
+    components = load_component_schemas(fp)
+    print(f"Found {len(components)} component schemas")
+    component_table = ComponentTable(components)
+
+    for path, method, request_content in iter_operations(fp):
+        if selected_endpoints and str(method.upper() + "_" + path) not in selected_endpoints:
+            continue
+        yield build_route(path, method, request_content, component_table, integration_id)
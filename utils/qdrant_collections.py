@@ -0,0 +1,417 @@
+"""
+In-memory registry of the Qdrant collections that back integrations.
+
+Existence checks hit Qdrant once per collection and are then answered from
+memory, creation is idempotent, and dropping a collection invalidates its
+entry. Entries expire after `COLLECTION_REGISTRY_TTL_SECONDS` so a collection
+dropped by another process (e.g. the API while the ingestion worker runs) is
+noticed.
+
+New collections are created with the storage settings from config
+(quantization, ColBERT multivector datatype and on-disk placement) and
+keyword payload indexes on the fields endpoints are looked up by; `convert`
+applies other settings to an existing collection and adds missing indexes.
+Scalar quantization also covers the ColBERT multivector, which is the way to
+shrink it: Qdrant corrects int8 scores for the quantization offset and
+rescores with the original vectors.
+
+Each integration id is a Qdrant alias of one of two physical collections,
+`{id}__a` and `{id}__b`; a rebuild fills the other one and swaps the alias
+atomically. With fixed names an alias is resolved by asking those two
+collections for their aliases instead of listing every alias in the
+cluster, and processes racing to create a collection all point the alias at
+the same one. Collections created before aliases were used are plain
+collections named after the integration and are moved behind an alias by
+their first rebuild.
+
+A conversion holds a per-integration marker in Redis, so it is shared with
+the ingestion worker. Writers go through `writing`, which rejects writes
+while the marker is held and fails writes that overlapped the start of a
+conversion (they may have missed the copy); upserts and deletes are
+idempotent, so such a write is safe to retry once the conversion is done.
+"""
+
+import asyncio
+import contextlib
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from qdrant_client import AsyncQdrantClient, models
+from qdrant_client.http.exceptions import UnexpectedResponse
+from redis.exceptions import RedisError
+
+from config import (
+    COLLECTION_QUANTIZATION,
+    COLLECTION_REGISTRY_TTL_SECONDS,
+    DENSE_EMBEDDING_MODEL,
+    LATE_EMBEDDING_MODEL,
+    LATE_VECTOR_DATATYPE,
+    LATE_VECTOR_ON_DISK,
+    QUANTIZATION_ALWAYS_RAM,
+    QUANTIZATION_OVERSAMPLING,
+    QUANTIZATION_RESCORE,
+    SPARSE_EMBEDDING_MODEL,
+    async_qdrant_client,
+    redis_client,
+)
+from utils.retrieval_cache import bump_catalog_version
+
+QUANTIZATION_TYPES = ('none', 'scalar', 'binary')
+LATE_DATATYPES = ('float32', 'float16')
+
+# Payload fields endpoint edit/delete filter on
+PAYLOAD_INDEXES = ('url', 'method')
+
+# Points copied per scroll page when a collection has to be rebuilt
+CONVERT_PAGE_SIZE = 256
+
+# Upper bound on a conversion, so a process that dies mid-way does not block writes forever
+CONVERSION_MARKER_SECONDS = 3600
+
+
+class CollectionBusyError(RuntimeError):
+    """Raised for writes to a collection that is being converted."""
+
+
+def _converting_key(name: str) -> str:
+    return f"collection:converting:{name}"
+
+
+def _conversions_key(name: str) -> str:
+    return f"collection:conversions:{name}"
+
+
+def storage_settings(
+    quantization: Optional[str] = None,
+    late_datatype: Optional[str] = None,
+    late_on_disk: Optional[bool] = None
+) -> Dict[str, Any]:
+    """Fill unset storage options from config and validate them."""
+    settings = {
+        'quantization': (quantization or COLLECTION_QUANTIZATION).lower(),
+        'late_datatype': (late_datatype or LATE_VECTOR_DATATYPE).lower(),
+        'late_on_disk': LATE_VECTOR_ON_DISK if late_on_disk is None else late_on_disk,
+    }
+    if settings['quantization'] not in QUANTIZATION_TYPES:
+        raise ValueError(f"Unknown quantization: {settings['quantization']}")
+    if settings['late_datatype'] not in LATE_DATATYPES:
+        raise ValueError(f"Unknown late vector datatype: {settings['late_datatype']}")
+    return settings
+
+
+def quantization_config(quantization: str) -> Optional[Any]:
+    if quantization == 'scalar':
+        return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+            type=models.ScalarType.INT8,
+            quantile=0.99,
+            always_ram=QUANTIZATION_ALWAYS_RAM,
+        ))
+    if quantization == 'binary':
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(
+            always_ram=QUANTIZATION_ALWAYS_RAM,
+        ))
+    return None
+
+
+def quantization_search_params() -> models.SearchParams:
+    """Search params that rescore quantized candidates; ignored by unquantized collections."""
+    return models.SearchParams(quantization=models.QuantizationSearchParams(
+        rescore=QUANTIZATION_RESCORE,
+        oversampling=QUANTIZATION_OVERSAMPLING,
+    ))
+
+
+def _datatype_name(datatype: Optional[models.Datatype]) -> str:
+    return datatype.value if datatype is not None else 'float32'
+
+
+def _quantization_name(config: Optional[Any]) -> str:
+    if isinstance(config, models.ScalarQuantization):
+        return 'scalar'
+    if isinstance(config, models.BinaryQuantization):
+        return 'binary'
+    return 'none'
+
+
+def _physical_names(name: str) -> Tuple[str, str]:
+    return f"{name}__a", f"{name}__b"
+
+
+class CollectionRegistry:
+    """Caches which integration collections exist and creates them on demand."""
+
+    def __init__(self, client: AsyncQdrantClient, ttl_seconds: int = COLLECTION_REGISTRY_TTL_SECONDS, redis=redis_client):
+        self._client = client
+        self._redis = redis
+        self._ttl_seconds = ttl_seconds
+        self._known: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+
+    def _remember(self, name: str) -> None:
+        self._known[name] = time.monotonic() + self._ttl_seconds
+
+    async def _is_alias_of(self, name: str, collection: str) -> bool:
+        try:
+            aliases = (await self._client.get_collection_aliases(collection)).aliases
+        except UnexpectedResponse:
+            # No such collection
+            return False
+        return any(alias.alias_name == name for alias in aliases)
+
+    async def _target(self, name: str) -> Optional[str]:
+        """The collection the alias `name` points to, or None when `name` is not an alias."""
+        for collection in _physical_names(name):
+            if await self._is_alias_of(name, collection):
+                return collection
+        return None
+
+    async def _collection_exists(self, name: str) -> bool:
+        # Resolves aliases
+        return await self._client.collection_exists(name)
+
+    async def _point_alias(self, name: str, collection: str, replace: bool) -> None:
+        """Point the alias `name` at `collection`, replacing its current target in the same atomic update."""
+        operations = []
+        if replace:
+            operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=name)))
+        operations.append(models.CreateAliasOperation(
+            create_alias=models.CreateAlias(collection_name=collection, alias_name=name)))
+        await self._client.update_collection_aliases(change_aliases_operations=operations)
+
+    async def exists(self, name: str) -> bool:
+        expires_at = self._known.get(name)
+        if expires_at is not None and expires_at > time.monotonic():
+            return True
+
+        if await self._collection_exists(name):
+            self._remember(name)
+            return True
+        self._known.pop(name, None)
+        return False
+
+    async def ensure(self, name: str, dense_size: int) -> bool:
+        """Create the collection if it is missing. Returns True if it was created."""
+        if await self.exists(name):
+            return False
+
+        async with self._lock:
+            if await self.exists(name):
+                return False
+            physical = _physical_names(name)[0]
+            created = True
+            try:
+                await self._create(physical, dense_size, storage_settings())
+            except (UnexpectedResponse, ValueError):
+                # Another process created it between our check and create; it
+                # uses the same collection, so finishing its setup is harmless
+                created = False
+                await self.ensure_payload_indexes(physical)
+            try:
+                await self._point_alias(name, physical, replace=False)
+            except (UnexpectedResponse, ValueError):
+                pass
+            if not await self._is_alias_of(name, physical):
+                raise RuntimeError(f"Could not create collection {name}")
+
+            self._remember(name)
+            return created
+
+    async def _create(self, name: str, dense_size: int, settings: Dict[str, Any]) -> None:
+        await self._client.create_collection(
+            name,
+            vectors_config={
+                DENSE_EMBEDDING_MODEL: models.VectorParams(
+                    size=dense_size,
+                    distance=models.Distance.COSINE,
+                ),
+                LATE_EMBEDDING_MODEL: models.VectorParams(
+                    size=128,
+                    distance=models.Distance.COSINE,
+                    datatype=models.Datatype(settings['late_datatype']),
+                    on_disk=settings['late_on_disk'],
+                    multivector_config=models.MultiVectorConfig(
+                        comparator=models.MultiVectorComparator.MAX_SIM,
+                    )
+                ),
+            },
+            sparse_vectors_config={
+                SPARSE_EMBEDDING_MODEL: models.SparseVectorParams(
+                    modifier=models.Modifier.IDF,
+                )
+            },
+            quantization_config=quantization_config(settings['quantization']),
+        )
+        await self.ensure_payload_indexes(name)
+
+    async def ensure_payload_indexes(self, name: str) -> None:
+        """Create the keyword indexes in `PAYLOAD_INDEXES`; existing ones are left as they are."""
+        for field_name in PAYLOAD_INDEXES:
+            await self._client.create_payload_index(
+                name,
+                field_name=field_name,
+                field_schema=models.PayloadSchemaType.KEYWORD,
+            )
+
+    async def _conversion_state(self, name: str) -> Tuple[bool, int]:
+        """Whether a conversion of `name` is running, and how many have started."""
+        try:
+            converting, started = await self._redis.mget([_converting_key(name), _conversions_key(name)])
+        except RedisError as exc:
+            # Conversions need Redis, so none can be running
+            print(f"Failed to read conversion state of {name}: {exc}")
+            return False, 0
+        return converting is not None, int(started or 0)
+
+    @contextlib.asynccontextmanager
+    async def writing(self, name: str) -> AsyncIterator[None]:
+        """
+        Guard a write to the collection against a concurrent conversion.
+
+        Raises CollectionBusyError before the write while a conversion runs,
+        and after it when a conversion started meanwhile.
+        """
+        converting, started = await self._conversion_state(name)
+        if converting:
+            raise CollectionBusyError(f"Collection {name} is being converted, retry once it is done")
+        yield
+        if await self._conversion_state(name) != (False, started):
+            raise CollectionBusyError(
+                f"Collection {name} was converted during this write, retry once the conversion is done")
+
+    async def convert(
+        self,
+        name: str,
+        quantization: Optional[str] = None,
+        late_datatype: Optional[str] = None,
+        late_on_disk: Optional[bool] = None
+    ) -> Dict[str, Any]:
+        """
+        Change the storage of an existing collection; unset options keep their current value.
+
+        Quantization and on-disk placement are changed in place. Qdrant cannot
+        change a vector's datatype, so that copies the points into a new
+        collection and atomically points the integration's alias at it; the
+        old collection serves queries until then. Writes through `writing`
+        are rejected until the conversion is done, and a second conversion of
+        the same collection raises CollectionBusyError. Either way the catalog
+        version is bumped so cached results, local mirrors and compiled
+        catalogs are rebuilt.
+        """
+        if not await self.exists(name):
+            raise KeyError(name)
+
+        if not await self._redis.set(_converting_key(name), 1, nx=True, ex=CONVERSION_MARKER_SECONDS):
+            raise CollectionBusyError(f"Collection {name} is already being converted")
+        try:
+            await self._redis.incr(_conversions_key(name))
+            return await self._convert(name, quantization, late_datatype, late_on_disk)
+        finally:
+            await self._redis.delete(_converting_key(name))
+
+    async def _convert(
+        self,
+        name: str,
+        quantization: Optional[str],
+        late_datatype: Optional[str],
+        late_on_disk: Optional[bool]
+    ) -> Dict[str, Any]:
+        async with self._lock:
+            info = await self._client.get_collection(name)
+            dense_size = info.config.params.vectors[DENSE_EMBEDDING_MODEL].size
+            late_params = info.config.params.vectors[LATE_EMBEDDING_MODEL]
+            current_datatype = _datatype_name(late_params.datatype)
+            settings = storage_settings(
+                quantization=quantization or _quantization_name(info.config.quantization_config),
+                late_datatype=late_datatype or current_datatype,
+                late_on_disk=bool(late_params.on_disk) if late_on_disk is None else late_on_disk,
+            )
+
+            if current_datatype == settings['late_datatype']:
+                await self._client.update_collection(
+                    name,
+                    vectors_config={
+                        LATE_EMBEDDING_MODEL: models.VectorParamsDiff(on_disk=settings['late_on_disk']),
+                    },
+                    quantization_config=(
+                        quantization_config(settings['quantization'])
+                        or models.Disabled.DISABLED
+                    ),
+                )
+                await self.ensure_payload_indexes(name)
+                await bump_catalog_version(name)
+                return {'collection': name, 'rebuilt': False, 'points': None, **settings}
+
+            source = await self._target(name)
+            target = next(collection for collection in _physical_names(name) if collection != source)
+            if await self._client.collection_exists(target):
+                # Left over from a rebuild that did not finish
+                await self._client.delete_collection(target)
+            await self._create(target, dense_size, settings)
+            try:
+                copied = await self._copy_points(source or name, target)
+            except Exception:
+                await self._client.delete_collection(target)
+                raise
+
+            if source is not None:
+                await self._point_alias(name, target, replace=True)
+                await self._client.delete_collection(source)
+            else:
+                # A collection created before aliases were used holds the name
+                # itself. The alias is created first so the name never goes
+                # missing; a server that refuses an alias shadowing a collection
+                # gets the old collection deleted first instead
+                try:
+                    await self._point_alias(name, target, replace=False)
+                except UnexpectedResponse:
+                    await self._client.delete_collection(name)
+                    await self._point_alias(name, target, replace=False)
+                else:
+                    await self._client.delete_collection(name)
+
+            self._remember(name)
+            await bump_catalog_version(name)
+            return {'collection': name, 'rebuilt': True, 'points': copied, **settings}
+
+    async def _copy_points(self, source: str, target: str) -> int:
+        copied = 0
+        offset = None
+        while True:
+            points, offset = await self._client.scroll(
+                source,
+                limit=CONVERT_PAGE_SIZE,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            if points:
+                await self._client.upsert(target, points=[
+                    models.PointStruct(id=point.id, vector=point.vector, payload=point.payload)
+                    for point in points
+                ])
+                copied += len(points)
+            if offset is None:
+                return copied
+
+    async def drop(self, name: str) -> None:
+        """Delete the integration's collection, its alias and any collection a rebuild left behind."""
+        if await self._target(name) is not None:
+            await self._client.update_collection_aliases(change_aliases_operations=[
+                models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=name)),
+            ])
+        else:
+            await self._client.delete_collection(collection_name=name)
+        for collection in _physical_names(name):
+            if await self._client.collection_exists(collection):
+                await self._client.delete_collection(collection_name=collection)
+        self.invalidate(name)
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """Forget one collection, or every collection when `name` is None."""
+        if name is None:
+            self._known.clear()
+        else:
+            self._known.pop(name, None)
+
+
+collection_registry = CollectionRegistry(async_qdrant_client)
@@ -0,0 +1,280 @@
+"""
+Micro-batched query embedding for retrieval.
+
+`query_db` awaits `query_embedder.embed(text)`. When no batch is being
+embedded, queries are flushed on the next event loop iteration, so a lone
+query never waits and queries issued together still share a batch. While a
+batch runs, queries that arrive within `QUERY_EMBED_BATCH_WINDOW_MS` of each
+other (or until `QUERY_EMBED_MAX_BATCH` are waiting, or the running batches
+finish) are embedded together.
+Each batch is one call per model on a dedicated inference thread pool, and
+each waiting request gets its own vectors back. The event loop never runs
+ONNX inference itself.
+
+Queries are normalized (temporal context removed, lower-cased, whitespace
+collapsed; all three models are uncased). Each model's vector is cached on
+its own, keyed by the model name and the normalized text, in a bounded
+in-process LRU and in Redis when `QUERY_EMBED_CACHE_REDIS` is set, so a
+repeated query only runs the models whose vectors are not cached yet,
+whichever retrieval mode asks.
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from redis.exceptions import RedisError
+
+from config import (
+    QUERY_EMBED_BATCH_WINDOW_MS,
+    QUERY_EMBED_CACHE_REDIS,
+    QUERY_EMBED_CACHE_SIZE,
+    QUERY_EMBED_CACHE_TTL_SECONDS,
+    QUERY_EMBED_MAX_BATCH,
+    QUERY_EMBED_THREADS,
+    redis_client,
+)
+from utils.embedding_cache import deserialize_embedding, serialize_embedding
+from utils.embeddings import DENSE, LATE, MODEL_KINDS, SPARSE, embedding_models
+from utils.general import strip_temporal_context
+
+
+class QueryVectors(NamedTuple):
+    dense: Any
+    sparse: Any
+    late: Any
+
+
+def embed_query_batch(
+    texts: List[str],
+    kinds: Optional[List[Sequence[str]]] = None
+) -> List[QueryVectors]:
+    """
+    Embed `texts`, one call per model over the unique texts that need it.
+
+    `kinds` lists the models each text needs (all by default); vectors of
+    models a text did not ask for are None.
+    """
+    kinds = kinds or [MODEL_KINDS] * len(texts)
+    vectors_by_kind = {}
+    for kind in MODEL_KINDS:
+        unique = list(dict.fromkeys(text for text, needed in zip(texts, kinds) if kind in needed))
+        embedded = embedding_models.get(kind).query_embed(unique) if unique else []
+        vectors_by_kind[kind] = dict(zip(unique, embedded))
+    return [
+        QueryVectors(*(
+            vectors_by_kind[kind].get(text) if kind in needed else None
+            for kind in (DENSE, SPARSE, LATE)
+        ))
+        for text, needed in zip(texts, kinds)
+    ]
+
+
+def normalize_query(text: str) -> str:
+    # The current-time context added for the agents changes every second and
+    # only adds noise to retrieval, so it is neither embedded nor keyed
+    return " ".join(strip_temporal_context(text).lower().split())
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU of query vectors, one entry per model and text, optionally backed by Redis."""
+
+    PREFIX = "qembcache:"
+
+    def __init__(self, max_entries: int, redis: Optional[Any] = None, ttl_seconds: int = QUERY_EMBED_CACHE_TTL_SECONDS):
+        self._max_entries = max_entries
+        self._redis = redis
+        self._ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._stats = {'hits': 0, 'redis_hits': 0, 'misses': 0}
+
+    def _key(self, kind: str, text: str) -> str:
+        # Vectors from another model must never be served, so its name is part of the key
+        return f"{embedding_models.model_name(kind)}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def _remember(self, key: str, vector: Any) -> None:
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, text: str, kinds: Sequence[str]) -> Dict[str, Any]:
+        """The cached vectors of `text` for the models in `kinds`; missing models are left out."""
+        found = {}
+        keys = {kind: self._key(kind, text) for kind in kinds}
+        for kind, key in keys.items():
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                found[kind] = self._entries[key]
+                self._stats['hits'] += 1
+
+        remote = [kind for kind in kinds if kind not in found]
+        if remote and self._redis is not None:
+            try:
+                stored = await self._redis.mget([self.PREFIX + keys[kind] for kind in remote])
+            except RedisError as exc:
+                print(f"Query embedding cache lookup failed: {exc}")
+                stored = [None] * len(remote)
+            for kind, value in zip(remote, stored):
+                if value is not None:
+                    found[kind] = deserialize_embedding(value)
+                    self._remember(keys[kind], found[kind])
+                    self._stats['redis_hits'] += 1
+
+        self._stats['misses'] += len(kinds) - len(found)
+        return found
+
+    async def set(self, text: str, vectors: Dict[str, Any]) -> None:
+        keys = {kind: self._key(kind, text) for kind in vectors}
+        for kind, vector in vectors.items():
+            self._remember(keys[kind], vector)
+        if self._redis is None:
+            return
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for kind, vector in vectors.items():
+                    pipe.set(self.PREFIX + keys[kind], serialize_embedding(vector), ex=self._ttl_seconds)
+                await pipe.execute()
+        except RedisError as exc:
+            print(f"Query embedding cache write failed: {exc}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = sum(self._stats.values())
+        hits = self._stats['hits'] + self._stats['redis_hits']
+        return {
+            **self._stats,
+            'entries': len(self._entries),
+            'redis': self._redis is not None,
+            'hit_rate': hits / lookups if lookups else 0.0,
+        }
+
+
+class QueryEmbeddingBatcher:
+    """Collects concurrent query texts and embeds them as one batch."""
+
+    def __init__(self, window_ms: float, max_batch: int, threads: int, cache: Optional[QueryEmbeddingCache] = None):
+        self._cache = cache
+        self._window_seconds = window_ms / 1000
+        self._max_batch = max(1, max_batch)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="query-embed")
+        self._pending: List[Tuple[str, Sequence[str], asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.Handle] = None
+        self._running_batches = 0
+        self._stats = {'queries': 0, 'batches': 0, 'largest_batch': 0, 'inference_seconds': 0.0}
+        self._stats_lock = threading.Lock()
+
+    async def embed(self, text: str, kinds: Sequence[str] = MODEL_KINDS) -> QueryVectors:
+        """
+        Return the query vectors of `text` for the models in `kinds`.
+
+        Only models without a cached vector run; vectors of models not in
+        `kinds` are None.
+        """
+        text = normalize_query(text)
+        vectors = await self._cache.get(text, kinds) if self._cache is not None else {}
+
+        missing = [kind for kind in kinds if kind not in vectors]
+        if missing:
+            embedded = await self._enqueue(text, missing)
+            computed = {kind: getattr(embedded, kind) for kind in missing}
+            if self._cache is not None:
+                await self._cache.set(text, computed)
+            vectors.update(computed)
+        return QueryVectors(*(vectors.get(kind) for kind in (DENSE, SPARSE, LATE)))
+
+    async def _enqueue(self, text: str, kinds: Sequence[str]) -> QueryVectors:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, kinds, future))
+
+        if len(self._pending) >= self._max_batch:
+            self._flush()
+        elif self._flush_handle is None and not self._running_batches:
+            # Idle: only what is queued in this loop iteration joins the batch
+            self._flush_handle = loop.call_soon(self._flush)
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self._window_seconds, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        # Requests that were cancelled while waiting need no vectors
+        batch = [entry for entry in batch if not entry[2].done()]
+        if not batch:
+            return
+
+        loop = asyncio.get_running_loop()
+        self._running_batches += 1
+        inference = loop.run_in_executor(
+            self._executor,
+            self._run_batch,
+            [text for text, _, _ in batch],
+            [kinds for _, kinds, _ in batch],
+        )
+        inference.add_done_callback(lambda done: self._finish(batch, done))
+
+    def _finish(self, batch: List[Tuple[str, Sequence[str], asyncio.Future]], done: asyncio.Future) -> None:
+        self._running_batches -= 1
+        self._resolve(batch, done)
+        # Queries that waited behind this batch need not sit out the rest of the window
+        if self._pending and not self._running_batches:
+            self._flush()
+
+    def _run_batch(self, texts: List[str], kinds: List[Sequence[str]]) -> List[QueryVectors]:
+        start_time = time.perf_counter()
+        vectors = embed_query_batch(texts, kinds)
+        with self._stats_lock:
+            self._stats['queries'] += len(texts)
+            self._stats['batches'] += 1
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(texts))
+            self._stats['inference_seconds'] += time.perf_counter() - start_time
+        return vectors
+
+    @staticmethod
+    def _resolve(batch: List[Tuple[str, Sequence[str], asyncio.Future]], done: asyncio.Future) -> None:
+        # Waiters cancelled while the batch ran are already done and are skipped,
+        # so one cancelled request never fails the others
+        if done.cancelled():
+            for _, _, future in batch:
+                future.cancel()
+            return
+        error = done.exception()
+        results = None if error is not None else done.result()
+        for index, (_, _, future) in enumerate(batch):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[index])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['average_batch'] = stats['queries'] / stats['batches'] if stats['batches'] else 0.0
+        return {
+            'batching': stats,
+            'cache': self._cache.stats() if self._cache is not None else None,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+query_embedder = QueryEmbeddingBatcher(
+    QUERY_EMBED_BATCH_WINDOW_MS,
+    QUERY_EMBED_MAX_BATCH,
+    QUERY_EMBED_THREADS,
+    cache=QueryEmbeddingCache(
+        QUERY_EMBED_CACHE_SIZE,
+        redis=redis_client if QUERY_EMBED_CACHE_REDIS else None,
+    ) if QUERY_EMBED_CACHE_SIZE > 0 else None,
+)
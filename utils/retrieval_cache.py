@@ -0,0 +1,119 @@
+"""
+Redis cache of fused retrieval results.
+
+Each integration has a catalog version in Redis that every write to its
+collection (ingestion, endpoint edits and deletes, dropping it) advances.
+Results are cached under the integration, its current version, the
+retrieval settings they were produced with and the normalized query, which
+leaves out the per-second temporal context so repeated intents hit. A
+catalog change makes every older entry unreachable without having to find
+and delete it; stale entries simply expire. The number of endpoints in a
+catalog is cached per version the same way.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+from qdrant_client.models import ScoredPoint
+from redis.exceptions import RedisError
+
+from config import RETRIEVAL_CACHE_ENABLED, RETRIEVAL_CACHE_TTL_SECONDS, async_qdrant_client, redis_client
+from utils.query_embeddings import normalize_query
+
+
+def _version_key(integration_id: str) -> str:
+    return f"catalog:version:{integration_id}"
+
+
+def _result_key(integration_id: str, version: int, query: str, settings: Dict[str, Any]) -> str:
+    digest = hashlib.sha256(
+        json.dumps([normalize_query(query), settings], sort_keys=True).encode('utf-8')).hexdigest()
+    return f"retrieval:{integration_id}:{version}:{digest}"
+
+
+def _size_key(integration_id: str, version: int) -> str:
+    return f"catalog:size:{integration_id}:{version}"
+
+
+async def catalog_version(integration_id: str) -> Optional[int]:
+    """Current catalog version, or None when caching is off or Redis is unavailable."""
+    if not RETRIEVAL_CACHE_ENABLED:
+        return None
+    try:
+        version = await redis_client.get(_version_key(integration_id))
+    except RedisError as exc:
+        print(f"Failed to read catalog version of {integration_id}: {exc}")
+        return None
+    return int(version) if version is not None else 0
+
+
+async def bump_catalog_version(integration_id: str) -> None:
+    """Invalidate every cached retrieval result of the integration."""
+    try:
+        await redis_client.incr(_version_key(integration_id))
+    except RedisError as exc:
+        print(f"Failed to advance catalog version of {integration_id}: {exc}")
+
+
+async def get_cached_results(
+    integration_id: str,
+    query: str,
+    version: Optional[int],
+    settings: Dict[str, Any]
+) -> Optional[List[ScoredPoint]]:
+    """Cached points for the query at catalog `version` and retrieval `settings`, if any."""
+    if version is None:
+        return None
+    try:
+        cached = await redis_client.get(_result_key(integration_id, version, query, settings))
+    except RedisError as exc:
+        print(f"Retrieval cache lookup failed: {exc}")
+        return None
+    if cached is None:
+        return None
+    return [ScoredPoint(**point) for point in json.loads(cached)]
+
+
+async def cache_results(
+    integration_id: str,
+    query: str,
+    version: Optional[int],
+    settings: Dict[str, Any],
+    points: List[ScoredPoint]
+) -> None:
+    """
+    Store `points` under the catalog `version` read before they were retrieved,
+    so results raced by a catalog change land under the outdated version.
+    """
+    if version is None:
+        return
+    try:
+        await redis_client.set(
+            _result_key(integration_id, version, query, settings),
+            json.dumps([point.model_dump(mode='json') for point in points]),
+            ex=RETRIEVAL_CACHE_TTL_SECONDS,
+        )
+    except RedisError as exc:
+        print(f"Retrieval cache write failed: {exc}")
+
+
+async def cached_catalog_size(integration_id: str) -> int:
+    """Number of endpoints in the integration's collection, counted once per catalog version."""
+    version = await catalog_version(integration_id)
+    if version is not None:
+        try:
+            cached = await redis_client.get(_size_key(integration_id, version))
+        except RedisError as exc:
+            print(f"Catalog size lookup failed: {exc}")
+            cached = None
+        if cached is not None:
+            return int(cached)
+
+    size = (await async_qdrant_client.count(integration_id, exact=True)).count
+    if version is not None:
+        try:
+            await redis_client.set(_size_key(integration_id, version), size, ex=RETRIEVAL_CACHE_TTL_SECONDS)
+        except RedisError as exc:
+            print(f"Catalog size write failed: {exc}")
+    return size
@@ -0,0 +1,111 @@
+"""
+Per-integration retrieval pipeline settings.
+
+Settings come from the `retrieval_config` table, with every unset column
+falling back to the `RETRIEVAL_*` defaults in config. Resolved settings are
+kept in memory for `RETRIEVAL_CONFIG_TTL_SECONDS` so `query_db` does not hit
+the database on every request.
+"""
+
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from config import (
+    RETRIEVAL_CONFIG_TTL_SECONDS,
+    RETRIEVAL_DENSE_LIMIT,
+    RETRIEVAL_FUSION,
+    RETRIEVAL_LATE_LIMIT,
+    RETRIEVAL_MODE,
+    RETRIEVAL_SPARSE_LIMIT,
+    RETRIEVAL_TOP_K,
+)
+from models import RetrievalConfig, session
+
+FUSION = "fusion"
+RERANK = "rerank"
+SPARSE_ONLY = "sparse"
+
+RETRIEVAL_MODES = (FUSION, RERANK, SPARSE_ONLY)
+FUSION_METHODS = ("rrf", "dbsf")
+
+SETTING_FIELDS = ('mode', 'fusion', 'dense_limit', 'sparse_limit', 'late_limit', 'top_k')
+
+
+def validate_pipeline(mode: Optional[str], fusion: Optional[str]) -> None:
+    """Reject unknown retrieval modes and fusion methods; None means unset."""
+    if mode is not None and mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode: {mode}")
+    if fusion is not None and fusion not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method: {fusion}")
+
+
+# Fail at startup rather than on the first query
+validate_pipeline(RETRIEVAL_MODE, RETRIEVAL_FUSION)
+
+DEFAULT_SETTINGS = {
+    'mode': RETRIEVAL_MODE,
+    'fusion': RETRIEVAL_FUSION,
+    'dense_limit': RETRIEVAL_DENSE_LIMIT,
+    'sparse_limit': RETRIEVAL_SPARSE_LIMIT,
+    'late_limit': RETRIEVAL_LATE_LIMIT,
+    'top_k': RETRIEVAL_TOP_K,
+}
+
+_resolved: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+
+def _resolve(row: Optional[RetrievalConfig]) -> Dict[str, Any]:
+    settings = dict(DEFAULT_SETTINGS)
+    if row is not None:
+        for field in SETTING_FIELDS:
+            value = getattr(row, field)
+            if value is not None:
+                settings[field] = value
+    return settings
+
+
+def get_retrieval_settings(integration_id: str) -> Dict[str, Any]:
+    """Effective retrieval settings of an integration."""
+    cached = _resolved.get(integration_id)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    row = session.query(RetrievalConfig).filter(
+        RetrievalConfig.integration_uuid == integration_id
+    ).first()
+    settings = _resolve(row)
+    _resolved[integration_id] = (time.monotonic() + RETRIEVAL_CONFIG_TTL_SECONDS, settings)
+    return settings
+
+
+def update_retrieval_settings(integration_id: str, **overrides: Any) -> Dict[str, Any]:
+    """
+    Store per-integration overrides and return the effective settings.
+
+    Only the given fields change; passing None for a field resets it to the
+    default.
+    """
+    validate_pipeline(overrides.get('mode'), overrides.get('fusion'))
+
+    row = session.query(RetrievalConfig).filter(
+        RetrievalConfig.integration_uuid == integration_id
+    ).first()
+    if row is None:
+        row = RetrievalConfig(integration_uuid=integration_id)
+        session.add(row)
+    for field, value in overrides.items():
+        if field in SETTING_FIELDS:
+            setattr(row, field, value)
+    session.commit()
+
+    settings = _resolve(row)
+    _resolved[integration_id] = (time.monotonic() + RETRIEVAL_CONFIG_TTL_SECONDS, settings)
+    return settings
+
+
+def delete_retrieval_settings(integration_id: str) -> None:
+    session.query(RetrievalConfig).filter(
+        RetrievalConfig.integration_uuid == integration_id
+    ).delete()
+    session.commit()
+    _resolved.pop(integration_id, None)
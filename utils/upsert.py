@@ -1,65 +1,203 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import time
 import uuid
-from fastembed import LateInteractionTextEmbedding, SparseTextEmbedding, TextEmbedding
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional
 from qdrant_client import models
 from schemas.raapi_schemas.upsert import UpsertSchema
-from config import DENSE_EMBEDDING_MODEL, LATE_EMBEDDING_MODEL, SPARSE_EMBEDDING_MODEL, qdrant_client
+from config import (
+    DENSE_EMBEDDING_MODEL,
+    INGESTION_CHUNK_SIZE,
+    INGESTION_EMBED_BATCH_SIZE,
+    LATE_EMBEDDING_MODEL,
+    SPARSE_EMBEDDING_MODEL,
+    async_qdrant_client,
+)
+from utils.qdrant_collections import collection_registry
+from utils.embedding_cache import embedding_cache
+from utils.embedding_pool import embedding_pool
+from utils.embeddings import DENSE, LATE, SPARSE, embedding_models
+from utils.retrieval_cache import bump_catalog_version
 
 
-async def upsert_vector(request: UpsertSchema):
-    existing_collections = qdrant_client.get_collections().collections
-    exists = False
-    for collection in existing_collections:
-        if collection.name == request.integration_id:
-            exists = True
+# Namespace for deterministic endpoint point IDs, do not change
+POINT_ID_NAMESPACE = uuid.UUID("6f1c2a5e-8d3b-4e7a-9c0f-2b5d8e1a4c7f")
+
+# Payload fields that make up an endpoint's stored content
+CONTENT_FIELDS = ('description', 'parameters', 'body', 'response')
+
+
+def point_id_for(integration_id: str, method: str, url: str) -> str:
+    """Stable point ID for an endpoint, so re-uploads overwrite instead of duplicating."""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{integration_id}:{method.upper()}:{url}"))
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def hash_content(metadata: Dict[str, Any]) -> str:
+    content = {field: metadata.get(field) for field in CONTENT_FIELDS}
+    return hash_text(json.dumps(content, sort_keys=True))
+
+
+def embed_passages(texts: List[str], batch_size: int = INGESTION_EMBED_BATCH_SIZE):
+    """
+    Embed `texts` with every model, one batched pass per model over cache misses.
+
+    Blocks on inference and the embedding cache; run it in a worker thread.
+    """
+    vectors = []
+    for kind in (DENSE, SPARSE, LATE):
+        vectors.append(embedding_cache.embed(
+            embedding_models.model_name(kind),
+            texts,
+            lambda missing: embedding_pool.embed(kind, missing, batch_size),
+        ))
+    dense_vectors, sparse_vectors, late_vectors = vectors
+    return dense_vectors, sparse_vectors, late_vectors
+
+
+async def upsert_vectors(
+    integration_id: str,
+    items: Iterable[Dict[str, Any]],
+    chunk_size: int = INGESTION_CHUNK_SIZE,
+    batch_size: int = INGESTION_EMBED_BATCH_SIZE,
+    on_progress: Optional[Callable[[Dict[str, Any]], Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Embed and index many `{'text': ..., 'metadata': ...}` items in chunks.
+
+    `items` may be a lazy iterator; only one chunk is materialised at a time.
+    Items whose metadata has `method` and `url` get a deterministic point ID
+    and stored text/content hashes, so existing points are compared first:
+    unchanged items are skipped, items whose embedded text is unchanged only
+    get their payload overwritten, and only new or re-worded items are
+    embedded (in batches per model) and upserted.
+
+    Chunks that change stored points advance the integration's catalog
+    version. Writing a chunk while the collection is being converted raises
+    CollectionBusyError; the chunk is not counted as indexed, so a resumed
+    ingestion job writes it again.
+    `on_progress` (sync or async) is called twice per chunk, once with stage
+    'embedded' and once with stage 'indexed'.
+    """
+    start_time = time.time()
+    items = iter(items)
+    chunk_index = 0
+    counts = {'embedded': 0, 'indexed': 0, 'reembedded': 0, 'payload_updated': 0, 'unchanged': 0}
+    collection_ready = await collection_registry.exists(integration_id)
+
+    async def report(stage: str):
+        if on_progress is None:
+            return
+        elapsed = time.time() - start_time
+        result = on_progress({
+            'integration_id': integration_id,
+            'stage': stage,
+            'chunk': chunk_index,
+            **counts,
+            'elapsed_seconds': elapsed,
+            'endpoints_per_second': counts['indexed'] / elapsed if elapsed else 0.0,
+        })
+        if inspect.isawaitable(result):
+            await result
+
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
             break
 
-    dense_embedding_model = TextEmbedding(
-        f"sentence-transformers/{DENSE_EMBEDDING_MODEL}")
-    bm25_embedding_model = SparseTextEmbedding(
-        f"Qdrant/{SPARSE_EMBEDDING_MODEL}")
-    late_interaction_embedding_model = LateInteractionTextEmbedding(
-        f"colbert-ir/{LATE_EMBEDDING_MODEL}")
-
-    dense_vector = list(dense_embedding_model.passage_embed(request.text))
-    sparse_vector = list(bm25_embedding_model.passage_embed(request.text))
-    late_vector = list(
-        late_interaction_embedding_model.passage_embed(request.text))
-
-    if not exists:
-        qdrant_client.create_collection(
-            request.integration_id,
-            vectors_config={
-                DENSE_EMBEDDING_MODEL: models.VectorParams(
-                    size=len(dense_vector[0]),
-                    distance=models.Distance.COSINE,
-                ),
-                LATE_EMBEDDING_MODEL: models.VectorParams(
-                    size=128,
-                    distance=models.Distance.COSINE,
-                    multivector_config=models.MultiVectorConfig(
-                        comparator=models.MultiVectorComparator.MAX_SIM,
-                    )
-                ),
-            },
-            sparse_vectors_config={
-                SPARSE_EMBEDDING_MODEL: models.SparseVectorParams(
-                    modifier=models.Modifier.IDF,
-                )
-            }
-        )
-
-    metadata = request.metadata
-    metadata['text'] = request.text
-    new_point = qdrant_client.upsert(request.integration_id, points=[
-        models.PointStruct(
-            id=str(uuid.uuid4()),
-            vector={
-                DENSE_EMBEDDING_MODEL: dense_vector[0].tolist(),
-                SPARSE_EMBEDDING_MODEL: sparse_vector[0].as_object(),
-                LATE_EMBEDDING_MODEL: late_vector[0].tolist()
-            },
-            payload=metadata
-        )
-    ])
+        for item in chunk:
+            metadata = item['metadata']
+            metadata['text'] = item['text']
+            metadata['text_hash'] = hash_text(item['text'])
+            metadata['content_hash'] = hash_content(metadata)
+            if metadata.get('method') and metadata.get('url'):
+                item['id'] = point_id_for(integration_id, metadata['method'], metadata['url'])
+            else:
+                item['id'] = str(uuid.uuid4())
+
+        existing = {}
+        if collection_ready:
+            for point in await async_qdrant_client.retrieve(
+                integration_id,
+                ids=[item['id'] for item in chunk],
+                with_payload=['text_hash', 'content_hash'],
+                with_vectors=False,
+            ):
+                existing[str(point.id)] = point.payload or {}
+
+        to_embed = []
+        payload_only = []
+        unchanged_ids = []
+        for item in chunk:
+            stored = existing.get(item['id'])
+            if stored is None or stored.get('text_hash') != item['metadata']['text_hash']:
+                to_embed.append(item)
+            elif stored.get('content_hash') != item['metadata']['content_hash']:
+                payload_only.append(item)
+            else:
+                unchanged_ids.append(item['id'])
+
+        if to_embed:
+            texts = [item['text'] for item in to_embed]
+            # Inference runs off the event loop, fanned out over the embedding pool
+            dense_vectors, sparse_vectors, late_vectors = await asyncio.to_thread(
+                embed_passages, texts, batch_size)
+        counts['embedded'] += len(to_embed)
+        counts['reembedded'] += len([item for item in to_embed if item['id'] in existing])
+        await report('embedded')
+
+        if to_embed and not collection_ready:
+            await collection_registry.ensure(integration_id, len(dense_vectors[0]))
+            collection_ready = True
+
+        if to_embed or payload_only:
+            # A conversion must not copy the collection while this chunk is written
+            async with collection_registry.writing(integration_id):
+                if to_embed:
+                    points = []
+                    for item, dense, sparse, late in zip(to_embed, dense_vectors, sparse_vectors, late_vectors):
+                        points.append(models.PointStruct(
+                            id=item['id'],
+                            vector={
+                                DENSE_EMBEDDING_MODEL: dense.tolist(),
+                                SPARSE_EMBEDDING_MODEL: sparse.as_object(),
+                                LATE_EMBEDDING_MODEL: late.tolist()
+                            },
+                            payload=item['metadata']
+                        ))
+                    await async_qdrant_client.upsert(integration_id, points=points)
 
-    return new_point
+                if payload_only:
+                    await async_qdrant_client.batch_update_points(integration_id, update_operations=[
+                        models.OverwritePayloadOperation(overwrite_payload=models.SetPayload(
+                            payload=item['metadata'], points=[item['id']]))
+                        for item in payload_only
+                    ])
+            counts['payload_updated'] += len(payload_only)
+            await bump_catalog_version(integration_id)
+
+        counts['unchanged'] += len(unchanged_ids)
+
+        counts['indexed'] += len(chunk)
+        await report('indexed')
+        chunk_index += 1
+
+    elapsed = time.time() - start_time
+    return {
+        'integration_id': integration_id,
+        **counts,
+        'elapsed_seconds': elapsed,
+        'endpoints_per_second': counts['indexed'] / elapsed if elapsed else 0.0,
+    }
+
+
+async def upsert_vector(request: UpsertSchema):
+    return await upsert_vectors(request.integration_id, [
+        {'text': request.text, 'metadata': request.metadata}
+    ])
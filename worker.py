@@ -0,0 +1,21 @@
+import asyncio
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from config import EMBEDDING_WARMUP
+from utils.embedding_pool import embedding_pool
+from utils.embeddings import embedding_models
+from utils.ingestion_jobs import worker_loop
+
+
+if __name__ == "__main__":
+    if embedding_pool.enabled:
+        embedding_pool.start()
+    elif EMBEDDING_WARMUP:
+        embedding_models.warmup()
+    try:
+        asyncio.run(worker_loop())
+    finally:
+        embedding_pool.shutdown()